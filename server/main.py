@@ -39,6 +39,10 @@ print('Importing config_service')
 from services.config_service import config_service
 print('Importing tool_service')
 from services.tool_service import tool_service
+print('Importing cluster_service')
+from services.cluster_service import control_bus, cluster_backend_name
+print('Importing checkpointer')
+from services.langgraph_service.checkpointer import get_checkpointer, close_checkpointer
 
 async def initialize():
     print('Initializing config_service')
@@ -54,8 +58,13 @@ async def lifespan(app: FastAPI):
     # TODO: Check if there will be racing conditions when user send chat request but tools and models are not initialized yet.
     await initialize()
     await tool_service.initialize()
+    await control_bus.start()
+    # Fails here, not on the first chat, if the backend can't be shared
+    await get_checkpointer()
     yield
     # onshutdown
+    await control_bus.stop()
+    await close_checkpointer()
 
 print('Creating FastAPI app')
 app = FastAPI(lifespan=lifespan)
@@ -137,8 +146,18 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--port', type=int, default=int(os.environ.get('DEFAULT_PORT', 57988)),
                         help='Port to run the server on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 1)),
+                        help='Number of worker processes (needs CLUSTER_BACKEND=redis or postgres)')
     args = parser.parse_args()
     import uvicorn
     print("🌟Starting server, UI_DIST_DIR:", os.environ.get('UI_DIST_DIR'))
 
-    uvicorn.run(socket_app, host="127.0.0.1", port=args.port)
+    if args.workers > 1 and cluster_backend_name() == 'local':
+        print("Warning: --workers needs CLUSTER_BACKEND=redis or postgres, starting one worker")
+        args.workers = 1
+    if args.workers > 1:
+        # Workers import the app themselves; socket.io clients need sticky
+        # sessions (or the websocket transport only) in front of them
+        uvicorn.run("main:socket_app", host="127.0.0.1", port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(socket_app, host="127.0.0.1", port=args.port)
@@ -1,14 +1,29 @@
 """
 Authentication middleware for Supabase JWT verification.
 Provides FastAPI dependencies for protected and optional-auth endpoints.
+
+Tokens are verified locally: HS* tokens with SUPABASE_JWT_SECRET, asymmetric
+(RS*/ES*) tokens against the project's JWKS, which is fetched once, cached and
+refetched when an unknown key id shows up (key rotation). Verified tokens are
+remembered in a small LRU until min(exp, TOKEN_CACHE_TTL), so most requests
+never re-verify a signature.
+
+Remote introspection via /auth/v1/user is only used when local verification
+is not possible (no secret / JWKS), or on every cache miss when
+AUTH_REMOTE_CHECK=true is set to catch revoked sessions.
 """
 
 import os
+import time
+import asyncio
+import hashlib
 import logging
 import httpx
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from fastapi import Request, HTTPException, Depends
 from jose import jwt, JWTError
+from utils.singleflight import singleflight
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +31,29 @@ logger = logging.getLogger(__name__)
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", "")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+AUTH_REMOTE_CHECK = os.getenv("AUTH_REMOTE_CHECK", "false").lower() in ("1", "true", "yes")
+
+HS_ALGORITHMS = ["HS256", "HS384", "HS512"]
+ASYMMETRIC_ALGORITHMS = ["RS256", "RS384", "RS512", "ES256", "ES384", "ES512"]
+JWT_AUDIENCE = "authenticated"
+
+# Verified-token cache
+TOKEN_CACHE_TTL = 60.0
+TOKEN_CACHE_MAX_ENTRIES = 4096
+# JWKS cache
+JWKS_CACHE_TTL = 600.0
+# Minimum gap between JWKS refetches triggered by unknown key ids
+JWKS_MIN_REFRESH_INTERVAL = 30.0
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Shared client so auth calls reuse pooled connections."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=10)
+    return _http_client
 
 
 async def _verify_token_with_supabase(token: str) -> Optional[Dict[str, Any]]:
@@ -29,26 +67,111 @@ async def _verify_token_with_supabase(token: str) -> Optional[Dict[str, Any]]:
         "Authorization": f"Bearer {token}",
     }
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{SUPABASE_URL}/auth/v1/user",
-                headers=headers,
-                timeout=10,
-            )
-            logger.info(f"[AUTH] Supabase API response: {response.status_code}")
-            if response.status_code == 200:
-                return response.json()
-            logger.warning(
-                f"[AUTH] Supabase API error: {response.status_code} - {response.text[:200]}"
-            )
-            return None
+        response = await _get_http_client().get(
+            f"{SUPABASE_URL}/auth/v1/user",
+            headers=headers,
+        )
+        if response.status_code == 200:
+            return response.json()
+        logger.warning(
+            f"[AUTH] Supabase API error: {response.status_code} - {response.text[:200]}"
+        )
+        return None
     except Exception as e:
         logger.warning(f"[AUTH] Supabase token verification failed: {e}")
         return None
 
 
+class JwksCache:
+    """Signing keys of the Supabase project, keyed by kid."""
+
+    def __init__(self, url: str = "", ttl: float = JWKS_CACHE_TTL) -> None:
+        self._url = url
+        self._ttl = ttl
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def url(self) -> str:
+        return self._url or f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+
+    async def _fetch(self) -> None:
+        response = await _get_http_client().get(self.url)
+        response.raise_for_status()
+        keys = response.json().get("keys", [])
+        self._keys = {k.get("kid", ""): k for k in keys}
+        self._fetched_at = time.monotonic()
+
+    async def get_key(self, kid: str) -> Optional[Dict[str, Any]]:
+        """Return the JWK for ``kid``, refetching on expiry or an unknown kid."""
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if key is not None and now - self._fetched_at < self._ttl:
+            return key
+        async with self._lock:
+            key = self._keys.get(kid)
+            age = time.monotonic() - self._fetched_at
+            stale = age >= self._ttl
+            rotated = key is None and age >= JWKS_MIN_REFRESH_INTERVAL
+            if stale or rotated:
+                try:
+                    await self._fetch()
+                except Exception as e:
+                    # Keep serving the keys we have until the endpoint recovers
+                    logger.warning(f"[AUTH] JWKS fetch failed: {e}")
+            return self._keys.get(kid)
+
+
+class VerifiedTokenCache:
+    """LRU of token digest -> (claims, expires_at)."""
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL, max_entries: int = TOKEN_CACHE_MAX_ENTRIES) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        # Only a digest of the bearer token is kept in memory
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        expires_at = time.time() + self._ttl
+        if claims.get("exp"):
+            expires_at = min(expires_at, float(claims["exp"]))
+        key = self._digest(token)
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+jwks_cache = JwksCache()
+token_cache = VerifiedTokenCache()
+
+
+class LocalVerificationUnavailable(Exception):
+    """No secret or signing key is available to verify this token locally."""
+
+
 def _decode_token(token: str) -> dict:
-    """Decode and verify a Supabase JWT token."""
+    """Decode and verify an HS*-signed Supabase JWT token."""
     if not SUPABASE_JWT_SECRET:
         logger.error("[AUTH] SUPABASE_JWT_SECRET not configured")
         raise HTTPException(
@@ -56,26 +179,12 @@ def _decode_token(token: str) -> dict:
             detail="SUPABASE_JWT_SECRET not configured on server",
         )
 
-    try:
-        import base64
-        import json
-
-        header_segment = token.split(".")[0]
-        padded = header_segment + "=" * (4 - len(header_segment) % 4)
-        header = json.loads(base64.urlsafe_b64decode(padded))
-        logger.info(f"[AUTH] JWT header: {header}")
-        alg = header.get("alg", "HS256")
-        logger.info(f"[AUTH] JWT algorithm: {alg}")
-    except Exception as e:
-        logger.warning(f"[AUTH] Could not decode JWT header: {e}")
-        alg = "HS256"
-
     try:
         payload = jwt.decode(
             token,
             SUPABASE_JWT_SECRET,
-            algorithms=["HS256", "HS384", "HS512"],
-            audience="authenticated",
+            algorithms=HS_ALGORITHMS,
+            audience=JWT_AUDIENCE,
         )
         logger.debug(f"[AUTH] JWT decoded successfully, sub: {payload.get('sub')}")
         return payload
@@ -84,19 +193,79 @@ def _decode_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
 
 
+async def _verify_locally(token: str) -> Dict[str, Any]:
+    """Verify signature, exp and audience without leaving the process.
+
+    Raises HTTPException(401) for invalid tokens and
+    LocalVerificationUnavailable when there is nothing to verify against.
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    alg = header.get("alg", "HS256")
+
+    if alg in HS_ALGORITHMS:
+        if not SUPABASE_JWT_SECRET:
+            raise LocalVerificationUnavailable(alg)
+        return _decode_token(token)
+
+    if alg not in ASYMMETRIC_ALGORITHMS:
+        raise HTTPException(status_code=401, detail=f"Invalid token: unsupported alg {alg}")
+    if not SUPABASE_URL:
+        raise LocalVerificationUnavailable(alg)
+    key = await jwks_cache.get_key(header.get("kid", ""))
+    if key is None:
+        raise LocalVerificationUnavailable(alg)
+    try:
+        return jwt.decode(token, key, algorithms=[alg], audience=JWT_AUDIENCE)
+    except JWTError as e:
+        logger.warning(f"[AUTH] JWT decode error: {type(e).__name__}: {e}")
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+
+
+async def verify_token(token: str) -> Dict[str, Any]:
+    """Return the verified claims of ``token`` (cached), or raise 401."""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    return await _verify_and_cache(token)
+
+
+@singleflight
+async def _verify_and_cache(token: str) -> Dict[str, Any]:
+    """Verify a cache miss; concurrent requests with the same token share it."""
+    try:
+        claims = await _verify_locally(token)
+        if AUTH_REMOTE_CHECK:
+            # Optional revocation check; a signed token for a logged-out
+            # session is rejected here
+            user_info = await _verify_token_with_supabase(token)
+            if not user_info or user_info.get("id") != claims.get("sub"):
+                raise HTTPException(status_code=401, detail="Token revoked")
+    except LocalVerificationUnavailable:
+        # Nothing to verify against locally — ask Supabase Auth instead
+        user_info = await _verify_token_with_supabase(token)
+        if not user_info or not user_info.get("id"):
+            raise HTTPException(status_code=401, detail="Invalid token")
+        claims = {"sub": user_info["id"]}
+        try:
+            claims["exp"] = jwt.get_unverified_claims(token).get("exp")
+        except JWTError:
+            pass
+
+    if not claims.get("sub"):
+        logger.warning("[AUTH] Token has no 'sub' claim")
+        raise HTTPException(status_code=401, detail="Invalid token: no sub claim")
+    token_cache.put(token, claims)
+    return claims
+
+
 def _extract_token(request: Request) -> Optional[str]:
     """Extract Bearer token from Authorization header."""
     auth_header = request.headers.get("authorization", "")
-    logger.debug(f"[AUTH] Authorization header present: {bool(auth_header)}")
-    if auth_header:
-        logger.debug(
-            f"[AUTH] Auth header starts with 'Bearer ': {auth_header.startswith('Bearer ')}"
-        )
-        logger.debug(f"[AUTH] Auth header length: {len(auth_header)}")
     if auth_header.startswith("Bearer "):
-        token = auth_header[7:]
-        logger.debug(f"[AUTH] Token extracted, length: {len(token)}")
-        return token
+        return auth_header[7:]
     logger.debug("[AUTH] No token extracted from header")
     return None
 
@@ -107,32 +276,17 @@ async def get_current_user(request: Request) -> str:
     Returns the user_id (UUID string) from the token's 'sub' claim.
     Raises 401 if token is missing or invalid.
     """
-    logger.info(f"[AUTH] get_current_user called for path: {request.url.path}")
     token = _extract_token(request)
     if not token:
         logger.warning("[AUTH] No token provided - returning 401")
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    logger.info(f"[AUTH] Token preview: {token[:50]}...")
-
-    # Try Supabase API verification first (most reliable)
-    user_info = await _verify_token_with_supabase(token)
-    if user_info and user_info.get("id"):
-        logger.info(f"[AUTH] Verified via Supabase API: {user_info['id']}")
-        return user_info["id"]
-
-    # Fallback to JWT decode
     try:
-        payload = _decode_token(token)
-        user_id = payload.get("sub")
-        if not user_id:
-            logger.warning("[AUTH] Token has no 'sub' claim")
-            raise HTTPException(status_code=401, detail="Invalid token: no sub claim")
-        logger.info(f"[AUTH] Successfully authenticated user via JWT: {user_id}")
-        return user_id
+        claims = await verify_token(token)
     except HTTPException as e:
         logger.warning(f"[AUTH] Token validation failed: {e.detail}")
         raise HTTPException(status_code=401, detail="Invalid token")
+    return claims["sub"]
 
 
 async def optional_auth(request: Request) -> Optional[str]:
@@ -144,7 +298,7 @@ async def optional_auth(request: Request) -> Optional[str]:
     if not token:
         return None
     try:
-        payload = _decode_token(token)
-        return payload.get("sub")
+        claims = await verify_token(token)
+        return claims.get("sub")
     except HTTPException:
         return None
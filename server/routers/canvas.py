@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, HTTPException
 from services.chat_service import handle_chat
-from services.db_service import db_service
+from services.db_service import db_service, CanvasVersionConflict
 from middleware.auth import get_current_user
 import asyncio
 import json
@@ -37,6 +37,28 @@ async def save_canvas(id: str, request: Request, user_id: str = Depends(get_curr
     return {"id": id}
 
 
+@router.post("/{id}/delta")
+async def save_canvas_delta(id: str, request: Request, user_id: str = Depends(get_current_user)):
+    """Persist only the elements/files that changed since the client's version."""
+    payload = await request.json()
+    try:
+        version = await db_service.apply_canvas_delta(
+            id,
+            upserts=payload.get('upserts'),
+            deletes=payload.get('deletes'),
+            files=payload.get('files'),
+            app_state=payload.get('appState'),
+            base_version=payload.get('base_version'),
+            thumbnail=payload.get('thumbnail'),
+            user_id=user_id,
+        )
+    except CanvasVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if version is None:
+        raise HTTPException(status_code=404, detail="Canvas not found")
+    return {"id": id, "version": version}
+
+
 @router.post("/{id}/rename")
 async def rename_canvas(id: str, request: Request, user_id: str = Depends(get_current_user)):
     data = await request.json()
@@ -348,8 +348,8 @@ async def generate_previews(
             if image_url:
                 # The tool's save_image_to_canvas already inserted into
                 # generated_content, but without character_id in metadata.
-                # Patch the existing row so the character gallery query can
-                # find it via .contains("metadata", {"character_id": ...}).
+                # Merge it in so the character gallery query can find it via
+                # .contains("metadata", {"character_id": ...}).
                 try:
                     storage_path = image_url
                     if image_url.startswith("/api/file/"):
@@ -357,47 +357,21 @@ async def generate_previews(
                     elif "supabase" in image_url and "/storage/v1/" in image_url:
                         storage_path = f"{user_id}/{image_url.rsplit('/', 1)[-1]}"
 
-                    sb = await supabase_service.get_supabase()
-                    existing = (
-                        await sb.table("generated_content")
-                        .select("id, metadata")
-                        .eq("user_id", user_id)
-                        .eq("storage_path", storage_path)
-                        .limit(1)
-                        .execute()
+                    await db_service.upsert_generated_content(
+                        {
+                            "user_id": user_id,
+                            "type": media_type,
+                            "storage_path": storage_path,
+                            "prompt": prompt,
+                            "model": tool_id,
+                            "metadata": {
+                                "public_url": image_url,
+                                "feature_type": "character_preview",
+                                "character_id": character_id,
+                                "style_label": style_info["label"],
+                            },
+                        }
                     )
-                    if existing.data:
-                        row = existing.data[0]
-                        meta = row.get("metadata") or {}
-                        if isinstance(meta, str):
-                            import json
-                            meta = json.loads(meta)
-                        meta["character_id"] = character_id
-                        meta["style_label"] = style_info["label"]
-                        meta["feature_type"] = "character_preview"
-                        await (
-                            sb.table("generated_content")
-                            .update({"metadata": meta})
-                            .eq("id", row["id"])
-                            .execute()
-                        )
-                    else:
-                        # No existing row — insert fresh
-                        await db_service.insert_generated_content(
-                            {
-                                "user_id": user_id,
-                                "type": media_type,
-                                "storage_path": storage_path,
-                                "prompt": prompt,
-                                "model": tool_id,
-                                "metadata": {
-                                    "public_url": image_url,
-                                    "feature_type": "character_preview",
-                                    "character_id": character_id,
-                                    "style_label": style_info["label"],
-                                },
-                            }
-                        )
                 except Exception as persist_err:
                     print(f"Warning: failed to persist preview: {persist_err}")
 
@@ -1,8 +1,8 @@
 #server/routers/chat_router.py
-from fastapi import APIRouter, Request, Depends
-from services.chat_service import handle_chat
+from fastapi import APIRouter, Request, Depends, HTTPException
+from services.chat_service import handle_chat, ChatSessionNotFound
 from services.magic_service import handle_magic
-from services.stream_service import get_stream_task
+from services.stream_service import cancel_stream
 from middleware.auth import get_current_user
 from typing import Dict
 
@@ -16,7 +16,10 @@ async def chat(request: Request, user_id: str = Depends(get_current_user)):
     Requires authentication. Passes user_id to chat handler.
     """
     data = await request.json()
-    await handle_chat(data, user_id=user_id)
+    try:
+        await handle_chat(data, user_id=user_id)
+    except ChatSessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found")
     return {"status": "done"}
 
 
@@ -25,9 +28,7 @@ async def cancel_chat(session_id: str, user_id: str = Depends(get_current_user))
     """
     Endpoint to cancel an ongoing stream task for a given session_id.
     """
-    task = get_stream_task(session_id)
-    if task and not task.done():
-        task.cancel()
+    if await cancel_stream(session_id):
         return {"status": "cancelled"}
     return {"status": "not_found_or_done"}
 
@@ -47,8 +48,6 @@ async def cancel_magic(session_id: str, user_id: str = Depends(get_current_user)
     """
     Endpoint to cancel an ongoing magic generation task for a given session_id.
     """
-    task = get_stream_task(session_id)
-    if task and not task.done():
-        task.cancel()
+    if await cancel_stream(session_id):
         return {"status": "cancelled"}
     return {"status": "not_found_or_done"}
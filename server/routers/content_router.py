@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from pydantic import BaseModel
 from typing import Optional, List
 from middleware.auth import get_current_user
-from services.db_service import db_service
+from services.db_service import db_service, encode_content_cursor
 from services import storage_service
 
 router = APIRouter(prefix="/api/my-content")
@@ -103,18 +103,24 @@ async def list_my_content(
     feature_type: Optional[str] = Query(None, description="Filter by feature type (e.g. 'character_swap', 'face_swap')"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous response's next_cursor"),
     user_id: str = Depends(get_current_user),
 ):
     """Return paginated list of current user's generated content."""
     offset = (page - 1) * limit
-    items = await db_service.list_generated_content(
-        user_id=user_id,
-        content_type=type,
-        feature_type=feature_type,
-        limit=limit,
-        offset=offset,
-    )
-    return {"items": items, "page": page, "limit": limit}
+    try:
+        items = await db_service.list_generated_content(
+            user_id=user_id,
+            content_type=type,
+            feature_type=feature_type,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    next_cursor = encode_content_cursor(items[-1]) if len(items) == limit else None
+    return {"items": items, "page": page, "limit": limit, "next_cursor": next_cursor}
 
 
 @router.get("/{content_id}")
@@ -143,8 +149,9 @@ async def delete_my_content(
     storage_path = item.get("storage_path", "")
     if storage_path:
         try:
+            # Content-addressed objects may be shared by several records
             bucket = storage_service.GENERATED_CONTENT_BUCKET
-            await storage_service.delete_file(bucket, storage_path)
+            await storage_service.release_file(bucket, storage_path)
         except Exception as e:
             print(f"Warning: Failed to delete storage file {storage_path}: {e}")
 
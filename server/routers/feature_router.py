@@ -243,40 +243,32 @@ async def generate_feature(
         image_url = extract_media_url(result_text)
 
         if image_url:
-            # Ensure a generated_content record exists (tool may have already inserted one)
+            # Ensure a generated_content record exists with the feature_type set
+            # (the tool may have already inserted one; the upsert merges into it)
             try:
                 storage_path = image_url
                 if image_url.startswith("/api/file/"):
                     storage_path = image_url.replace("/api/file/", "", 1)
                 elif "supabase" in image_url and "/storage/v1/" in image_url:
                     storage_path = f"{user_id}/{image_url.rsplit('/', 1)[-1]}"
-                already = await db_service.content_exists_by_storage_path(
-                    user_id, storage_path
-                )
-                if not already:
-                    content_metadata = {
-                        "public_url": image_url,
-                        "feature_type": req.feature_type,
+                content_metadata = {
+                    "public_url": image_url,
+                    "feature_type": req.feature_type,
+                }
+                if req.character_id:
+                    content_metadata["character_id"] = req.character_id
+                if req.input_images:
+                    content_metadata["input_images"] = req.input_images
+                await db_service.upsert_generated_content(
+                    {
+                        "user_id": user_id,
+                        "type": "image",
+                        "storage_path": storage_path,
+                        "prompt": req.prompt,
+                        "model": tool_id,
+                        "metadata": content_metadata,
                     }
-                    if req.character_id:
-                        content_metadata["character_id"] = req.character_id
-                    if req.input_images:
-                        content_metadata["input_images"] = req.input_images
-                    await db_service.insert_generated_content(
-                        {
-                            "user_id": user_id,
-                            "type": "image",
-                            "storage_path": storage_path,
-                            "prompt": req.prompt,
-                            "model": tool_id,
-                            "metadata": content_metadata,
-                        }
-                    )
-                else:
-                    # Record was already inserted by the tool — patch in feature_type
-                    await db_service.update_content_feature_type(
-                        user_id, storage_path, req.feature_type
-                    )
+                )
             except Exception as persist_err:
                 print(
                     f"Warning: Failed to persist feature-generated content: {persist_err}"
@@ -92,13 +92,14 @@ async def upload_image(
             await run_in_threadpool(img.save, buf, format=save_format)
             upload_bytes = buf.getvalue()
 
-    # Upload to Supabase Storage (primary)
+    # Upload to Supabase Storage (primary), content-addressed so that
+    # re-uploading the same image reuses the stored object
     final_filename = f"{file_id}.{extension}"
     try:
-        public_url = await storage_service.upload_file(
+        final_filename, public_url = await storage_service.upload_content_addressed(
             user_id=user_id,
             file_bytes=upload_bytes,
-            filename=final_filename,
+            extension=extension,
             bucket=storage_service.UPLOADS_BUCKET,
             content_type=content_type,
         )
@@ -214,10 +215,14 @@ async def delete_upload(
     filename: str,
     user_id: str = Depends(get_current_user),
 ):
-    """Delete an uploaded file from Supabase Storage."""
+    """Delete an uploaded file from Supabase Storage.
+
+    Uploads are content-addressed and each upload holds a reference, so this
+    releases one; the object is removed with its last reference.
+    """
     storage_path = f"{user_id}/{filename}"
     try:
-        await storage_service.delete_file(storage_service.UPLOADS_BUCKET, storage_path)
+        await storage_service.release_file(storage_service.UPLOADS_BUCKET, storage_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {e}")
     return {"status": "deleted", "filename": filename}
@@ -5,7 +5,7 @@ import inspect
 import asyncio
 import traceback
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
 import requests
 import httpx
 from pydantic import BaseModel
@@ -238,6 +238,22 @@ async def get_chat_session(session_id: str, user_id: str = Depends(get_current_u
     return await db_service.get_chat_history(session_id, user_id=user_id)
 
 
+@router.get("/chat_session/{session_id}/messages")
+async def get_chat_session_messages(
+    session_id: str,
+    before: Optional[int] = Query(None, description="Return messages older than this id"),
+    after: Optional[int] = Query(None, description="Return messages newer than this id"),
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_current_user),
+):
+    """Cursor-paginated chat history; use `after` for incremental refreshes."""
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    return await db_service.get_chat_history_page(
+        session_id, user_id=user_id, before_id=before, after_id=after, limit=limit
+    )
+
+
 # ---------------
 # Direct Generation Endpoints
 # ---------------
@@ -424,9 +440,10 @@ async def generate_image(
                 )
         # Ensure every generated image has a generated_content record.
         # The tool's save_image_to_canvas may have already inserted one;
-        # we check by storage_path to avoid duplicates.
+        # the upsert merges into it by storage_path in a single request.
         if results:
             try:
+                rows = []
                 for img in results:
                     image_url = img.get("url", "")
                     if not image_url:
@@ -437,13 +454,7 @@ async def generate_image(
                     elif "supabase" in image_url and "/storage/v1/" in image_url:
                         # Derive storage_path that save_image_to_canvas would have used
                         storage_path = f"{user_id}/{image_url.rsplit('/', 1)[-1]}"
-                    # Skip if the tool already persisted this record
-                    already = await db_service.content_exists_by_storage_path(
-                        user_id, storage_path
-                    )
-                    if already:
-                        continue
-                    await db_service.insert_generated_content(
+                    rows.append(
                         {
                             "user_id": user_id,
                             "type": "image",
@@ -456,6 +467,7 @@ async def generate_image(
                             },
                         }
                     )
+                await db_service.upsert_generated_content_bulk(rows)
             except Exception as persist_err:
                 print(f"Warning: Failed to persist images to Supabase: {persist_err}")
                 traceback.print_exc()
@@ -680,31 +692,27 @@ async def generate_video(
             if video_candidates:
                 video_url = video_candidates[0]
                 print(f"🎬 Video URL extracted: {video_url}")
-                # Check if tool already persisted this record
+                # Record the video, merging into the row the tool may have written
                 try:
                     storage_path = video_url
                     if video_url.startswith("/api/file/"):
                         storage_path = video_url.replace("/api/file/", "", 1)
                     elif "supabase" in video_url and "/storage/v1/" in video_url:
                         storage_path = f"{user_id}/{video_url.rsplit('/', 1)[-1]}"
-                    already = await db_service.content_exists_by_storage_path(
-                        user_id, storage_path
+                    await db_service.upsert_generated_content(
+                        {
+                            "user_id": user_id,
+                            "type": "video",
+                            "storage_path": storage_path,
+                            "prompt": prompt,
+                            "model": model_name or tool,
+                            "metadata": {
+                                "public_url": video_url,
+                                "aspect_ratio": aspect_ratio or "16:9",
+                                "duration": duration or "5",
+                            },
+                        }
                     )
-                    if not already:
-                        await db_service.insert_generated_content(
-                            {
-                                "user_id": user_id,
-                                "type": "video",
-                                "storage_path": storage_path,
-                                "prompt": prompt,
-                                "model": model_name or tool,
-                                "metadata": {
-                                    "public_url": video_url,
-                                    "aspect_ratio": aspect_ratio or "16:9",
-                                    "duration": duration or "5",
-                                },
-                            }
-                        )
                 except Exception as persist_err:
                     print(
                         f"Warning: Failed to persist generated video: {persist_err}"
@@ -18,8 +18,8 @@ async def handle_tool_confirmation(request: ToolConfirmationRequest, user_id: st
     try:
         if request.confirmed:
             # 确认工具调用
-            success = tool_confirmation_manager.confirm_tool(
-                request.tool_call_id)
+            success = await tool_confirmation_manager.resolve(
+                request.tool_call_id, True)
             if success:
                 await send_to_websocket(request.session_id, {
                     'type': 'tool_call_confirmed',
@@ -30,8 +30,8 @@ async def handle_tool_confirmation(request: ToolConfirmationRequest, user_id: st
                     status_code=404, detail="Tool call not found or already processed")
         else:
             # 取消工具调用
-            success = tool_confirmation_manager.cancel_confirmation(
-                request.tool_call_id)
+            success = await tool_confirmation_manager.resolve(
+                request.tool_call_id, False)
             if success:
                 await send_to_websocket(request.session_id, {
                     'type': 'tool_call_cancelled',
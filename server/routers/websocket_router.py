@@ -1,20 +1,171 @@
 # routers/websocket_router.py
-from services.websocket_state import sio, add_connection, remove_connection
+from fastapi import HTTPException
+from socketio.exceptions import ConnectionRefusedError  # type: ignore
+from middleware.auth import verify_token
+from services.db_service import db_service
+from services.message_history import get_live_history
+from services.event_replay import replay_buffer
+from services.cluster_service import WORKER_ID
+from services.socket_outbox import close_outbox
+from services.wire_format import negotiate, handshake_fields, encode
+from services.websocket_state import (
+    sio,
+    add_connection,
+    remove_connection,
+    get_connection_user,
+    get_connection_wire,
+    user_room,
+    session_room,
+    canvas_room,
+)
+
+
+def _connect_token(environ: dict, auth: dict) -> str:
+    """Bearer token from the socket.io auth payload or the Authorization header."""
+    token = auth.get('token') or ''
+    if not token:
+        header = environ.get('HTTP_AUTHORIZATION', '')
+        if header.startswith('Bearer '):
+            token = header[7:]
+    return token
+
+
+# Ownership is read from the database, not the listing cache: a per-worker
+# cache would refuse rooms created on another worker until it expires
+async def _owns_session(user_id: str, session_id: str) -> bool:
+    return await db_service.get_chat_session(session_id, user_id=user_id) is not None
+
+
+async def _owns_canvas(user_id: str, canvas_id: str) -> bool:
+    return await db_service.get_canvas(canvas_id, user_id=user_id) is not None
+
+
+async def _join(sid: str, user_id: str, data: dict) -> list:
+    """Join the session/canvas rooms named in ``data`` that the user owns."""
+    joined = []
+    session_id = data.get('session_id')
+    if session_id and await _owns_session(user_id, session_id):
+        await sio.enter_room(sid, session_room(session_id))
+        joined.append(session_room(session_id))
+    canvas_id = data.get('canvas_id')
+    if canvas_id and await _owns_canvas(user_id, canvas_id):
+        await sio.enter_room(sid, canvas_room(canvas_id))
+        joined.append(canvas_room(canvas_id))
+    return joined
+
+
+async def _send_snapshot(sid: str, user_id: str, session_id: str) -> None:
+    history = get_live_history(session_id)
+    if history is not None:
+        snapshot = history.snapshot()
+    else:
+        # Stream is over: the database has the full history
+        messages = await db_service.get_chat_history(session_id, user_id=user_id)
+        snapshot = {'type': 'all_messages', 'messages': messages, 'version': 0}
+    await sio.emit('session_update', encode({
+        'canvas_id': None,
+        'session_id': session_id,
+        **snapshot,
+    }, get_connection_wire(sid)), room=sid, ignore_queue=True)
+
+
+async def _replay(sid: str, user_id: str, session_id: str, last_seq: int) -> None:
+    """Re-send the session events after ``last_seq`` to one connection.
+
+    Call after joining the session room: an event emitted in between may
+    then arrive twice, and clients drop frames whose seq they have seen.
+    """
+    events = await replay_buffer.events_since(session_id, last_seq)
+    if events is None:
+        # The gap is older than the buffer
+        await _send_snapshot(sid, user_id, session_id)
+        return
+    wire = get_connection_wire(sid)
+    for event in events:
+        await sio.emit('session_update', encode(event, wire), room=sid, ignore_queue=True)
+
+
+def _last_seq(data: dict):
+    try:
+        return int(data['last_seq'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
 
 @sio.event
 async def connect(sid, environ, auth):
-    print(f"Client {sid} connected")
-    
-    user_info = auth or {}
-    add_connection(sid, user_info)
-    
-    await sio.emit('connected', {'status': 'connected'}, room=sid)
+    auth = auth if isinstance(auth, dict) else {}
+    token = _connect_token(environ, auth)
+    if not token:
+        raise ConnectionRefusedError('Not authenticated')
+    try:
+        claims = await verify_token(token)
+    except HTTPException:
+        raise ConnectionRefusedError('Invalid token')
+    user_id = claims['sub']
+    print(f"Client {sid} connected as user {user_id}")
+
+    wire = negotiate(auth)
+    add_connection(sid, {'user_id': user_id, 'wire': wire})
+    await sio.enter_room(sid, user_room(user_id))
+    rooms = await _join(sid, user_id, auth)
+
+    await sio.emit('connected', {
+        'status': 'connected',
+        'rooms': rooms,
+        'worker_id': WORKER_ID,
+        **handshake_fields(wire),
+    }, room=sid, ignore_queue=True)
+
+    # Reconnect handshake: {session_id, last_seq} in the auth payload
+    last_seq = _last_seq(auth)
+    if last_seq is not None and session_room(auth.get('session_id', '')) in rooms:
+        await _replay(sid, user_id, auth['session_id'], last_seq)
 
 @sio.event
 async def disconnect(sid):
     print(f"Client {sid} disconnected")
     remove_connection(sid)
+    close_outbox(sid)
+
+@sio.event
+async def join(sid, data):
+    """Subscribe to a session and/or canvas: {session_id?, canvas_id?}."""
+    user_id = get_connection_user(sid)
+    if not user_id or not isinstance(data, dict):
+        return {'rooms': []}
+    return {'rooms': await _join(sid, user_id, data)}
+
+@sio.event
+async def leave(sid, data):
+    if not isinstance(data, dict):
+        return
+    if data.get('session_id'):
+        await sio.leave_room(sid, session_room(data['session_id']))
+    if data.get('canvas_id'):
+        await sio.leave_room(sid, canvas_room(data['canvas_id']))
+
+@sio.event
+async def resync(sid, data):
+    """Send a full message snapshot for {session_id} to this connection only."""
+    user_id = get_connection_user(sid)
+    session_id = data.get('session_id') if isinstance(data, dict) else None
+    if not user_id or not session_id or not await _owns_session(user_id, session_id):
+        return
+    await _send_snapshot(sid, user_id, session_id)
+
+@sio.event
+async def replay(sid, data):
+    """Join {session_id} and re-send its events after {last_seq}."""
+    user_id = get_connection_user(sid)
+    if not user_id or not isinstance(data, dict):
+        return
+    last_seq = _last_seq(data)
+    session_id = data.get('session_id')
+    rooms = await _join(sid, user_id, {'session_id': session_id})
+    if last_seq is not None and rooms:
+        await _replay(sid, user_id, session_id, last_seq)
 
 @sio.event
 async def ping(sid, data):
-    await sio.emit('pong', data, room=sid)
+    await sio.emit('pong', data, room=sid, ignore_queue=True)
@@ -0,0 +1,114 @@
+"""
+Blob externalization for JSON documents stored in the database.
+
+Chat messages can carry base64 `image_url` data URLs and canvas documents keep
+`files[*].dataURL` inline. Before such documents are written, data URLs above
+BLOB_INLINE_MAX_BYTES are uploaded once (content-addressed) to Storage and
+replaced with a compact `storage://<bucket>/<path>` reference. On read the
+references are turned into public URLs locally, without fetching the bytes.
+"""
+
+import base64
+import binascii
+import mimetypes
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from services import storage_service
+
+
+BLOB_REF_PREFIX = "storage://"
+BLOB_BUCKET = storage_service.UPLOADS_BUCKET
+# Data URLs at or below this many characters stay inline
+BLOB_INLINE_MAX_BYTES = int(os.getenv("BLOB_INLINE_MAX_BYTES", str(32 * 1024)))
+# Top-level folder of externalized blobs in BLOB_BUCKET
+BLOB_FOLDER = os.getenv("BLOB_FOLDER", "_blobs")
+# Owner folder used when the owner of a document is unknown
+SHARED_OWNER = "shared"
+# (owner, sha256) -> reference for blobs this process already stored, so
+# repeated saves of the same document skip the upload and the reference-count RPC
+_KNOWN_BLOBS_MAX = 1024
+
+_DATA_URL_RE = re.compile(r"^data:([\w.+-]+/[\w.+-]+)?(?:;[\w=.-]+)*;base64,", re.ASCII)
+
+_known_blobs: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX)
+
+
+def blob_ref_url(ref: str) -> str:
+    """Public URL of a storage:// reference (built locally)."""
+    bucket, _, path = ref[len(BLOB_REF_PREFIX):].partition("/")
+    return storage_service.url_builder.public_url(bucket, path)
+
+
+def _decode_data_url(value: str) -> Optional[tuple]:
+    match = _DATA_URL_RE.match(value)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(value[match.end():], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    mime_type = match.group(1) or "application/octet-stream"
+    return data, mime_type
+
+
+async def _store(value: str, owner: str) -> str:
+    decoded = _decode_data_url(value)
+    if decoded is None:
+        return value
+    data, mime_type = decoded
+    key = (owner, storage_service.content_hash(data))
+    ref = _known_blobs.get(key)
+    if ref is not None:
+        _known_blobs.move_to_end(key)
+        return ref
+
+    extension = (mimetypes.guess_extension(mime_type) or ".bin").lstrip(".")
+    folder = f"{BLOB_FOLDER}/{owner}"
+    try:
+        filename, _ = await storage_service.upload_content_addressed(
+            user_id=folder,
+            file_bytes=data,
+            extension=extension,
+            bucket=BLOB_BUCKET,
+            content_type=mime_type,
+        )
+    except Exception as e:
+        print(f"Warning: Failed to externalize {len(value)} byte data URL, keeping inline: {e}")
+        return value
+
+    ref = f"{BLOB_REF_PREFIX}{BLOB_BUCKET}/{folder}/{filename}"
+    _known_blobs[key] = ref
+    while len(_known_blobs) > _KNOWN_BLOBS_MAX:
+        _known_blobs.popitem(last=False)
+    return ref
+
+
+async def externalize_blobs(value: Any, owner: str = "") -> Any:
+    """Return ``value`` with large data URLs replaced by storage references."""
+    if isinstance(value, str):
+        if len(value) > BLOB_INLINE_MAX_BYTES and value.startswith("data:"):
+            return await _store(value, owner or SHARED_OWNER)
+        return value
+    if isinstance(value, dict):
+        return {k: await externalize_blobs(v, owner) for k, v in value.items()}
+    if isinstance(value, list):
+        return [await externalize_blobs(v, owner) for v in value]
+    return value
+
+
+def rehydrate_blobs(value: Any) -> Any:
+    """Replace storage references with public URLs (no bytes are fetched)."""
+    if isinstance(value, str):
+        return blob_ref_url(value) if is_blob_ref(value) else value
+    if isinstance(value, dict):
+        return {k: rehydrate_blobs(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [rehydrate_blobs(v) for v in value]
+    return value
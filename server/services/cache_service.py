@@ -0,0 +1,234 @@
+"""
+Read-through cache for hot listing queries (canvases, sessions, characters,
+generated content).
+
+Entries are grouped into scopes (normally one per user and namespace). Each
+scope has a generation counter that is part of every key, so invalidating a
+scope is a single counter bump — no key scans, and it works the same on the
+shared backend. The memory backend keeps counters per process, so its
+invalidations are also published on the control bus and every other worker
+bumps its own counter.
+
+Backends (selected with the CACHE_BACKEND env var):
+    memory — per-process TTL + LRU dict (default)
+    redis  — shared across workers (REDIS_URL)
+    none   — caching disabled
+"""
+
+import copy
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.cluster_service import control_bus
+
+
+DEFAULT_TTL_SECONDS = 30.0
+DEFAULT_MAX_ENTRIES = 2048
+
+# Control bus message telling the other workers to drop a scope
+INVALIDATE_MESSAGE = "cache_invalidate"
+
+
+class CacheBackend(ABC):
+    """Interface implemented by every cache backend."""
+
+    # True when every worker sees the same entries and counters
+    shared = True
+
+    @abstractmethod
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (hit, value)."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store ``value`` for ``ttl`` seconds."""
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        """Atomically increment a counter that never expires."""
+
+    @abstractmethod
+    async def get_counter(self, key: str) -> int:
+        """Return a counter's current value (0 if unset)."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Bounded LRU with per-entry expiry. Values are deep-copied on the way in
+    and out so callers can mutate results without corrupting the cache."""
+
+    shared = False
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters: dict = {}
+        self._max_entries = max_entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, copy.deepcopy(value)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+
+class RedisCacheBackend(CacheBackend):
+    """JSON values in Redis, shared by every worker."""
+
+    def __init__(self, client: Any = None, url: str = "", prefix: str = "cache:") -> None:
+        if client is None:
+            try:
+                from redis import asyncio as redis_asyncio
+            except ImportError:
+                raise ImportError("Please install redis: pip install redis")
+            client = redis_asyncio.from_url(
+                url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        self._client = client
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        raw = await self._client.get(self._prefix + key)
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._client.set(
+            self._prefix + key, json.dumps(value, default=str), px=int(ttl * 1000)
+        )
+
+    async def incr(self, key: str) -> int:
+        return int(await self._client.incr(self._prefix + key))
+
+    async def get_counter(self, key: str) -> int:
+        raw = await self._client.get(self._prefix + key)
+        return int(raw) if raw is not None else 0
+
+
+class NullCacheBackend(CacheBackend):
+    """Disables caching while keeping the same call sites."""
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        return False, None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        return None
+
+    async def incr(self, key: str) -> int:
+        return 0
+
+    async def get_counter(self, key: str) -> int:
+        return 0
+
+
+def create_cache_backend(name: str = "") -> CacheBackend:
+    """Build the backend named by ``name`` or the CACHE_BACKEND env var."""
+    name = (name or os.getenv("CACHE_BACKEND", "memory")).lower()
+    if name == "redis":
+        return RedisCacheBackend()
+    if name == "none":
+        return NullCacheBackend()
+    if name != "memory":
+        print(f"Warning: Unknown CACHE_BACKEND '{name}', using in-process cache")
+    return MemoryCacheBackend()
+
+
+class ReadThroughCache:
+    """Scoped read-through cache; the backend is resolved lazily."""
+
+    def __init__(
+        self, backend: Optional[CacheBackend] = None, ttl: float = DEFAULT_TTL_SECONDS
+    ) -> None:
+        self._backend = backend
+        self.ttl = ttl
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            self._backend = create_cache_backend()
+        return self._backend
+
+    @staticmethod
+    def _generation_key(namespace: str, scope: str) -> str:
+        return f"gen:{namespace}:{scope}"
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        scope: str,
+        args: Any,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """Return the cached value for (namespace, scope, args) or load it.
+
+        Backend failures never fail the read; the loader is used instead.
+        """
+        try:
+            generation = await self.backend.get_counter(
+                self._generation_key(namespace, scope)
+            )
+            key = f"{namespace}:{scope}:{generation}:{json.dumps(args, sort_keys=True, default=str)}"
+            hit, value = await self.backend.get(key)
+            if hit:
+                return value
+        except Exception as e:
+            print(f"Warning: Cache read failed for {namespace}:{scope}: {e}")
+            return await loader()
+
+        value = await loader()
+        try:
+            await self.backend.set(key, value, ttl or self.ttl)
+        except Exception as e:
+            print(f"Warning: Cache write failed for {namespace}:{scope}: {e}")
+        return value
+
+    async def invalidate(self, namespace: str, scope: str, broadcast: bool = True) -> None:
+        """Drop every cached entry in a scope, on every worker."""
+        try:
+            await self.backend.incr(self._generation_key(namespace, scope))
+        except Exception as e:
+            print(f"Warning: Cache invalidation failed for {namespace}:{scope}: {e}")
+        if not broadcast or self.backend.shared:
+            return
+        try:
+            await control_bus.publish(INVALIDATE_MESSAGE, {"namespace": namespace, "scope": scope})
+        except Exception as e:
+            print(f"Warning: Failed to publish cache invalidation for {namespace}:{scope}: {e}")
+
+
+# Global cache instance
+cache_service = ReadThroughCache()
+
+
+async def _handle_invalidate(message: Dict[str, Any]) -> None:
+    await cache_service.invalidate(
+        message.get("namespace", ""), message.get("scope", ""), broadcast=False
+    )
+
+
+control_bus.on(INVALIDATE_MESSAGE, _handle_invalidate)
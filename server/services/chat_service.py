@@ -9,11 +9,15 @@ from typing import Dict, Any, List, Optional
 from models.tool_model import ToolInfoJson
 from services.db_service import db_service
 from services.langgraph_service import langgraph_multi_agent
-from services.websocket_service import send_to_websocket
+from services.websocket_service import send_to_websocket, join_session_rooms
 from services.stream_service import add_stream_task, remove_stream_task
 from models.config_model import ModelInfo
 
 
+class ChatSessionNotFound(Exception):
+    """The session does not exist or belongs to another user."""
+
+
 async def handle_chat(data: Dict[str, Any], user_id: str = "") -> None:
     """
     Handle an incoming chat request.
@@ -28,7 +32,11 @@ async def handle_chat(data: Dict[str, Any], user_id: str = "") -> None:
 
     Args:
         data (dict): Chat request data containing:
-            - messages: list of message dicts
+            - message: the new message dict; earlier turns are kept in the
+              session's LangGraph checkpoint
+            - new_session: True for the first message of a session
+            - messages: full list of message dicts (older clients; used
+              instead of message / new_session when message is absent)
             - session_id: unique session identifier
             - canvas_id: canvas identifier (contextual use)
             - text_model: text model configuration
@@ -36,7 +44,12 @@ async def handle_chat(data: Dict[str, Any], user_id: str = "") -> None:
         user_id (str): Authenticated user ID from Supabase JWT.
     """
     # Extract fields from incoming data
-    messages: List[Dict[str, Any]] = data.get('messages', [])
+    if data.get('message'):
+        messages: List[Dict[str, Any]] = [data['message']]
+        new_session = bool(data.get('new_session'))
+    else:
+        messages = data.get('messages', [])
+        new_session = len(messages) == 1
     session_id: str = data.get('session_id', '')
     canvas_id: str = data.get('canvas_id', '')
     text_model: ModelInfo = data.get('text_model', {})
@@ -47,8 +60,13 @@ async def handle_chat(data: Dict[str, Any], user_id: str = "") -> None:
     # TODO: save and fetch system prompt from db or settings config
     system_prompt: Optional[str] = data.get('system_prompt')
 
-    # If there is only one message, create a new chat session
-    if len(messages) == 1:
+    # Continuing a session: it must be the caller's, the server holds its
+    # conversation state
+    if not new_session and not await db_service.get_chat_session(session_id, user_id=user_id):
+        raise ChatSessionNotFound(session_id)
+
+    # Create the chat session with its first message
+    if new_session:
         # create new session
         prompt = messages[0].get('content', '')
         await db_service.create_chat_session(
@@ -60,7 +78,10 @@ async def handle_chat(data: Dict[str, Any], user_id: str = "") -> None:
             user_id=user_id,
         )
 
-    await db_service.create_message(session_id, messages[-1].get('role', 'user'), json.dumps(messages[-1])) if len(messages) > 0 else None
+    await db_service.create_message(session_id, messages[-1].get('role', 'user'), json.dumps(messages[-1]), user_id=user_id) if len(messages) > 0 else None
+
+    # Route this session's events to every open connection of the user
+    await join_session_rooms(user_id, session_id, canvas_id)
 
     # Create and start langgraph_agent task for chat processing
     task = asyncio.create_task(langgraph_multi_agent(
@@ -0,0 +1,294 @@
+"""
+Cross-worker coordination for running several server processes.
+
+Two things have to be shared once there is more than one uvicorn worker:
+
+- socket.io fan-out: an event emitted on one worker must reach sockets
+  connected to the others. create_client_manager() returns the socket.io
+  client manager for the configured backend.
+- control messages: streams, pending tool confirmations and socket
+  connections live in the memory of the worker that owns them. A cancel or
+  a confirmation that arrives at another worker is forwarded on the control
+  bus, and the owning worker handles it and replies.
+
+Backends (selected with the CLUSTER_BACKEND env var):
+    local    — single process (default); nothing leaves the process
+    redis    — Redis pub/sub (REDIS_URL)
+    postgres — Postgres LISTEN/NOTIFY (DATABASE_URL)
+"""
+
+import asyncio
+import json
+import os
+import socket
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import socketio  # type: ignore
+from socketio.async_pubsub_manager import AsyncPubSubManager  # type: ignore
+
+
+# Identifies this process in replies and in connection metadata
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+CONTROL_CHANNEL = "higgs_control"
+SOCKETIO_CHANNEL = "higgs_socketio"
+# Seconds to wait for the worker that owns a stream / confirmation to answer
+REQUEST_TIMEOUT = float(os.getenv("CLUSTER_REQUEST_TIMEOUT", "2"))
+# NOTIFY payloads are limited to 8000 bytes; larger ones go through a table
+NOTIFY_MAX_BYTES = 7900
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def cluster_backend_name() -> str:
+    return os.getenv("CLUSTER_BACKEND", "local").lower()
+
+
+class _PostgresChannel:
+    """LISTEN/NOTIFY on one channel, spilling large payloads to a table."""
+
+    def __init__(self, url: str, channel: str) -> None:
+        try:
+            import asyncpg  # type: ignore
+        except ImportError:
+            raise ImportError("Please install asyncpg: pip install asyncpg")
+        self._asyncpg = asyncpg
+        self.url = url or os.getenv("DATABASE_URL", "")
+        self.channel = channel
+        self._pool: Any = None
+        self._spills = 0
+
+    async def _get_pool(self) -> Any:
+        if self._pool is None:
+            pool = await self._asyncpg.create_pool(self.url, min_size=1, max_size=4)
+            await pool.execute(
+                "CREATE UNLOGGED TABLE IF NOT EXISTS cluster_payloads ("
+                "id BIGSERIAL PRIMARY KEY, payload TEXT NOT NULL, "
+                "created_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            )
+            self._pool = pool
+        return self._pool
+
+    async def publish(self, payload: str) -> None:
+        pool = await self._get_pool()
+        if len(payload.encode("utf-8")) > NOTIFY_MAX_BYTES:
+            row_id = await pool.fetchval(
+                "INSERT INTO cluster_payloads (payload) VALUES ($1) RETURNING id", payload
+            )
+            payload = json.dumps({"$ref": row_id})
+            self._spills += 1
+            if self._spills % 100 == 0:
+                await pool.execute(
+                    "DELETE FROM cluster_payloads WHERE created_at < now() - interval '5 minutes'"
+                )
+        await pool.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def listen(self) -> AsyncIterator[Dict[str, Any]]:
+        conn = await self._asyncpg.connect(self.url)
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        await conn.add_listener(self.channel, lambda *args: queue.put_nowait(args[-1]))
+        try:
+            while True:
+                message = json.loads(await queue.get())
+                if isinstance(message, dict) and list(message) == ["$ref"]:
+                    raw = await conn.fetchval(
+                        "SELECT payload FROM cluster_payloads WHERE id = $1", message["$ref"]
+                    )
+                    if raw is None:
+                        continue
+                    message = json.loads(raw)
+                yield message
+        finally:
+            await conn.close()
+
+
+class AsyncPostgresManager(AsyncPubSubManager):
+    """socket.io client manager over Postgres LISTEN/NOTIFY."""
+
+    name = "asyncpostgres"
+
+    def __init__(self, url: str = "", channel: str = SOCKETIO_CHANNEL, write_only: bool = False, logger: Any = None) -> None:
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._pg = _PostgresChannel(url, channel)
+
+    async def _publish(self, data: Any) -> None:
+        await self._pg.publish(json.dumps(data, default=str))
+
+    async def _listen(self) -> AsyncIterator[Dict[str, Any]]:
+        async for message in self._pg.listen():
+            yield message
+
+
+def create_client_manager(name: str = "") -> Optional[socketio.AsyncManager]:
+    """socket.io client manager for ``name`` or CLUSTER_BACKEND (None = in-process)."""
+    name = name or cluster_backend_name()
+    if name == "redis":
+        return socketio.AsyncRedisManager(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"), channel=SOCKETIO_CHANNEL
+        )
+    if name == "postgres":
+        return AsyncPostgresManager()
+    if name != "local":
+        print(f"Warning: Unknown CLUSTER_BACKEND '{name}', running single-process")
+    return None
+
+
+class ControlBus(ABC):
+    """Fire-and-forget and request/reply messages between workers.
+
+    A message is handled by every worker except the one that sent it; the
+    sender is expected to have done its local part already.
+    """
+
+    distributed = True
+
+    def __init__(self) -> None:
+        self.worker_id = WORKER_ID
+        self._handlers: Dict[str, Handler] = {}
+        self._replies: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def _send(self, message: Dict[str, Any]) -> None:
+        """Deliver ``message`` to every worker."""
+
+    @abstractmethod
+    def _listen(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield messages published by any worker."""
+
+    def on(self, message_type: str, handler: Handler) -> None:
+        """Register the handler for ``message_type``; a non-None result is the reply."""
+        self._handlers[message_type] = handler
+
+    async def start(self) -> None:
+        if self.distributed and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def publish(self, message_type: str, payload: Dict[str, Any]) -> None:
+        if not self.distributed:
+            return
+        await self.start()
+        await self._send({**payload, "type": message_type, "origin": self.worker_id})
+
+    async def request(self, message_type: str, payload: Dict[str, Any], timeout: float = REQUEST_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """Ask the other workers; returns the first reply or None on timeout."""
+        if not self.distributed:
+            return None
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._replies[request_id] = future
+        try:
+            await self.publish(message_type, {**payload, "request_id": request_id})
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._replies.pop(request_id, None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async for message in self._listen():
+                    await self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Warning: Control bus listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    async def _dispatch(self, message: Dict[str, Any]) -> None:
+        if message.get("type") == "reply":
+            future = self._replies.get(message.get("request_id", ""))
+            if future is not None and not future.done():
+                future.set_result(message.get("result") or {})
+            return
+        handler = self._handlers.get(message.get("type", ""))
+        if handler is None or message.get("origin") == self.worker_id:
+            return
+        try:
+            result = await handler(message)
+        except Exception as e:
+            print(f"Warning: Control message {message.get('type')} failed: {e}")
+            return
+        if result is not None and message.get("request_id"):
+            await self._send({
+                "type": "reply",
+                "origin": self.worker_id,
+                "request_id": message["request_id"],
+                "result": {**result, "worker_id": self.worker_id},
+            })
+
+
+class LocalControlBus(ControlBus):
+    """Single process: there is nobody else to talk to."""
+
+    distributed = False
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        return None
+
+    async def _listen(self) -> AsyncIterator[Dict[str, Any]]:
+        return
+        yield  # pragma: no cover
+
+
+class RedisControlBus(ControlBus):
+    def __init__(self, client: Any = None, url: str = "", channel: str = CONTROL_CHANNEL) -> None:
+        super().__init__()
+        if client is None:
+            try:
+                from redis import asyncio as redis_asyncio
+            except ImportError:
+                raise ImportError("Please install redis: pip install redis")
+            client = redis_asyncio.from_url(
+                url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        self._client = client
+        self._channel = channel
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        await self._client.publish(self._channel, json.dumps(message, default=str))
+
+    async def _listen(self) -> AsyncIterator[Dict[str, Any]]:
+        pubsub = self._client.pubsub()
+        await pubsub.subscribe(self._channel)
+        try:
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    yield json.loads(item["data"])
+        finally:
+            await pubsub.unsubscribe(self._channel)
+
+
+class PostgresControlBus(ControlBus):
+    def __init__(self, url: str = "", channel: str = CONTROL_CHANNEL) -> None:
+        super().__init__()
+        self._pg = _PostgresChannel(url, channel)
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        await self._pg.publish(json.dumps(message, default=str))
+
+    async def _listen(self) -> AsyncIterator[Dict[str, Any]]:
+        async for message in self._pg.listen():
+            yield message
+
+
+def create_control_bus(name: str = "") -> ControlBus:
+    """Build the bus named by ``name`` or the CLUSTER_BACKEND env var."""
+    name = name or cluster_backend_name()
+    if name == "redis":
+        return RedisControlBus()
+    if name == "postgres":
+        return PostgresControlBus()
+    return LocalControlBus()
+
+
+control_bus = create_control_bus()
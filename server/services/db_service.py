@@ -1,17 +1,281 @@
 """
-Database service backed by Supabase (PostgreSQL).
-Replaces the previous SQLite/aiosqlite implementation.
+Database service.
+
+DatabaseRepository is the interface used by the rest of the server; the
+default implementation is backed by Supabase (PostgreSQL). An embedded
+aiosqlite implementation lives in services/sqlite_db_service.py and is
+selected with DB_BACKEND=sqlite.
 All user-scoped methods accept a user_id parameter.
 """
 
+import os
 import json
-from typing import List, Dict, Any, Optional
+import uuid
+import base64
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 from services.supabase_service import get_supabase
+from services.cache_service import ReadThroughCache, cache_service
+from services.blob_service import externalize_blobs, rehydrate_blobs
+from utils.singleflight import singleflight
+
+# Cache namespaces for the per-user listings
+CANVASES_CACHE = "canvases"
+SESSIONS_CACHE = "sessions"
+CONTENT_CACHE = "generated_content"
+
+
+class CanvasVersionConflict(Exception):
+    """Raised when a canvas delta was built against a stale version."""
+
+    def __init__(self, canvas_id: str, base_version: int):
+        super().__init__(
+            f"Canvas {canvas_id} has changed since version {base_version}"
+        )
+        self.canvas_id = canvas_id
+        self.base_version = base_version
+
+
+def encode_content_cursor(item: Dict[str, Any]) -> str:
+    """Build an opaque keyset cursor pointing just past ``item``."""
+    raw = json.dumps([item.get("created_at"), item.get("id")])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_content_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode a cursor from encode_content_cursor; raises ValueError if invalid.
+
+    The values end up in a PostgREST filter string, so only an ISO timestamp
+    and a UUID are accepted.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded))
+        datetime.fromisoformat(created_at)
+        id = str(uuid.UUID(id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, id
+
+
+class DatabaseRepository(ABC):
+    """Storage-agnostic interface for canvases, chats and generated content."""
+
+    # Map feature types to their known model names (for old records without feature_type)
+    FEATURE_MODEL_MAP = {
+        "face_swap": ["codeplugtech/face-swap"],
+    }
+
+    # ── Canvases ──────────────────────────────────────────────────────────
+
+    @abstractmethod
+    async def create_canvas(self, id: str, name: str, user_id: str = ""): ...
+
+    @abstractmethod
+    async def list_canvases(self, user_id: str = "") -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_canvas_data(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_canvas_document(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_canvas(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def save_canvas_data(self, id: str, data: str, thumbnail: str = None, user_id: str = ""): ...
+
+    @abstractmethod
+    async def apply_canvas_delta(
+        self,
+        id: str,
+        upserts: Optional[List[Dict[str, Any]]] = None,
+        deletes: Optional[List[str]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        app_state: Optional[Dict[str, Any]] = None,
+        base_version: Optional[int] = None,
+        thumbnail: Optional[str] = None,
+        user_id: str = "",
+    ) -> Optional[int]: ...
+
+    @abstractmethod
+    async def delete_canvas(self, id: str, user_id: str = ""): ...
+
+    @abstractmethod
+    async def rename_canvas(self, id: str, name: str, user_id: str = ""): ...
+
+    # ── Chat Sessions / Messages ──────────────────────────────────────────
+
+    @abstractmethod
+    async def create_chat_session(
+        self,
+        id: str,
+        model: str,
+        provider: str,
+        canvas_id: str,
+        title: Optional[str] = None,
+        user_id: str = "",
+    ): ...
+
+    @abstractmethod
+    async def get_chat_session(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def list_sessions(self, canvas_id: str = "", user_id: str = "") -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def create_message(self, session_id: str, role: str, message: str, user_id: str = ""): ...
+
+    @abstractmethod
+    async def create_messages(
+        self, session_id: str, messages: List[Tuple[str, str]], user_id: str = ""
+    ): ...
+
+    @abstractmethod
+    async def get_chat_history(self, session_id: str, user_id: str = "") -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_chat_history_page(
+        self,
+        session_id: str,
+        user_id: str = "",
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]: ...
+
+    # ── Generated Content ─────────────────────────────────────────────────
+
+    @abstractmethod
+    async def insert_generated_content(self, data: Dict[str, Any]): ...
+
+    async def upsert_generated_content(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Insert a generated_content row, or merge into the existing one.
+
+        Rows are keyed by (user_id, storage_path). On conflict the incoming
+        metadata keys are merged over the stored ones (so callers can patch in
+        e.g. feature_type), while prompt/model/type only fill in blanks.
+        The returned row has ``inserted`` False when it was merged.
+        One round trip, safe under concurrent writers.
+        """
+        rows = await self.upsert_generated_content_bulk([data])
+        return rows[0] if rows else None
+
+    @abstractmethod
+    async def upsert_generated_content_bulk(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def list_generated_content(
+        self,
+        user_id: str,
+        content_type: Optional[str] = None,
+        feature_type: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_generated_content(self, id: str, user_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def delete_generated_content(self, id: str, user_id: str): ...
+
+    # ── Vibe Motion Projects ──────────────────────────────────────────────
+
+    @abstractmethod
+    async def create_vibe_motion_project(self, id: str, name: str, preset: str, user_id: str = "", **fields): ...
 
+    @abstractmethod
+    async def list_vibe_motion_projects(
+        self, user_id: str = "", limit: int = 50, offset: int = 0
+    ) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_vibe_motion_project(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def update_vibe_motion_project(self, id: str, user_id: str = "", **fields): ...
 
-class DatabaseService:
-    def __init__(self):
-        pass
+    @abstractmethod
+    async def delete_vibe_motion_project(self, id: str, user_id: str = ""): ...
+
+    # ── Shared helpers ────────────────────────────────────────────────────
+
+    @staticmethod
+    def _parse_message(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        msg = row.get("message")
+        # msg is normally already a dict (JSONB)
+        if isinstance(msg, str):
+            try:
+                msg = json.loads(msg)
+            except (json.JSONDecodeError, TypeError):
+                return None
+        return rehydrate_blobs(msg)
+
+    @staticmethod
+    def _merge_content_rows(
+        rows: List[Dict[str, Any]]
+    ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Collapse rows sharing (user_id, storage_path) with upsert semantics."""
+        merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for row in rows:
+            key = (row.get("user_id", ""), row.get("storage_path", ""))
+            if key in merged:
+                existing = merged[key]
+                existing["metadata"] = {
+                    **(existing.get("metadata") or {}),
+                    **(row.get("metadata") or {}),
+                }
+                for field in ("type", "prompt", "model"):
+                    if not existing.get(field):
+                        existing[field] = row.get(field)
+            else:
+                merged[key] = {**row, "metadata": dict(row.get("metadata") or {})}
+        return merged
+
+    def _flatten_metadata(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten metadata JSONB fields into top-level fields for frontend compatibility."""
+        if not item:
+            return item
+        metadata = item.get("metadata", {})
+        if isinstance(metadata, str):
+            try:
+                metadata = json.loads(metadata)
+            except (json.JSONDecodeError, TypeError):
+                metadata = {}
+        return {
+            **item,
+            "filename": metadata.get("filename"),
+            "public_url": metadata.get("public_url"),
+            "provider": metadata.get("provider"),
+            "aspect_ratio": metadata.get("aspect_ratio"),
+            "width": metadata.get("width"),
+            "height": metadata.get("height"),
+            "metadata": metadata,
+        }
+
+
+class DatabaseService(DatabaseRepository):
+    """Supabase (PostgREST) implementation."""
+
+    def __init__(self, cache: Optional[ReadThroughCache] = None):
+        self._cache = cache or cache_service
+
+    async def _cached(self, namespace: str, user_id: str, args: Any, loader):
+        """Read-through for user-scoped listings; unscoped reads bypass the cache."""
+        if not user_id:
+            return await loader()
+        return await self._cache.get_or_load(namespace, user_id, args, loader)
+
+    async def _invalidate(self, user_id: str, *namespaces: str):
+        if not user_id:
+            return
+        for namespace in namespaces:
+            await self._cache.invalidate(namespace, user_id)
 
     # ── Canvases ──────────────────────────────────────────────────────────
 
@@ -23,54 +287,149 @@ class DatabaseService:
             .insert({"id": id, "name": name, "user_id": user_id})
             .execute()
         )
+        await self._invalidate(user_id, CANVASES_CACHE)
 
     async def list_canvases(self, user_id: str = "") -> List[Dict[str, Any]]:
         """List canvases for a user."""
-        sb = await get_supabase()
-        query = sb.table("canvases").select(
-            "id, name, description, thumbnail, created_at, updated_at"
-        )
-        if user_id:
-            query = query.eq("user_id", user_id)
-        result = await query.order("updated_at", desc=True).execute()
-        return result.data or []
 
-    async def get_canvas_data(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
-        """Get canvas data including sessions."""
+        async def load() -> List[Dict[str, Any]]:
+            sb = await get_supabase()
+            query = sb.table("canvases").select(
+                "id, name, description, thumbnail, created_at, updated_at"
+            )
+            if user_id:
+                query = query.eq("user_id", user_id)
+            result = await query.order("updated_at", desc=True).execute()
+            return rehydrate_blobs(result.data or [])
+
+        return await self._cached(CANVASES_CACHE, user_id, None, load)
+
+    async def _fetch_canvas(
+        self, id: str, user_id: str, columns: str, sessions: bool
+    ) -> Optional[Dict[str, Any]]:
         sb = await get_supabase()
-        query = sb.table("canvases").select("data, name").eq("id", id)
+        query = sb.table("canvases").select(columns).eq("id", id)
         if user_id:
             query = query.eq("user_id", user_id)
+        if sessions:
+            query = query.order("updated_at", desc=True, foreign_table="chat_sessions")
         result = await query.maybe_single().execute()
         row = result.data
         if not row:
             return None
 
-        sessions = await self.list_sessions(id)
         data_raw = row.get("data")
         if isinstance(data_raw, str):
             try:
                 data_raw = json.loads(data_raw)
             except (json.JSONDecodeError, TypeError):
                 data_raw = {}
-        return {
-            "data": data_raw or {},
+        canvas = {
+            "data": rehydrate_blobs(data_raw or {}),
             "name": row.get("name", ""),
-            "sessions": sessions,
+            "version": row.get("version", 0),
         }
+        if sessions:
+            canvas["sessions"] = row.get("chat_sessions") or []
+        return canvas
+
+    @singleflight
+    async def get_canvas_data(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        """Get canvas data including sessions.
+
+        Concurrent opens of the same canvas share one request. Sessions are
+        embedded through the chat_sessions.canvas_id foreign key, so the
+        canvas and its sessions come back in a single request.
+        """
+        return await self._fetch_canvas(
+            id,
+            user_id,
+            "data, name, version, "
+            "chat_sessions(id, title, model, provider, created_at, updated_at)",
+            sessions=True,
+        )
+
+    async def get_canvas_document(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        """Get only the canvas document (data, name, version), without sessions.
+
+        For internal callers such as element placement that never look at
+        sessions.
+        """
+        return await self._fetch_canvas(id, user_id, "data, name, version", sessions=False)
+
+    async def get_canvas(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        """Get one canvas row without its document (uncached, for ownership checks)."""
+        sb = await get_supabase()
+        query = sb.table("canvases").select("id, user_id").eq("id", id)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        result = await query.maybe_single().execute()
+        return result.data if result is not None else None
 
     async def save_canvas_data(self, id: str, data: str, thumbnail: str = None, user_id: str = ""):
-        """Save canvas data (JSON string)."""
+        """Save canvas data (JSON string).
+
+        Inline data URLs above the blob threshold (files[*].dataURL, a data URL
+        thumbnail) are moved to Storage and stored as references.
+        """
         sb = await get_supabase()
         update_payload: Dict[str, Any] = {
-            "data": json.loads(data) if isinstance(data, str) else data
+            "data": await externalize_blobs(
+                json.loads(data) if isinstance(data, str) else data, user_id
+            )
         }
         if thumbnail is not None:
-            update_payload["thumbnail"] = thumbnail
+            update_payload["thumbnail"] = await externalize_blobs(thumbnail, user_id)
         query = sb.table("canvases").update(update_payload).eq("id", id)
         if user_id:
             query = query.eq("user_id", user_id)
         await query.execute()
+        await self._invalidate(user_id, CANVASES_CACHE)
+
+    async def apply_canvas_delta(
+        self,
+        id: str,
+        upserts: Optional[List[Dict[str, Any]]] = None,
+        deletes: Optional[List[str]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        app_state: Optional[Dict[str, Any]] = None,
+        base_version: Optional[int] = None,
+        thumbnail: Optional[str] = None,
+        user_id: str = "",
+    ) -> Optional[int]:
+        """Apply element-level changes to a canvas without resending the document.
+
+        Elements in ``upserts`` replace existing elements with the same id (or
+        are appended), ids in ``deletes`` are removed and ``files`` is merged
+        into the files map. When ``base_version`` is given and the canvas has
+        moved on, CanvasVersionConflict is raised.
+
+        Returns the new canvas version, or None if the canvas does not exist.
+        """
+        upserts = await externalize_blobs(upserts or [], user_id)
+        files = await externalize_blobs(files or {}, user_id)
+        thumbnail = await externalize_blobs(thumbnail, user_id)
+        sb = await get_supabase()
+        result = await sb.rpc(
+            "apply_canvas_delta",
+            {
+                "p_canvas_id": id,
+                "p_user_id": user_id or None,
+                "p_base_version": base_version,
+                "p_upserts": upserts or [],
+                "p_deletes": deletes or [],
+                "p_files": files or {},
+                "p_app_state": app_state,
+                "p_thumbnail": thumbnail,
+            },
+        ).execute()
+        await self._invalidate(user_id, CANVASES_CACHE)
+        version = result.data
+        if version is None:
+            return None
+        if version < 0:
+            raise CanvasVersionConflict(id, base_version or 0)
+        return version
 
     async def delete_canvas(self, id: str, user_id: str = ""):
         """Delete canvas and related data (cascade handled by FK)."""
@@ -79,6 +438,7 @@ class DatabaseService:
         if user_id:
             query = query.eq("user_id", user_id)
         await query.execute()
+        await self._invalidate(user_id, CANVASES_CACHE, SESSIONS_CACHE)
 
     async def rename_canvas(self, id: str, name: str, user_id: str = ""):
         """Rename a canvas."""
@@ -87,6 +447,7 @@ class DatabaseService:
         if user_id:
             query = query.eq("user_id", user_id)
         await query.execute()
+        await self._invalidate(user_id, CANVASES_CACHE)
 
     # ── Chat Sessions ─────────────────────────────────────────────────────
 
@@ -111,153 +472,180 @@ class DatabaseService:
         if title:
             payload["title"] = title
         await sb.table("chat_sessions").insert(payload).execute()
+        await self._invalidate(user_id, SESSIONS_CACHE)
+
+    async def get_chat_session(
+        self, id: str, user_id: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """Get one chat session (uncached, for ownership checks)."""
+        sb = await get_supabase()
+        query = sb.table("chat_sessions").select("id, canvas_id, user_id").eq("id", id)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        result = await query.maybe_single().execute()
+        return result.data if result is not None else None
 
     async def list_sessions(
         self, canvas_id: str = "", user_id: str = ""
     ) -> List[Dict[str, Any]]:
         """List chat sessions, optionally filtered by canvas_id."""
-        sb = await get_supabase()
-        query = sb.table("chat_sessions").select(
-            "id, title, model, provider, created_at, updated_at"
-        )
-        if canvas_id:
-            query = query.eq("canvas_id", canvas_id)
-        if user_id:
-            query = query.eq("user_id", user_id)
-        result = await query.order("updated_at", desc=True).execute()
-        return result.data or []
+
+        async def load() -> List[Dict[str, Any]]:
+            sb = await get_supabase()
+            query = sb.table("chat_sessions").select(
+                "id, title, model, provider, created_at, updated_at"
+            )
+            if canvas_id:
+                query = query.eq("canvas_id", canvas_id)
+            if user_id:
+                query = query.eq("user_id", user_id)
+            result = await query.order("updated_at", desc=True).execute()
+            return result.data or []
+
+        return await self._cached(SESSIONS_CACHE, user_id, canvas_id, load)
 
     # ── Chat Messages ─────────────────────────────────────────────────────
 
-    async def create_message(self, session_id: str, role: str, message: str):
-        """Save a chat message."""
+    async def create_message(self, session_id: str, role: str, message: str, user_id: str = ""):
+        """Save a chat message; large inline data URLs are moved to Storage."""
         sb = await get_supabase()
         # message is a JSON string — store as JSONB
         try:
             msg_data = json.loads(message) if isinstance(message, str) else message
         except (json.JSONDecodeError, TypeError):
             msg_data = message
+        msg_data = await externalize_blobs(msg_data, user_id)
         await (
             sb.table("chat_messages")
             .insert({"session_id": session_id, "role": role, "message": msg_data})
             .execute()
         )
 
+    async def create_messages(
+        self, session_id: str, messages: List[Tuple[str, str]], user_id: str = ""
+    ):
+        """Save several (role, message) pairs in one insert, preserving order."""
+        if not messages:
+            return
+        rows = []
+        for role, message in messages:
+            try:
+                msg_data = json.loads(message) if isinstance(message, str) else message
+            except (json.JSONDecodeError, TypeError):
+                msg_data = message
+            rows.append(
+                {
+                    "session_id": session_id,
+                    "role": role,
+                    "message": await externalize_blobs(msg_data, user_id),
+                }
+            )
+        sb = await get_supabase()
+        await sb.table("chat_messages").insert(rows).execute()
+
+    def _history_query(self, sb: Any, session_id: str, user_id: str = ""):
+        """Select messages of a session, scoped to the owner in the same query.
+
+        The inner join on chat_sessions replaces a separate ownership lookup:
+        messages of a session owned by someone else simply match no rows.
+        """
+        if user_id:
+            return (
+                sb.table("chat_messages")
+                .select("id, role, message, chat_sessions!inner(user_id)")
+                .eq("session_id", session_id)
+                .eq("chat_sessions.user_id", user_id)
+            )
+        return (
+            sb.table("chat_messages")
+            .select("id, role, message")
+            .eq("session_id", session_id)
+        )
+
     async def get_chat_history(
         self, session_id: str, user_id: str = ""
     ) -> List[Dict[str, Any]]:
         """Get chat history for a session."""
         sb = await get_supabase()
-        # Verify the session belongs to this user
-        if user_id:
-            session_check = await (
-                sb.table("chat_sessions")
-                .select("id")
-                .eq("id", session_id)
-                .eq("user_id", user_id)
-                .maybe_single()
-                .execute()
-            )
-            if not session_check.data:
-                return []
         result = await (
-            sb.table("chat_messages")
-            .select("role, message, id")
-            .eq("session_id", session_id)
+            self._history_query(sb, session_id, user_id)
             .order("id", desc=False)
             .execute()
         )
         messages = []
         for row in result.data or []:
-            msg = row.get("message")
+            msg = self._parse_message(row)
             if msg is not None:
-                # msg is already a dict (JSONB), no need to parse
-                if isinstance(msg, str):
-                    try:
-                        msg = json.loads(msg)
-                    except (json.JSONDecodeError, TypeError):
-                        continue
                 messages.append(msg)
         return messages
 
+    async def get_chat_history_page(
+        self,
+        session_id: str,
+        user_id: str = "",
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """Get one page of chat history using message-id cursors.
+
+        Without cursors the newest ``limit`` messages are returned. ``before_id``
+        pages backwards into older history; ``after_id`` fetches only messages
+        added since the client's last known id. Messages are always returned
+        oldest first.
+        """
+        sb = await get_supabase()
+        query = self._history_query(sb, session_id, user_id)
+        if after_id is not None:
+            query = query.gt("id", after_id).order("id", desc=False)
+        else:
+            if before_id is not None:
+                query = query.lt("id", before_id)
+            query = query.order("id", desc=True)
+        result = await query.limit(limit + 1).execute()
+
+        rows = result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after_id is None:
+            rows.reverse()
+
+        messages = []
+        for row in rows:
+            msg = self._parse_message(row)
+            if msg is not None:
+                messages.append({"id": row.get("id"), "message": msg})
+        return {
+            "messages": messages,
+            "first_id": rows[0].get("id") if rows else None,
+            "last_id": rows[-1].get("id") if rows else None,
+            "has_more": has_more,
+        }
+
     # ── Generated Content ─────────────────────────────────────────────────
 
     async def insert_generated_content(self, data: Dict[str, Any]):
         """Insert a row into the generated_content table."""
         sb = await get_supabase()
         await sb.table("generated_content").insert(data).execute()
+        await self._invalidate(data.get("user_id", ""), CONTENT_CACHE)
 
-    async def update_content_feature_type(
-        self, user_id: str, storage_path: str, feature_type: str
-    ):
-        """Update the feature_type inside metadata JSONB for a matching record."""
-        sb = await get_supabase()
-        # Fetch the existing record
-        result = await (
-            sb.table("generated_content")
-            .select("id, metadata")
-            .eq("user_id", user_id)
-            .eq("storage_path", storage_path)
-            .limit(1)
-            .execute()
-        )
-        if not result.data:
-            return
-        row = result.data[0]
-        metadata = row.get("metadata") or {}
-        if isinstance(metadata, str):
-            try:
-                metadata = json.loads(metadata)
-            except (json.JSONDecodeError, TypeError):
-                metadata = {}
-        metadata["feature_type"] = feature_type
-        await (
-            sb.table("generated_content")
-            .update({"metadata": metadata})
-            .eq("id", row["id"])
-            .execute()
-        )
-
-    async def content_exists_by_storage_path(
-        self, user_id: str, storage_path: str
-    ) -> bool:
-        """Check if a generated_content record already exists for this user + storage_path."""
+    async def upsert_generated_content_bulk(
+        self, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Upsert many generated_content rows in a single request."""
+        # Postgres cannot touch the same row twice in one statement, so merge
+        # duplicate keys client-side first.
+        merged = self._merge_content_rows(rows)
+        if not merged:
+            return []
         sb = await get_supabase()
-        result = await (
-            sb.table("generated_content")
-            .select("id")
-            .eq("user_id", user_id)
-            .eq("storage_path", storage_path)
-            .limit(1)
-            .execute()
-        )
-        return bool(result.data)
-
-    def _flatten_metadata(self, item: Dict[str, Any]) -> Dict[str, Any]:
-        """Flatten metadata JSONB fields into top-level fields for frontend compatibility."""
-        if not item:
-            return item
-        metadata = item.get("metadata", {})
-        if isinstance(metadata, str):
-            try:
-                metadata = json.loads(metadata)
-            except (json.JSONDecodeError, TypeError):
-                metadata = {}
-        return {
-            **item,
-            "filename": metadata.get("filename"),
-            "public_url": metadata.get("public_url"),
-            "provider": metadata.get("provider"),
-            "aspect_ratio": metadata.get("aspect_ratio"),
-            "width": metadata.get("width"),
-            "height": metadata.get("height"),
-            "metadata": metadata,
-        }
-
-    # Map feature types to their known model names (for old records without feature_type)
-    FEATURE_MODEL_MAP = {
-        "face_swap": ["codeplugtech/face-swap"],
-    }
+        result = await sb.rpc(
+            "upsert_generated_content", {"p_rows": list(merged.values())}
+        ).execute()
+        for user_id in {user_id for user_id, _ in merged}:
+            await self._invalidate(user_id, CONTENT_CACHE)
+        return result.data or []
 
     async def list_generated_content(
         self,
@@ -266,28 +654,69 @@ class DatabaseService:
         feature_type: Optional[str] = None,
         limit: int = 50,
         offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """List generated content for a user, newest first.
+
+        Pass ``cursor`` (see encode_content_cursor) for keyset pagination on
+        (created_at, id), which stays constant-time on deep pages; ``offset``
+        is kept for older clients.
+        """
+        if cursor:
+            # Validate before touching the cache so bad cursors always raise
+            decode_content_cursor(cursor)
+        return await self._cached(
+            CONTENT_CACHE,
+            user_id,
+            [content_type, feature_type, limit, offset, cursor],
+            lambda: self._load_generated_content(
+                user_id, content_type, feature_type, limit, offset, cursor
+            ),
+        )
+
+    async def _load_generated_content(
+        self,
+        user_id: str,
+        content_type: Optional[str],
+        feature_type: Optional[str],
+        limit: int,
+        offset: int,
+        cursor: Optional[str],
     ) -> List[Dict[str, Any]]:
-        """List generated content for a user."""
         sb = await get_supabase()
         query = sb.table("generated_content").select("*").eq("user_id", user_id)
         if content_type:
             query = query.eq("type", content_type)
+
+        or_groups: List[str] = []
         if feature_type:
-            # Use OR to match both new records (with feature_type in metadata)
-            # and old records (matched by known model names)
+            # Use OR to match both new records (feature_type column) and old
+            # records without feature_type (matched by known model names)
             models = self.FEATURE_MODEL_MAP.get(feature_type, [])
             if models:
-                or_parts = [f"metadata->>feature_type.eq.{feature_type}"]
+                or_parts = [f"feature_type.eq.{feature_type}"]
                 for m in models:
                     or_parts.append(f"model.eq.{m}")
-                query = query.or_(",".join(or_parts))
+                or_groups.append(",".join(or_parts))
             else:
-                query = query.eq("metadata->>feature_type", feature_type)
-        result = await (
-            query.order("created_at", desc=True)
-            .range(offset, offset + limit - 1)
-            .execute()
-        )
+                query = query.eq("feature_type", feature_type)
+        if cursor:
+            created_at, last_id = decode_content_cursor(cursor)
+            or_groups.append(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{last_id})'
+            )
+        if len(or_groups) == 1:
+            query = query.or_(or_groups[0])
+        elif or_groups:
+            query = query.or_(f"and({','.join(f'or({g})' for g in or_groups)})")
+
+        query = query.order("created_at", desc=True).order("id", desc=True)
+        if cursor:
+            query = query.limit(limit)
+        else:
+            query = query.range(offset, offset + limit - 1)
+        result = await query.execute()
         items = result.data or []
         return [self._flatten_metadata(item) for item in items]
 
@@ -317,6 +746,7 @@ class DatabaseService:
             .eq("user_id", user_id)
             .execute()
         )
+        await self._invalidate(user_id, CONTENT_CACHE)
 
     # ── Vibe Motion Projects ─────────────────────────────────────────────────
 
@@ -449,5 +879,17 @@ class DatabaseService:
         await query.execute()
 
 
+def create_db_service(name: str = "") -> DatabaseRepository:
+    """Build the repository named by ``name`` or the DB_BACKEND env var."""
+    name = (name or os.getenv("DB_BACKEND", "supabase")).lower()
+    if name == "sqlite":
+        from services.sqlite_db_service import SQLiteDatabaseService
+
+        return SQLiteDatabaseService()
+    if name != "supabase":
+        print(f"Warning: Unknown DB_BACKEND '{name}', using Supabase")
+    return DatabaseService()
+
+
 # Singleton instance
-db_service = DatabaseService()
+db_service = create_db_service()
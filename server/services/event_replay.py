@@ -0,0 +1,192 @@
+"""
+Per-session replay buffer for websocket events.
+
+Every `session_update` event is stamped with a per-session `seq` (1, 2, 3...)
+and kept in a bounded ring buffer. A client that reconnects mid-stream sends
+the last seq it processed and gets everything after it replayed, instead of
+refetching the whole session. When the gap is older than the buffer,
+events_since() returns None and the client is sent a full snapshot instead.
+
+The in-process buffer is bounded in bytes as well as events, per session and
+overall: a large `all_messages` snapshot pushes older events out, or is not
+kept at all, and a client that missed it is sent a fresh snapshot instead.
+
+Backends (selected with the EVENT_REPLAY_BACKEND env var):
+    memory — per-process ring buffers (default)
+    redis  — shared across workers (REDIS_URL)
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+# Events kept per session
+REPLAY_BUFFER_SIZE = int(os.getenv("EVENT_REPLAY_BUFFER_SIZE", "512"))
+# Serialized bytes kept per session, and in total, by the in-process backend
+REPLAY_SESSION_MAX_BYTES = int(os.getenv("EVENT_REPLAY_SESSION_MAX_BYTES", str(1024 * 1024)))
+REPLAY_MAX_BYTES = int(os.getenv("EVENT_REPLAY_MAX_BYTES", str(64 * 1024 * 1024)))
+# Sessions kept by the in-process backend
+REPLAY_MAX_SESSIONS = 1024
+# Idle buffers expire from Redis after this many seconds
+REPLAY_TTL_SECONDS = 3600
+
+
+class ReplayBuffer(ABC):
+    """Interface implemented by every replay backend."""
+
+    @abstractmethod
+    async def append(self, session_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Stamp ``event`` with the session's next seq, store and return it."""
+
+    @abstractmethod
+    async def events_since(self, session_id: str, after_seq: int) -> Optional[List[Dict[str, Any]]]:
+        """Events with seq > ``after_seq``, or None if some were already dropped."""
+
+
+def _missing(events: List[Dict[str, Any]], after_seq: int, last_seq: int) -> Optional[List[Dict[str, Any]]]:
+    if after_seq >= last_seq:
+        return []
+    if not events or events[0]["seq"] > after_seq + 1:
+        return None
+    return [e for e in events if e["seq"] > after_seq]
+
+
+def _event_size(event: Dict[str, Any]) -> int:
+    return len(json.dumps(event, default=str))
+
+
+class _SessionLog:
+    __slots__ = ("last_seq", "events", "bytes")
+
+    def __init__(self) -> None:
+        self.last_seq = 0
+        # (size, event), oldest first
+        self.events: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self.bytes = 0
+
+
+class MemoryReplayBuffer(ReplayBuffer):
+    """Ring buffer per session; least recently used sessions are dropped."""
+
+    def __init__(
+        self,
+        size: int = REPLAY_BUFFER_SIZE,
+        max_sessions: int = REPLAY_MAX_SESSIONS,
+        session_max_bytes: int = REPLAY_SESSION_MAX_BYTES,
+        max_bytes: int = REPLAY_MAX_BYTES,
+    ) -> None:
+        self._size = size
+        self._max_sessions = max_sessions
+        self._session_max_bytes = session_max_bytes
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._sessions: "OrderedDict[str, _SessionLog]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def _drop_oldest(self, log: _SessionLog) -> None:
+        size, _ = log.events.popleft()
+        log.bytes -= size
+        self._bytes -= size
+
+    async def append(self, session_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        log = self._sessions.get(session_id)
+        if log is None:
+            log = self._sessions[session_id] = _SessionLog()
+        log.last_seq += 1
+        event = {**event, "seq": log.last_seq}
+        size = _event_size(event)
+        if size > self._session_max_bytes:
+            # Too large to keep: a client missing it gets a fresh snapshot
+            while log.events:
+                self._drop_oldest(log)
+        else:
+            log.events.append((size, event))
+            log.bytes += size
+            self._bytes += size
+            while len(log.events) > self._size or log.bytes > self._session_max_bytes:
+                self._drop_oldest(log)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self._max_sessions or self._bytes > self._max_bytes
+        ):
+            _, old = self._sessions.popitem(last=False)
+            self._bytes -= old.bytes
+        return event
+
+    async def events_since(self, session_id: str, after_seq: int) -> Optional[List[Dict[str, Any]]]:
+        log = self._sessions.get(session_id)
+        if log is None:
+            # Nothing buffered: fine if the client has seen nothing either
+            return [] if after_seq <= 0 else None
+        return _missing([e for _, e in log.events], after_seq, log.last_seq)
+
+
+class RedisReplayBuffer(ReplayBuffer):
+    """Capped Redis lists, shared by every worker."""
+
+    def __init__(
+        self,
+        client: Any = None,
+        url: str = "",
+        prefix: str = "events:",
+        size: int = REPLAY_BUFFER_SIZE,
+        ttl: int = REPLAY_TTL_SECONDS,
+    ) -> None:
+        if client is None:
+            try:
+                from redis import asyncio as redis_asyncio
+            except ImportError:
+                raise ImportError("Please install redis: pip install redis")
+            client = redis_asyncio.from_url(
+                url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        self._client = client
+        self._prefix = prefix
+        self._size = size
+        self._ttl = ttl
+
+    def _keys(self, session_id: str) -> Tuple[str, str]:
+        return f"{self._prefix}{session_id}:seq", f"{self._prefix}{session_id}:log"
+
+    async def append(self, session_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        seq_key, log_key = self._keys(session_id)
+        event = {**event, "seq": int(await self._client.incr(seq_key))}
+        pipe = self._client.pipeline(transaction=False)
+        pipe.rpush(log_key, json.dumps(event, default=str))
+        pipe.ltrim(log_key, -self._size, -1)
+        pipe.expire(log_key, self._ttl)
+        pipe.expire(seq_key, self._ttl)
+        await pipe.execute()
+        return event
+
+    async def events_since(self, session_id: str, after_seq: int) -> Optional[List[Dict[str, Any]]]:
+        seq_key, log_key = self._keys(session_id)
+        raw_seq = await self._client.get(seq_key)
+        if raw_seq is None:
+            return [] if after_seq <= 0 else None
+        events = [json.loads(raw) for raw in await self._client.lrange(log_key, 0, -1)]
+        # Appends from different workers may land out of order
+        events.sort(key=lambda e: e["seq"])
+        return _missing(events, after_seq, int(raw_seq))
+
+
+def create_replay_buffer(name: str = "") -> ReplayBuffer:
+    """Build the backend named by ``name`` or the EVENT_REPLAY_BACKEND env var."""
+    name = (name or os.getenv("EVENT_REPLAY_BACKEND", "memory")).lower()
+    if name == "redis":
+        return RedisReplayBuffer()
+    if name != "memory":
+        print(f"Warning: Unknown EVENT_REPLAY_BACKEND '{name}', using in-process buffer")
+    return MemoryReplayBuffer()
+
+
+replay_buffer = create_replay_buffer()
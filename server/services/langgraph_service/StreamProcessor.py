@@ -1,43 +1,58 @@
 # type: ignore[import]
+import asyncio
 import traceback
 from typing import Optional, List, Dict, Any, Callable, Awaitable
 from langchain_core.messages import AIMessageChunk, ToolCall, convert_to_openai_messages, ToolMessage
-from langgraph.graph import StateGraph
 import json
+from services.message_writer import MessageWriter
+from services.stream_coalescer import StreamCoalescer
+from services.message_history import MessageHistory, register_history, unregister_history
 
 
 class StreamProcessor:
     """流式处理器 - 负责处理智能体的流式输出"""
 
-    def __init__(self, session_id: str, db_service: Any, websocket_service: Callable[[str, Dict[str, Any]], Awaitable[None]]):
+    def __init__(self, session_id: str, db_service: Any, websocket_service: Callable[[str, Dict[str, Any]], Awaitable[None]], user_id: str = ""):
         self.session_id = session_id
         self.db_service = db_service
         self.websocket_service = websocket_service
+        # 新消息通过写后缓冲批量入库，流式输出不等待数据库
+        self.message_writer = MessageWriter(session_id, db_service, user_id=user_id)
+        # 流式增量按时间/字节合并成帧（seq 由 broadcast_session_update 统一编号）
+        self.coalescer = StreamCoalescer(session_id, websocket_service)
+        # 只转换新增/变化的消息，向前端发送增量 diff
+        self.history = MessageHistory(session_id)
         self.tool_calls: List[ToolCall] = []
         self.last_saved_message_index = 0
         self.last_streaming_tool_call_id: Optional[str] = None
 
-    async def process_stream(self, swarm: StateGraph, messages: List[Dict[str, Any]], context: Dict[str, Any]) -> None:
+    async def process_stream(self, compiled_swarm: Any, messages: List[Any], context: Dict[str, Any], saved_count: Optional[int] = None) -> None:
         """处理整个流式响应
 
         Args:
-            swarm: 智能体群组
-            messages: 消息列表
+            compiled_swarm: 已编译的智能体群组
+            messages: 送入图中的消息（有检查点时只有新消息）
             context: 上下文信息
+            saved_count: 图状态中已保存到数据库的消息数，默认为 len(messages)
         """
-        self.last_saved_message_index = len(messages) - 1
+        self.last_saved_message_index = (len(messages) if saved_count is None else saved_count) - 1
 
-        compiled_swarm = swarm.compile()
-
-        async for chunk in compiled_swarm.astream(
-            {"messages": messages},
-            config=context,
-            stream_mode=["messages", "custom", 'values']
-        ):
-            await self._handle_chunk(chunk)
+        register_history(self.history)
+        try:
+            async for chunk in compiled_swarm.astream(
+                {"messages": messages},
+                config=context,
+                stream_mode=["messages", "custom", 'values']
+            ):
+                await self._handle_chunk(chunk)
+        finally:
+            # 结束或取消时都要把缓冲中的增量发出、消息写完
+            await asyncio.shield(self.coalescer.close())
+            await asyncio.shield(self.message_writer.close())
+            unregister_history(self.history)
 
         # 发送完成事件
-        await self.websocket_service(self.session_id, {
+        await self.coalescer.emit({
             'type': 'done'
         })
 
@@ -53,27 +68,19 @@ class StreamProcessor:
 
     async def _handle_values_chunk(self, chunk_data: Dict[str, Any]) -> None:
         """处理 values 类型的 chunk"""
-        all_messages = chunk_data.get('messages', [])
-        oai_messages = convert_to_openai_messages(all_messages)
-        # 确保 oai_messages 是列表类型
-        if not isinstance(oai_messages, list):
-            oai_messages = [oai_messages] if oai_messages else []
-
-        # 发送所有消息到前端
-        await self.websocket_service(self.session_id, {
-            'type': 'all_messages',
-            'messages': oai_messages
-        })
+        # 首次发送完整快照，之后只发送 append/replace 增量
+        event = self.history.update(chunk_data.get('messages', []))
+        if event is not None:
+            await self.coalescer.emit(event)
+        oai_messages = self.history.messages
 
-        # 保存新消息到数据库
+        # 新消息放入写缓冲，按顺序批量保存到数据库
         for i in range(self.last_saved_message_index + 1, len(oai_messages)):
             new_message = oai_messages[i]
-            if len(oai_messages) > 0:  # 确保有消息才保存
-                await self.db_service.create_message(
-                    self.session_id,
-                    new_message.get('role', 'user'),
-                    json.dumps(new_message)
-                )
+            self.message_writer.add(
+                new_message.get('role', 'user'),
+                json.dumps(new_message)
+            )
             self.last_saved_message_index = i
 
     async def _handle_message_chunk(self, ai_message_chunk: AIMessageChunk) -> None:
@@ -86,14 +93,16 @@ class StreamProcessor:
                 # 工具调用结果之后会在 values 类型中发送到前端，这里会更快出现一些
                 oai_message = convert_to_openai_messages([ai_message_chunk])[0]
                 print('👇toolcall res oai_message', oai_message)
-                await self.websocket_service(self.session_id, {
+                await self.coalescer.emit({
                     'type': 'tool_call_result',
                     'id': ai_message_chunk.tool_call_id,
                     'message': oai_message
                 })
+            elif isinstance(content, str) and content:
+                # 文本增量先进入合并缓冲
+                await self.coalescer.add_text('delta', content)
             elif content:
-                # 发送文本内容
-                await self.websocket_service(self.session_id, {
+                await self.coalescer.emit({
                     'type': 'delta',
                     'text': content
                 })
@@ -130,7 +139,7 @@ class StreamProcessor:
                     f'🔄 Tool {tool_name} requires confirmation, skipping StreamProcessor event')
                 continue
             else:
-                await self.websocket_service(self.session_id, {
+                await self.coalescer.emit({
                     'type': 'tool_call',
                     'id': tool_call.get('id'),
                     'name': tool_name,
@@ -145,10 +154,10 @@ class StreamProcessor:
                 self.last_streaming_tool_call_id = tool_call_chunk.get('id')
             else:
                 if self.last_streaming_tool_call_id:
-                    await self.websocket_service(self.session_id, {
-                        'type': 'tool_call_arguments',
-                        'id': self.last_streaming_tool_call_id,
-                        'text': tool_call_chunk.get('args')
-                    })
+                    await self.coalescer.add_text(
+                        'tool_call_arguments',
+                        tool_call_chunk.get('args') or '',
+                        id=self.last_streaming_tool_call_id,
+                    )
                 else:
                     print('🟠no last_streaming_tool_call_id', tool_call_chunk)
@@ -0,0 +1,184 @@
+"""
+Reuse of LLM clients and compiled agent swarms across chat turns.
+
+Building a turn used to create a ChatOpenAI with fresh (never closed) httpx
+clients, every react agent, the swarm and its compiled graph. Compiled graphs
+hold no per-run state, so they are kept in an LRU keyed by everything that
+shapes them: model, provider, base URL, API key, tool list, system prompt,
+default agent and the tool registry version. LLM clients are pooled by
+(provider, base URL, API key); one pair of keep-alive httpx clients serves
+every model of a provider. Evicting a pair also evicts the models and graphs
+built on it, so nothing cached keeps using clients that are about to close.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from utils.http_client import HttpClient
+
+
+SWARM_CACHE_SIZE = int(os.getenv("SWARM_CACHE_SIZE", "32"))
+LLM_CLIENT_POOL_SIZE = 16
+# Evicted httpx clients may still be serving a stream; close them later
+CLIENT_CLOSE_GRACE = 600.0
+
+_LLM_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=200, keepalive_expiry=30)
+
+# (provider, base URL, API key digest) served by one pair of httpx clients
+EndpointKey = Tuple[str, str, str]
+
+
+def _digest(value: Any) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+async def _close_later(sync_client: httpx.Client, async_client: httpx.AsyncClient) -> None:
+    await asyncio.sleep(CLIENT_CLOSE_GRACE)
+    sync_client.close()
+    await async_client.aclose()
+
+
+class LLMClientPool:
+    """Keep-alive httpx clients per endpoint and ChatOpenAI instances per model."""
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CLIENT_POOL_SIZE,
+        on_evict: Optional[Callable[[EndpointKey], None]] = None,
+    ) -> None:
+        self._max_entries = max_entries
+        # Called with the (provider, base URL, key digest) of evicted clients
+        self._on_evict = on_evict
+        self._http: "OrderedDict[EndpointKey, Tuple[httpx.Client, httpx.AsyncClient]]" = OrderedDict()
+        self._models: "OrderedDict[Tuple[str, str, str, str], ChatOpenAI]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def _http_clients(self, provider: str, base_url: str, api_key: str) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        key = (provider, base_url, _digest(api_key))
+        clients = self._http.get(key)
+        if clients is None:
+            clients = (
+                HttpClient.create_sync_client(limits=_LLM_LIMITS),
+                HttpClient.create_async_client(limits=_LLM_LIMITS),
+            )
+            self._http[key] = clients
+            while len(self._http) > self._max_entries:
+                old_key, old = self._http.popitem(last=False)
+                self._evict_endpoint(old_key)
+                self._retire(old)
+        self._http.move_to_end(key)
+        return clients
+
+    def _evict_endpoint(self, key: EndpointKey) -> None:
+        for model_key in [k for k in self._models if k[:3] == key]:
+            del self._models[model_key]
+        if self._on_evict is not None:
+            self._on_evict(key)
+
+    @staticmethod
+    def _retire(clients: Tuple[httpx.Client, httpx.AsyncClient]) -> None:
+        try:
+            asyncio.get_running_loop().create_task(_close_later(*clients))
+            return
+        except RuntimeError:
+            pass
+        # No loop to wait on: nothing can be streaming, close right away
+        clients[0].close()
+        try:
+            asyncio.run(clients[1].aclose())
+        except Exception as e:
+            print(f"Warning: Failed to close LLM http client: {e}")
+
+    def get_model(self, provider: str, model: str, base_url: Optional[str], api_key: str) -> ChatOpenAI:
+        base_url = base_url or ""
+        key = (provider, base_url, _digest(api_key), model)
+        llm = self._models.get(key)
+        if llm is None:
+            http_client, http_async_client = self._http_clients(provider, base_url, api_key)
+            llm = ChatOpenAI(
+                model=model,
+                api_key=api_key,  # type: ignore
+                timeout=300,
+                base_url=base_url or None,
+                temperature=0,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            self._models[key] = llm
+            while len(self._models) > self._max_entries * 4:
+                self._models.popitem(last=False)
+        self._models.move_to_end(key)
+        return llm
+
+
+class SwarmCache:
+    """LRU of compiled swarm graphs."""
+
+    def __init__(self, max_entries: int = SWARM_CACHE_SIZE) -> None:
+        self._max_entries = max_entries
+        self._graphs: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._graphs)
+
+    def clear(self) -> None:
+        self._graphs.clear()
+
+    def discard_endpoint(self, endpoint: EndpointKey) -> None:
+        """Drop the graphs built on an endpoint's (provider, base URL, key) clients."""
+        provider, base_url, key_digest = endpoint
+        for key in [
+            k for k in self._graphs
+            if isinstance(k, tuple) and len(k) > 3 and (k[0], k[2], k[3]) == (provider, base_url, key_digest)
+        ]:
+            del self._graphs[key]
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        graph = self._graphs.get(key)
+        if graph is None:
+            graph = build()
+            self._graphs[key] = graph
+            while len(self._graphs) > self._max_entries:
+                self._graphs.popitem(last=False)
+        self._graphs.move_to_end(key)
+        return graph
+
+
+def swarm_cache_key(
+    provider: str,
+    model: str,
+    base_url: Optional[str],
+    api_key: str,
+    tool_list: List[Dict[str, Any]],
+    system_prompt: str,
+    default_agent: str,
+    tools_version: int,
+) -> Tuple[Any, ...]:
+    tool_ids = tuple(sorted(str(tool.get("id", "")) for tool in tool_list))
+    return (
+        provider,
+        model,
+        base_url or "",
+        _digest(api_key),
+        tool_ids,
+        # Tool entries carry more than the id (type, provider, display name)
+        _digest(sorted(tool_list, key=lambda t: str(t.get("id", "")))),
+        _digest(system_prompt),
+        default_agent,
+        tools_version,
+    )
+
+
+swarm_cache = SwarmCache()
+llm_client_pool = LLMClientPool(on_evict=swarm_cache.discard_endpoint)
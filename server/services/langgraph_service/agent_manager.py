@@ -5,6 +5,7 @@ from langchain_core.tools import BaseTool
 from models.tool_model import ToolInfoJson
 from services.langgraph_service.configs.image_vide_creator_config import ImageVideoCreatorAgentConfig
 from .configs import PlannerAgentConfig, create_handoff_tool, BaseAgentConfig
+from .context_window import context_window_manager
 from services.tool_service import tool_service
 
 
@@ -59,6 +60,18 @@ class AgentManager:
 
         return [planner_agent, image_video_creator_agent]
 
+    @staticmethod
+    def get_agent_names(tool_list: List[ToolInfoJson]) -> List[str]:
+        """create_agents 返回的智能体名称（顺序一致），无需创建智能体
+
+        Args:
+            tool_list: 工具配置列表
+
+        Returns:
+            List[str]: 智能体名称列表
+        """
+        return [PlannerAgentConfig().name, ImageVideoCreatorAgentConfig(tool_list).name]
+
     @staticmethod
     def _create_langgraph_agent(
         model: Any,
@@ -90,12 +103,16 @@ class AgentManager:
             if tool:
                 business_tools.append(tool)
 
-        # 创建并返回 LangGraph 智能体
+        # 创建并返回 LangGraph 智能体，调用模型前按 token 预算裁剪上下文
+        tools = [*business_tools, *handoff_tools]
         return create_react_agent(
             name=config.name,
             model=model,
-            tools=[*business_tools, *handoff_tools],
-            prompt=config.system_prompt
+            tools=tools,
+            prompt=config.system_prompt,
+            pre_model_hook=context_window_manager.pre_model_hook(
+                getattr(model, 'model_name', ''), config.system_prompt, tools
+            ),
         )
 
     @staticmethod
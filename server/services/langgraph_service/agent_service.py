@@ -1,14 +1,19 @@
 from models.tool_model import ToolInfoJson
 from services.db_service import db_service
+from services.blob_service import externalize_blobs, rehydrate_blobs
 from .StreamProcessor import StreamProcessor
 from .agent_manager import AgentManager
+from .agent_cache import llm_client_pool, swarm_cache, swarm_cache_key
+from .checkpointer import get_checkpointer, has_dangling_tool_calls, load_checkpoint_messages, thread_id
 import traceback
-from utils.http_client import HttpClient
+from langchain_core.messages import RemoveMessage, convert_to_openai_messages
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from langgraph_swarm import create_swarm  # type: ignore
-from langchain_openai import ChatOpenAI
 from services.websocket_service import send_to_websocket  # type: ignore
 from services.config_service import config_service
-from typing import Optional, List, Dict, Any, cast, Set
+from services.tool_service import tool_service
+from typing import Optional, List, Dict, Any, cast, Set, Tuple
 from typing_extensions import TypedDict
 from models.config_model import ModelInfo
 
@@ -88,8 +93,11 @@ async def langgraph_multi_agent(
 ) -> None:
     """多智能体处理函数
 
+    会话状态保存在 checkpointer 中（thread_id = user_id:session_id），已有检查点时
+    只把新消息送入图中；没有检查点时用完整历史初始化。
+
     Args:
-        messages: 消息历史
+        messages: 新消息（旧客户端会发送完整消息历史）
         canvas_id: 画布ID
         session_id: 会话ID
         text_model: 文本模型配置
@@ -97,31 +105,28 @@ async def langgraph_multi_agent(
         system_prompt: 系统提示词
     """
     try:
-        # 0. 修复消息历史
-        fixed_messages = _fix_chat_history(messages)
-
-        # 2. 文本模型
-        text_model_instance = _create_text_model(text_model)
-
-        # 3. 创建智能体
-        agents = AgentManager.create_agents(
-            text_model_instance, tool_list, system_prompt or ""  # 传入所有注册的工具
+        # 0. 读取检查点，确定本轮输入
+        checkpointer = await get_checkpointer()
+        graph_input, saved_count, seeded = await _prepare_input(
+            checkpointer, messages, session_id, user_id
         )
-        agent_names = [agent.name for agent in agents]
-        print('👇agent_names', agent_names)
-        last_agent = AgentManager.get_last_active_agent(fixed_messages, agent_names)
+
+        agent_names = AgentManager.get_agent_names(tool_list)
+        # 有检查点时当前智能体保存在图状态中
+        last_agent = AgentManager.get_last_active_agent(seeded, agent_names)
+        default_agent = last_agent if last_agent else agent_names[0]
 
         print('👇last_agent', last_agent)
 
-        # 4. 创建智能体群组
-        swarm = create_swarm(
-            agents=agents,  # type: ignore
-            default_active_agent=last_agent if last_agent else agent_names[0],
+        # 2-4. 文本模型、智能体和智能体群组：相同配置复用已编译的图
+        compiled_swarm = _get_compiled_swarm(
+            text_model, tool_list, system_prompt or "", default_agent, checkpointer
         )
 
         # 5. 创建上下文
         context = {
             'configurable': {
+                'thread_id': thread_id(session_id, user_id),
                 'canvas_id': canvas_id,
                 'session_id': session_id,
                 'user_id': user_id,
@@ -133,39 +138,105 @@ async def langgraph_multi_agent(
 
         # 6. 流处理
         processor = StreamProcessor(
-            session_id, db_service, send_to_websocket
+            session_id, db_service, send_to_websocket, user_id=user_id
         )  # type: ignore
-        await processor.process_stream(swarm, fixed_messages, context)
+        await processor.process_stream(
+            compiled_swarm, graph_input, context, saved_count=saved_count
+        )
 
     except Exception as e:
         await _handle_error(e, session_id)
 
 
+async def _graph_messages(messages: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+    """客户端消息转为图输入：与入库时一样，大的 data URL 上传到存储并换成公开 URL，
+    避免 base64 图片随每一步写入检查点"""
+    return [rehydrate_blobs(await externalize_blobs(m, user_id)) for m in messages]
+
+
+async def _prepare_input(
+    checkpointer: BaseCheckpointSaver,
+    messages: List[Dict[str, Any]],
+    session_id: str,
+    user_id: str,
+) -> Tuple[List[Any], int, List[Dict[str, Any]]]:
+    """本轮送入图中的消息
+
+    Returns:
+        (graph_input, saved_count, seeded): 图输入；运行后状态中已入库的消息数；
+        用于初始化的完整历史（有检查点时为空）
+    """
+    new_messages = await _graph_messages(messages[-1:], user_id)
+    saved = await load_checkpoint_messages(checkpointer, thread_id(session_id, user_id))
+
+    if saved is None:
+        # 没有检查点（新会话或旧会话）：用完整历史初始化，新消息已在数据库中
+        history = None
+        if len(messages) <= 1:
+            history = await db_service.get_chat_history(session_id, user_id=user_id)
+        if not history:
+            history = await _graph_messages(messages, user_id)
+        seeded = _fix_chat_history(history)
+        return seeded, len(seeded), seeded
+
+    if has_dangling_tool_calls(saved):
+        # 上一轮在工具调用中途被取消：修复后整体替换检查点中的消息
+        fixed = _fix_chat_history(convert_to_openai_messages(saved))  # type: ignore[arg-type]
+        graph_input = [RemoveMessage(id=REMOVE_ALL_MESSAGES), *fixed, *new_messages]
+        return graph_input, len(fixed) + len(new_messages), []
+
+    return new_messages, len(saved) + len(new_messages), []
+
+
 def _create_text_model(text_model: ModelInfo) -> Any:
-    """创建语言模型实例"""
-    model = text_model.get('model')
+    """获取语言模型实例（按 provider / url / key 复用连接池）"""
     provider = text_model.get('provider')
-    url = text_model.get('url')
     api_key = config_service.app_config.get(provider, {}).get(  # type: ignore
         "api_key", ""
     )
 
     # TODO: Verify if max token is working
     # max_tokens = text_model.get('max_tokens', 8148)
+    return llm_client_pool.get_model(
+        provider, text_model.get('model'), text_model.get('url'), api_key
+    )
 
-    # Create httpx client with SSL configuration for ChatOpenAI
-    http_client = HttpClient.create_sync_client()
-    http_async_client = HttpClient.create_async_client()
-    return ChatOpenAI(
-        model=model,
-        api_key=api_key,  # type: ignore
-        timeout=300,
-        base_url=url,
-        temperature=0,
-        # max_tokens=max_tokens, # TODO: 暂时注释掉有问题的参数
-        http_client=http_client,
-        http_async_client=http_async_client,
+
+def _get_compiled_swarm(
+    text_model: ModelInfo,
+    tool_list: List[ToolInfoJson],
+    system_prompt: str,
+    default_agent: str,
+    checkpointer: BaseCheckpointSaver,
+) -> Any:
+    """返回编译好的智能体群组，按模型、工具、提示词等配置缓存"""
+    provider = text_model.get('provider')
+    api_key = config_service.app_config.get(provider, {}).get(  # type: ignore
+        "api_key", ""
     )
+    key = swarm_cache_key(
+        provider,
+        text_model.get('model'),
+        text_model.get('url'),
+        api_key,
+        tool_list,  # type: ignore
+        system_prompt,
+        default_agent,
+        tool_service.version,
+    )
+
+    def build() -> Any:
+        agents = AgentManager.create_agents(
+            _create_text_model(text_model), tool_list, system_prompt  # 传入所有注册的工具
+        )
+        print('👇agent_names', [agent.name for agent in agents])
+        swarm = create_swarm(
+            agents=agents,  # type: ignore
+            default_active_agent=default_agent,
+        )
+        return swarm.compile(checkpointer=checkpointer)
+
+    return swarm_cache.get_or_build(key, build)
 
 
 async def _handle_error(error: Exception, session_id: str) -> None:
@@ -0,0 +1,175 @@
+"""
+Server-side conversation state for the agent swarm.
+
+Compiled swarms are built with a LangGraph checkpointer and run with
+``thread_id = "<user_id>:<session_id>"``, so the graph state (messages and
+the active agent) of a session survives between chat turns. A turn only feeds the new
+user message; the rest is loaded from the last checkpoint.
+
+Backends (selected with the CHECKPOINT_BACKEND env var):
+    sqlite   — AsyncSqliteSaver on CHECKPOINT_SQLITE_PATH (default)
+    postgres — AsyncPostgresSaver on DATABASE_URL
+    memory   — InMemorySaver, at most CHECKPOINT_MEMORY_THREADS sessions
+
+Sessions without a checkpoint (new backend, older sessions, evicted memory
+threads) are seeded from the stored chat history. The memory backend keeps
+state per process, so it is refused when CLUSTER_BACKEND runs several
+workers: a worker would resume from its own stale checkpoint and miss the
+turns handled elsewhere. Use sqlite (workers on one host) or postgres.
+
+Large data URLs in user messages are moved to Storage before they enter the
+graph (as for chat_messages), so checkpoints hold links, not image bytes.
+There is no retention policy for the sqlite and postgres backends: every
+graph step adds a checkpoint to its thread and old ones are kept. Prune the
+checkpoint tables out of band if they grow too large.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from services.cluster_service import cluster_backend_name
+
+from .agent_cache import swarm_cache
+
+
+CHECKPOINT_MEMORY_THREADS = int(os.getenv("CHECKPOINT_MEMORY_THREADS", "256"))
+
+
+def checkpoint_backend_name() -> str:
+    return os.getenv("CHECKPOINT_BACKEND", "sqlite").lower()
+
+
+def thread_id(session_id: str, user_id: str = "") -> str:
+    """Checkpoint thread of a session; scoped to its owner."""
+    return f"{user_id}:{session_id}" if user_id else session_id
+
+
+def thread_config(thread: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread}}
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver that forgets the least recently used sessions."""
+
+    def __init__(self, max_threads: int = CHECKPOINT_MEMORY_THREADS) -> None:
+        super().__init__()
+        self._max_threads = max_threads
+        self._threads: "OrderedDict[str, None]" = OrderedDict()
+
+    def put(self, config, checkpoint, metadata, new_versions):  # type: ignore[override]
+        thread_id = str(config["configurable"]["thread_id"])
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self._max_threads:
+            old, _ = self._threads.popitem(last=False)
+            self.delete_thread(old)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+
+async def _create_sqlite_saver() -> BaseCheckpointSaver:
+    try:
+        import aiosqlite  # type: ignore
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver  # type: ignore
+    except ImportError:
+        raise ImportError(
+            "Please install langgraph-checkpoint-sqlite: pip install langgraph-checkpoint-sqlite"
+        )
+    from services.config_service import USER_DATA_DIR
+
+    path = os.getenv("CHECKPOINT_SQLITE_PATH", os.path.join(USER_DATA_DIR, "checkpoints.db"))
+    saver = AsyncSqliteSaver(await aiosqlite.connect(path))
+    await saver.setup()
+    return saver
+
+
+async def _create_postgres_saver() -> BaseCheckpointSaver:
+    try:
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver  # type: ignore
+        from psycopg.rows import dict_row  # type: ignore
+        from psycopg_pool import AsyncConnectionPool  # type: ignore
+    except ImportError:
+        raise ImportError(
+            "Please install langgraph-checkpoint-postgres: pip install langgraph-checkpoint-postgres psycopg-pool"
+        )
+    pool = AsyncConnectionPool(
+        os.getenv("DATABASE_URL", ""),
+        max_size=8,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=False,
+    )
+    await pool.open()
+    saver = AsyncPostgresSaver(pool)  # type: ignore[arg-type]
+    await saver.setup()
+    return saver
+
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+
+
+async def get_checkpointer() -> BaseCheckpointSaver:
+    """The process-wide checkpointer, created on first use."""
+    global _checkpointer
+    if _checkpointer is None:
+        name = checkpoint_backend_name()
+        shared = cluster_backend_name() == "local"
+        saver: Optional[BaseCheckpointSaver] = None
+        try:
+            if name == "sqlite":
+                saver = await _create_sqlite_saver()
+            elif name == "postgres":
+                saver = await _create_postgres_saver()
+            elif name != "memory":
+                print(f"Warning: Unknown CHECKPOINT_BACKEND '{name}', using memory")
+        except Exception as e:
+            if not shared:
+                raise
+            print(f"Warning: {name} checkpointer unavailable, using memory: {e}")
+        if saver is None and not shared:
+            raise RuntimeError(
+                f"CHECKPOINT_BACKEND={name} keeps chat state per process; "
+                f"with CLUSTER_BACKEND={cluster_backend_name()} use sqlite or postgres"
+            )
+        # Another turn may have finished creating one while this one awaited
+        if _checkpointer is None:
+            _checkpointer = saver or BoundedMemorySaver()
+    return _checkpointer
+
+
+async def close_checkpointer() -> None:
+    global _checkpointer
+    saver, _checkpointer = _checkpointer, None
+    # Cached graphs were compiled with this saver
+    swarm_cache.clear()
+    conn = getattr(saver, "conn", None)
+    if conn is None:
+        return
+    try:
+        await conn.close()
+    except Exception as e:
+        print(f"Warning: Failed to close checkpointer: {e}")
+
+
+async def load_checkpoint_messages(
+    checkpointer: BaseCheckpointSaver, thread: str
+) -> Optional[List[BaseMessage]]:
+    """Messages of the thread's last checkpoint, None if there is none."""
+    checkpoint = await checkpointer.aget_tuple(thread_config(thread))
+    if checkpoint is None:
+        return None
+    return checkpoint.checkpoint.get("channel_values", {}).get("messages") or None
+
+
+def has_dangling_tool_calls(messages: List[BaseMessage]) -> bool:
+    """True if a tool call has no result, e.g. the last turn was cancelled mid-call."""
+    answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    return any(
+        call.get("id") not in answered
+        for m in messages
+        if isinstance(m, AIMessage)
+        for call in m.tool_calls
+    )
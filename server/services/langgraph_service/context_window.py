@@ -0,0 +1,347 @@
+"""
+Token budget for what each agent sends to its model.
+
+The checkpointed swarm state keeps the whole conversation; every model call
+goes through ContextWindowManager.pre_model_hook, which returns a trimmed
+copy (``llm_input_messages``) without touching the state:
+
+- inline data: URIs (base64 images) are always replaced by a placeholder
+- tool results older than the last CONTEXT_KEEP_TURNS turns are reduced to a
+  compact reference (tool name plus the file links they produced)
+- if the conversation is still over budget, the oldest whole turns are
+  dropped and summarized at the top of the first remaining user message
+  (a second system message is rejected by some providers)
+
+Turns start at a user message, so tool calls and their results are always
+dropped together. The system prompt and the tool definitions are added by
+the agent after the hook and are counted against the budget. Compacted messages, token counts and summary
+lines are cached per session by message id, so each message is processed
+once rather than on every model call.
+"""
+
+import asyncio
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "24000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "2"))
+CONTEXT_CACHE_SESSIONS = int(os.getenv("CONTEXT_CACHE_SESSIONS", "256"))
+# Tool results at most this large are kept as they are
+TOOL_PAYLOAD_MAX_TOKENS = 200
+SUMMARY_MAX_TOKENS = 1500
+# Left free for the model's answer
+RESPONSE_RESERVE_TOKENS = 4096
+SNIPPET_CHARS = 160
+
+# Context window by model name prefix, longest prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4.1": 1_000_000,
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4": 200_000,
+    "claude": 200_000,
+    "gemini": 1_000_000,
+    "grok": 131_072,
+    "deepseek": 64_000,
+    "qwen": 32_768,
+}
+DEFAULT_CONTEXT_WINDOW = 32_768
+
+_DATA_URI_RE = re.compile(r"data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+")
+_LINK_RE = re.compile(r"\]\(([^)\s]+)\)|(https?://[^\s)\"']+)")
+
+
+def context_window(model: str) -> int:
+    model = (model or "").lower().split("/")[-1]
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+def token_budget(model: str) -> int:
+    return min(CONTEXT_TOKEN_BUDGET, context_window(model) - RESPONSE_RESERVE_TOKENS)
+
+
+_encoders: Dict[str, Any] = {}
+
+
+def _encoder(model: str) -> Any:
+    """tiktoken encoder for ``model``; None (estimate) if it can't be loaded."""
+    if model in _encoders:
+        return _encoders[model]
+    encoder = None
+    try:
+        import tiktoken  # type: ignore
+
+        try:
+            encoder = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoder = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Missing package or encoding files that can't be downloaded
+        print(f"Warning: tiktoken unavailable for {model}, estimating tokens: {e}")
+    _encoders[model] = encoder
+    return encoder
+
+
+def count_text_tokens(text: str, model: str = "") -> int:
+    encoder = _encoder(model)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    # ~4 characters per token for ASCII, about one per CJK character
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(str(part.get("text", "")))
+    return "\n".join(parts)
+
+
+def count_message_tokens(message: BaseMessage, model: str = "") -> int:
+    tokens = 4 + count_text_tokens(_text(message), model)
+    if isinstance(message.content, list):
+        # Image parts are billed per tile; use the low-detail cost
+        tokens += 85 * sum(1 for p in message.content if isinstance(p, dict) and p.get("type") == "image_url")
+    if isinstance(message, AIMessage) and message.tool_calls:
+        tokens += count_text_tokens(json.dumps([c.get("args") for c in message.tool_calls], default=str), model)
+    return tokens
+
+
+def count_tool_tokens(tools: Sequence[Any], model: str = "") -> int:
+    """Tokens of the tool definitions bound to the model."""
+    if not tools:
+        return 0
+    schemas = [convert_to_openai_tool(tool) for tool in tools]
+    return count_text_tokens(json.dumps(schemas, default=str), model)
+
+
+def _links(text: str, limit: int = 5) -> List[str]:
+    links: List[str] = []
+    for match in _LINK_RE.finditer(text):
+        link = match.group(1) or match.group(2)
+        if link and not link.startswith("data:") and link not in links:
+            links.append(link)
+            if len(links) == limit:
+                break
+    return links
+
+
+def _snippet(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= SNIPPET_CHARS else text[:SNIPPET_CHARS] + "…"
+
+
+def _strip_data_uris(message: BaseMessage) -> BaseMessage:
+    if isinstance(message.content, str):
+        if "data:" not in message.content:
+            return message
+        return message.model_copy(update={"content": _DATA_URI_RE.sub("data:…(inline data elided)", message.content)})
+    if not any(isinstance(p, dict) and p.get("type") == "image_url" for p in message.content):
+        return message
+    content = [
+        {"type": "text", "text": "[inline image elided]"}
+        if isinstance(p, dict) and p.get("type") == "image_url"
+        and str((p.get("image_url") or {}).get("url", "")).startswith("data:")
+        else p
+        for p in message.content
+    ]
+    return message.model_copy(update={"content": content})
+
+
+def _tool_reference(message: ToolMessage) -> ToolMessage:
+    text = _text(message)
+    links = _links(text)
+    reference = f"[{message.name or 'tool'} result elided"
+    reference += f"; files: {', '.join(links)}]" if links else f": {_snippet(_DATA_URI_RE.sub('', text))}]"
+    return message.model_copy(update={"content": reference})
+
+
+def _turn_starts(messages: List[BaseMessage]) -> List[int]:
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return starts
+
+
+class _SessionContext:
+    """Per-session cache of compacted messages and summary lines."""
+
+    def __init__(self) -> None:
+        self.messages: Dict[Tuple[str, bool], Tuple[BaseMessage, int]] = {}
+        self.summary_lines: Dict[str, str] = {}
+
+
+class ContextWindowManager:
+    """Fits the conversation into a token budget before each model call."""
+
+    def __init__(
+        self,
+        keep_turns: int = CONTEXT_KEEP_TURNS,
+        max_sessions: int = CONTEXT_CACHE_SESSIONS,
+        budget: Optional[Callable[[str], int]] = None,
+    ) -> None:
+        self.keep_turns = max(1, keep_turns)
+        self.max_sessions = max_sessions
+        self._budget = budget or token_budget
+        self._sessions: "OrderedDict[str, _SessionContext]" = OrderedDict()
+
+    def _session(self, session_id: str) -> _SessionContext:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _SessionContext()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def forget(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def _prepared(self, session: _SessionContext, message: BaseMessage, elide: bool, model: str) -> Tuple[BaseMessage, int]:
+        """Message as sent to the model and its token count, cached by id."""
+        elide = elide and isinstance(message, ToolMessage)
+        key = (message.id or "", elide)
+        if message.id and key in session.messages:
+            return session.messages[key]
+        prepared = _strip_data_uris(message)
+        if elide:
+            tokens = count_message_tokens(prepared, model)
+            if tokens > TOOL_PAYLOAD_MAX_TOKENS:
+                prepared = _tool_reference(prepared)  # type: ignore[arg-type]
+        result = (prepared, count_message_tokens(prepared, model))
+        if message.id:
+            session.messages[key] = result
+        return result
+
+    def _summary_line(self, session: _SessionContext, turn: List[BaseMessage]) -> str:
+        key = turn[0].id or ""
+        if key and key in session.summary_lines:
+            return session.summary_lines[key]
+        asked = _snippet(_text(turn[0])) if isinstance(turn[0], HumanMessage) else ""
+        files: List[str] = []
+        answer = ""
+        for message in turn[1:]:
+            if isinstance(message, ToolMessage):
+                files.extend(link for link in _links(_text(message)) if link not in files)
+            elif isinstance(message, AIMessage) and _text(message).strip():
+                answer = _text(message)
+        line = f"- User: {asked}" if asked else "- (context)"
+        if files:
+            line += f"\n  Files: {', '.join(files[:5])}"
+        if answer:
+            line += f"\n  Assistant: {_snippet(answer)}"
+        if key:
+            session.summary_lines[key] = line
+        return line
+
+    def _summary(self, session: _SessionContext, dropped: List[List[BaseMessage]], model: str, max_tokens: int) -> str:
+        lines = [self._summary_line(session, turn) for turn in dropped]
+        header = f"Summary of the {len(dropped)} earlier turns of this conversation (details elided):"
+        # Oldest lines go first when the summary itself is too long
+        while len(lines) > 1 and count_text_tokens("\n".join(lines), model) > max_tokens:
+            lines.pop(0)
+        return "\n".join([header, *lines])
+
+    def fit(
+        self,
+        messages: List[BaseMessage],
+        session_id: str,
+        model: str = "",
+        system_prompt: str = "",
+        tool_tokens: int = 0,
+    ) -> List[BaseMessage]:
+        """Messages for the next model call, within the model's token budget."""
+        if not messages:
+            return messages
+        session = self._session(session_id)
+        budget = self._budget(model) - tool_tokens
+        if system_prompt:
+            budget -= count_text_tokens(system_prompt, model)
+
+        starts = _turn_starts(messages)
+        recent = starts[-self.keep_turns] if len(starts) >= self.keep_turns else 0
+        # Results of the tool calls the model is about to answer stay intact
+        pending = len(messages)
+        while pending > 0 and isinstance(messages[pending - 1], ToolMessage):
+            pending -= 1
+
+        def prepare(elide_before: int) -> List[Tuple[BaseMessage, int]]:
+            return [
+                self._prepared(session, m, i < elide_before, model)
+                for i, m in enumerate(messages)
+            ]
+
+        prepared = prepare(recent)
+        if sum(t for _, t in prepared) > budget:
+            prepared = prepare(pending)
+
+        bounds = starts + [len(messages)]
+        turn_tokens = [sum(t for _, t in prepared[a:b]) for a, b in zip(bounds, bounds[1:])]
+        total = sum(turn_tokens)
+        if total <= budget:
+            return [m for m, _ in prepared]
+
+        # Drop the oldest turns, leaving room for their summary
+        summary_tokens = min(SUMMARY_MAX_TOKENS, budget // 4)
+        dropped = 0
+        while total > budget - summary_tokens and dropped < len(turn_tokens) - 1:
+            total -= turn_tokens[dropped]
+            dropped += 1
+        kept = [m for m, _ in prepared[starts[dropped]:]]
+        if not dropped:
+            return kept
+        summary = self._summary(
+            session, [messages[a:b] for a, b in zip(bounds[:dropped], bounds[1:dropped + 1])], model, summary_tokens
+        )
+        # Turns start at a user message: the summary leads the first one kept
+        first = kept[0]
+        if isinstance(first.content, str):
+            content: Any = f"{summary}\n\n{first.content}"
+        else:
+            content = [{"type": "text", "text": summary}, *first.content]
+        return [first.model_copy(update={"content": content}), *kept[1:]]
+
+    def pre_model_hook(self, model: str, system_prompt: str = "", tools: Sequence[Any] = ()) -> RunnableLambda:
+        """pre_model_hook for create_react_agent; leaves the graph state unchanged."""
+        tool_tokens: List[int] = []
+
+        def hook(state: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+            configurable = (config or {}).get("configurable", {})
+            session_id = str(configurable.get("session_id") or configurable.get("thread_id") or "")
+            if not tool_tokens:
+                # Counted on first use, once the encoder is loaded
+                tool_tokens.append(count_tool_tokens(tools, model))
+            return {"llm_input_messages": self.fit(state["messages"], session_id, model, system_prompt, tool_tokens[0])}
+
+        async def ahook(state: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+            if model not in _encoders:
+                # The first use may download the encoding; keep it off the loop
+                await asyncio.to_thread(_encoder, model)
+            return hook(state, config)
+
+        return RunnableLambda(hook, afunc=ahook, name="context_window")
+
+
+context_window_manager = ContextWindowManager()
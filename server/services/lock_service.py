@@ -0,0 +1,305 @@
+"""
+Lease-based lock service with pluggable backends.
+
+Used to serialize work on a shared resource (e.g. a canvas) across coroutines,
+uvicorn workers or nodes. Leases are advisory: they make writers queue instead
+of colliding, but a lease can expire while its holder is still working, so
+writers must not rely on it for correctness. Canvas writes are fenced by the
+canvas version instead (apply_canvas_delta's base_version check). The token
+of a LockLease only identifies the lease on release.
+
+Backends (selected with the LOCK_BACKEND env var):
+    memory   — in-process asyncio locks (default, single worker only)
+    postgres — lease rows guarded by pg advisory locks, via Supabase RPC
+    redis    — SET NX PX leases with an INCR token counter (REDIS_URL)
+"""
+
+import asyncio
+import itertools
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+DEFAULT_LEASE_SECONDS = 30.0
+DEFAULT_ACQUIRE_TIMEOUT = 30.0
+# How long an unused in-process lock entry is kept before being evicted
+DEFAULT_IDLE_TTL = 300.0
+# Poll interval for backends that cannot block on the server side
+POLL_INTERVAL = 0.05
+
+
+class LockTimeoutError(Exception):
+    """Raised when a lock could not be acquired within the timeout."""
+
+    def __init__(self, key: str, timeout: float):
+        super().__init__(f"Timed out after {timeout}s waiting for lock {key}")
+        self.key = key
+        self.timeout = timeout
+
+
+@dataclass
+class LockLease:
+    key: str
+    owner: str
+    token: int
+    expires_at: float
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class LockBackend(ABC):
+    """Interface implemented by every lock backend."""
+
+    @abstractmethod
+    async def acquire(
+        self, key: str, owner: str, lease_seconds: float, timeout: float
+    ) -> Optional[LockLease]:
+        """Acquire ``key`` or return None once ``timeout`` has elapsed."""
+
+    @abstractmethod
+    async def release(self, lease: LockLease) -> None:
+        """Release a lease; a no-op if it expired and was taken over."""
+
+
+# ── In-process backend ────────────────────────────────────────────────────
+
+
+class _KeyState:
+    __slots__ = ("holder", "condition", "waiters", "last_used")
+
+    def __init__(self) -> None:
+        self.holder: Optional[LockLease] = None
+        self.condition = asyncio.Condition()
+        self.waiters = 0
+        self.last_used = time.monotonic()
+
+    def is_free(self, now: float) -> bool:
+        return self.holder is None or self.holder.expires_at <= now
+
+
+class InProcessLockBackend(LockBackend):
+    """asyncio-based locks with lease expiry and idle-entry eviction."""
+
+    def __init__(self, idle_ttl: float = DEFAULT_IDLE_TTL) -> None:
+        self._states: Dict[str, _KeyState] = {}
+        self._tokens = itertools.count(1)
+        self._idle_ttl = idle_ttl
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    async def acquire(
+        self, key: str, owner: str, lease_seconds: float, timeout: float
+    ) -> Optional[LockLease]:
+        self._evict_idle()
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState()
+        deadline = time.monotonic() + timeout
+        state.waiters += 1
+        try:
+            async with state.condition:
+                while True:
+                    now = time.monotonic()
+                    if state.is_free(now):
+                        break
+                    if now >= deadline:
+                        return None
+                    # Wake up on release, at lease expiry or at our deadline
+                    wait_for = min(deadline, state.holder.expires_at) - now  # type: ignore[union-attr]
+                    try:
+                        await asyncio.wait_for(state.condition.wait(), wait_for)
+                    except asyncio.TimeoutError:
+                        pass
+                lease = LockLease(key, owner, next(self._tokens), now + lease_seconds)
+                state.holder = lease
+                return lease
+        finally:
+            state.waiters -= 1
+            state.last_used = time.monotonic()
+
+    async def release(self, lease: LockLease) -> None:
+        state = self._states.get(lease.key)
+        if state is None:
+            return
+        async with state.condition:
+            if state.holder is not None and state.holder.token == lease.token:
+                state.holder = None
+                state.last_used = time.monotonic()
+                state.condition.notify()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep < self._idle_ttl / 2:
+            return
+        self._last_sweep = now
+        idle = [
+            key
+            for key, state in self._states.items()
+            if state.waiters == 0
+            and state.is_free(now)
+            and now - state.last_used >= self._idle_ttl
+        ]
+        for key in idle:
+            del self._states[key]
+
+
+# ── Postgres backend ──────────────────────────────────────────────────────
+
+
+class PostgresLockBackend(LockBackend):
+    """
+    Lease rows in public.resource_locks, taken through RPCs that serialize on
+    pg_advisory_xact_lock (PostgREST has no session to hold a session lock).
+    Lease tokens come from a database sequence.
+    """
+
+    async def acquire(
+        self, key: str, owner: str, lease_seconds: float, timeout: float
+    ) -> Optional[LockLease]:
+        from services.supabase_service import get_supabase
+
+        sb = await get_supabase()
+        deadline = time.monotonic() + timeout
+        delay = POLL_INTERVAL
+        while True:
+            result = await sb.rpc(
+                "acquire_resource_lock",
+                {"p_key": key, "p_owner": owner, "p_lease_seconds": lease_seconds},
+            ).execute()
+            if result.data is not None:
+                return LockLease(
+                    key, owner, int(result.data), time.monotonic() + lease_seconds
+                )
+            if time.monotonic() + delay > deadline:
+                return None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def release(self, lease: LockLease) -> None:
+        from services.supabase_service import get_supabase
+
+        sb = await get_supabase()
+        await sb.rpc(
+            "release_resource_lock", {"p_key": lease.key, "p_token": lease.token}
+        ).execute()
+
+
+# ── Redis backend ─────────────────────────────────────────────────────────
+
+_REDIS_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+  return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLockBackend(LockBackend):
+    """
+    SET NX PX leases; expired keys vanish on their own so idle locks never
+    accumulate. Lease tokens come from INCR on a companion counter key.
+    """
+
+    def __init__(self, client: Any = None, url: str = "", prefix: str = "lock:") -> None:
+        if client is None:
+            try:
+                from redis import asyncio as redis_asyncio
+            except ImportError:
+                raise ImportError("Please install redis: pip install redis")
+            client = redis_asyncio.from_url(
+                url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        self._client = client
+        self._prefix = prefix
+
+    async def acquire(
+        self, key: str, owner: str, lease_seconds: float, timeout: float
+    ) -> Optional[LockLease]:
+        redis_key = self._prefix + key
+        deadline = time.monotonic() + timeout
+        while True:
+            ok = await self._client.set(
+                redis_key, owner, nx=True, px=int(lease_seconds * 1000)
+            )
+            if ok:
+                token = await self._client.incr(redis_key + ":fence")
+                return LockLease(key, owner, int(token), time.monotonic() + lease_seconds)
+            if time.monotonic() + POLL_INTERVAL > deadline:
+                return None
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def release(self, lease: LockLease) -> None:
+        await self._client.eval(
+            _REDIS_RELEASE_SCRIPT, 1, self._prefix + lease.key, lease.owner
+        )
+
+
+def create_lock_backend(name: str = "") -> LockBackend:
+    """Build the backend named by ``name`` or the LOCK_BACKEND env var."""
+    name = (name or os.getenv("LOCK_BACKEND", "memory")).lower()
+    if name == "postgres":
+        return PostgresLockBackend()
+    if name == "redis":
+        return RedisLockBackend()
+    if name != "memory":
+        print(f"Warning: Unknown LOCK_BACKEND '{name}', using in-process locks")
+    return InProcessLockBackend()
+
+
+class LockService:
+    """Front door for acquiring leases; the backend is resolved lazily."""
+
+    def __init__(self, backend: Optional[LockBackend] = None) -> None:
+        self._backend = backend
+        self._owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def backend(self) -> LockBackend:
+        if self._backend is None:
+            self._backend = create_lock_backend()
+        return self._backend
+
+    async def acquire(
+        self,
+        key: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+    ) -> Optional[LockLease]:
+        owner = f"{self._owner_prefix}:{uuid.uuid4().hex[:8]}"
+        return await self.backend.acquire(key, owner, lease_seconds, timeout)
+
+    async def release(self, lease: LockLease) -> None:
+        try:
+            await self.backend.release(lease)
+        except Exception as e:
+            # The lease will expire on its own
+            print(f"Warning: Failed to release lock {lease.key}: {e}")
+
+    @asynccontextmanager
+    async def lock(
+        self,
+        key: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+    ) -> AsyncIterator[LockLease]:
+        lease = await self.acquire(key, lease_seconds, timeout)
+        if lease is None:
+            raise LockTimeoutError(key, timeout)
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+
+# Global lock service instance
+lock_service = LockService()
@@ -8,8 +8,9 @@ from typing import Dict, Any, List
 # Import service modules
 from services.db_service import db_service
 from services.OpenAIAgents_service import create_jaaz_response
-from services.websocket_service import send_to_websocket  # type: ignore
+from services.websocket_service import send_to_websocket, join_session_rooms  # type: ignore
 from services.stream_service import add_stream_task, remove_stream_task
+from services.message_history import MessageHistory, register_history, unregister_history
 
 
 async def handle_magic(data: Dict[str, Any], user_id: str = "") -> None:
@@ -50,9 +51,13 @@ async def handle_magic(data: Dict[str, Any], user_id: str = "") -> None:
     # Save user message to database
     if len(messages) > 0:
         await db_service.create_message(
-            session_id, messages[-1].get('role', 'user'), json.dumps(messages[-1])
+            session_id, messages[-1].get('role', 'user'), json.dumps(messages[-1]),
+            user_id=user_id,
         )
 
+    # Route this session's events to every open connection of the user
+    await join_session_rooms(user_id, session_id, canvas_id)
+
     # Create and start magic generation task
     task = asyncio.create_task(_process_magic_generation(messages, session_id, canvas_id))
 
@@ -86,13 +91,21 @@ async def _process_magic_generation(
         canvas_id: Canvas ID
     """
 
-    ai_response = await create_jaaz_response(messages, session_id, canvas_id)
+    # The first event of a history is a full snapshot; registering it lets a
+    # client that resyncs mid-generation get the same state back
+    history = MessageHistory(session_id, convert=list)
+    register_history(history)
+    try:
+        await send_to_websocket(session_id, history.update(messages))
+
+        ai_response = await create_jaaz_response(messages, session_id, canvas_id)
 
-    # Save AI response to database
-    await db_service.create_message(session_id, 'assistant', json.dumps(ai_response))
+        # Save AI response to database
+        await db_service.create_message(session_id, 'assistant', json.dumps(ai_response))
 
-    # Send messages to frontend immediately
-    all_messages = messages + [ai_response]
-    await send_to_websocket(
-        session_id, {'type': 'all_messages', 'messages': all_messages}
-    )
+        # Send only the new message as a diff against the snapshot
+        event = history.update(messages + [ai_response])
+        if event is not None:
+            await send_to_websocket(session_id, event)
+    finally:
+        unregister_history(history)
@@ -0,0 +1,109 @@
+"""
+Incremental chat history updates for the websocket stream.
+
+A live session's history is converted to OpenAI-format messages once per
+message, not once per `values` chunk: MessageHistory.update() only converts
+messages that were added or changed since the previous update, and returns
+the event to send to the client:
+
+- the first update of a stream, or any update that removes messages, is a
+  full snapshot: {'type': 'all_messages', 'messages': [...], 'version': v}
+- later updates are diffs against version v - 1:
+  {'type': 'messages_diff', 'version': v, 'base_version': v - 1, 'ops': [
+      {'op': 'replace', 'index': i, 'message': {...}},
+      {'op': 'append', 'index': n, 'messages': [...]}]}
+
+A client that misses a version asks for a snapshot with the socket `resync`
+event, which is answered from the live history registered here (or from the
+database once the stream is over).
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import convert_to_openai_messages
+
+
+def _convert(messages: List[Any]) -> List[Dict[str, Any]]:
+    converted = convert_to_openai_messages(messages)
+    if not isinstance(converted, list):
+        converted = [converted] if converted else []
+    return converted
+
+
+class MessageHistory:
+    """Converted history of one session plus the version the client holds."""
+
+    def __init__(
+        self,
+        session_id: str,
+        convert: Callable[[List[Any]], List[Dict[str, Any]]] = _convert,
+    ) -> None:
+        self.session_id = session_id
+        self.convert = convert
+        self.version = 0
+        self.messages: List[Dict[str, Any]] = []
+        # Source messages the converted ones were built from, by position
+        self._sources: List[Any] = []
+
+    def seed(self, sources: List[Any]) -> None:
+        """Start from a history the client already has (as version 1)."""
+        self._sources = list(sources)
+        self.messages = self.convert(self._sources)
+        self.version = 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'type': 'all_messages', 'messages': list(self.messages), 'version': self.version}
+
+    def update(self, sources: List[Any]) -> Optional[Dict[str, Any]]:
+        """Apply a new full source history; returns the event to send, or None."""
+        sources = list(sources)
+        if len(sources) < len(self._sources) or self.version == 0:
+            self._sources = sources
+            self.messages = self.convert(sources)
+            self.version += 1
+            return self.snapshot()
+
+        changed = [
+            i for i, (old, new) in enumerate(zip(self._sources, sources))
+            if old is not new and old != new
+        ]
+        start = len(self._sources)
+        if not changed and start == len(sources):
+            return None
+
+        ops: List[Dict[str, Any]] = []
+        if changed:
+            replaced = self.convert([sources[i] for i in changed])
+            for i, message in zip(changed, replaced):
+                self.messages[i] = message
+                ops.append({'op': 'replace', 'index': i, 'message': message})
+        if start < len(sources):
+            appended = self.convert(sources[start:])
+            self.messages.extend(appended)
+            ops.append({'op': 'append', 'index': start, 'messages': appended})
+
+        self._sources = sources
+        self.version += 1
+        return {
+            'type': 'messages_diff',
+            'version': self.version,
+            'base_version': self.version - 1,
+            'ops': ops,
+        }
+
+
+# Histories of sessions that are currently streaming, keyed by session_id
+live_histories: Dict[str, MessageHistory] = {}
+
+
+def register_history(history: MessageHistory) -> None:
+    live_histories[history.session_id] = history
+
+
+def unregister_history(history: MessageHistory) -> None:
+    if live_histories.get(history.session_id) is history:
+        del live_histories[history.session_id]
+
+
+def get_live_history(session_id: str) -> Optional[MessageHistory]:
+    return live_histories.get(session_id)
@@ -0,0 +1,109 @@
+"""
+Write-behind buffer for chat messages produced while streaming.
+
+Messages are queued without awaiting the database and written in order by a
+background task, in bulk batches of up to MAX_BATCH_SIZE. A batch is flushed
+when it is full, FLUSH_INTERVAL seconds after the first message arrives, or
+when the writer is closed (stream end or cancellation).
+"""
+
+import asyncio
+from typing import Any, List, Optional, Tuple
+
+
+MAX_BATCH_SIZE = 20
+FLUSH_INTERVAL = 0.5
+
+
+class MessageWriter:
+    """Per-session ordered, batched message persistence."""
+
+    def __init__(
+        self,
+        session_id: str,
+        db_service: Any,
+        user_id: str = "",
+        batch_size: int = MAX_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ) -> None:
+        self.session_id = session_id
+        self.db_service = db_service
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[str, str]] = []
+        # Only one flush runs at a time, so batches reach the database in order
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, role: str, message: str) -> None:
+        """Queue a message (a JSON string) for persistence."""
+        if self._closed:
+            raise RuntimeError(f"MessageWriter for session {self.session_id} is closed")
+        self._pending.append((role, message))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self._closed:
+                return
+
+    async def flush(self) -> bool:
+        """Write everything queued so far; returns False if a batch failed.
+
+        A failed batch is put back at the head of the queue and retried on the
+        next flush, so ordering is preserved.
+        """
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[: self.batch_size]
+                del self._pending[: len(batch)]
+                try:
+                    await self.db_service.create_messages(
+                        self.session_id, batch, user_id=self.user_id
+                    )
+                except Exception as e:
+                    print(
+                        f"Warning: Failed to persist {len(batch)} messages for session {self.session_id}: {e}"
+                    )
+                    self._pending[:0] = batch
+                    return False
+        return True
+
+    async def close(self) -> None:
+        """Stop the background task and flush whatever is left.
+
+        Safe to await from a cancelled task (wrap it in asyncio.shield).
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+        if await self.flush():
+            return
+        # Last resort: one row at a time so a single bad message can't sink the rest
+        for role, message in self._pending:
+            try:
+                await self.db_service.create_message(
+                    self.session_id, role, message, user_id=self.user_id
+                )
+            except Exception as e:
+                print(f"Warning: Dropping unsaved message for session {self.session_id}: {e}")
+        self._pending.clear()
@@ -3,10 +3,12 @@ import sqlite3
 from services.migrations.v1_initial_schema import V1InitialSchema
 from services.migrations.v2_add_canvases import V2AddCanvases
 from services.migrations.v3_add_comfy_workflow import V3AddComfyWorkflow
+from services.migrations.v4_add_vibe_motion_projects import V4AddVibeMotionProjects
+from services.migrations.v5_add_user_scoping_and_content import V5AddUserScopingAndContent
 from . import Migration
 
 # Database version
-CURRENT_VERSION = 3
+CURRENT_VERSION = 5
 
 ALL_MIGRATIONS = [
     {
@@ -21,6 +23,14 @@ ALL_MIGRATIONS = [
         'version': 3,
         'migration': V3AddComfyWorkflow,
     },
+    {
+        'version': 4,
+        'migration': V4AddVibeMotionProjects,
+    },
+    {
+        'version': 5,
+        'migration': V5AddUserScopingAndContent,
+    },
 ]
 class MigrationManager:
     def get_migrations_to_apply(self, current_version: int, target_version: int) -> List[Type[Migration]]:
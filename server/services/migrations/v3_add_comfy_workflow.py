@@ -0,0 +1,24 @@
+from . import Migration
+import sqlite3
+
+
+class V3AddComfyWorkflow(Migration):
+    version = 3
+    description = "Add comfy_workflows table"
+
+    def up(self, conn: sqlite3.Connection) -> None:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS comfy_workflows (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                api_json TEXT,
+                description TEXT DEFAULT '',
+                inputs TEXT,
+                outputs TEXT,
+                created_at TEXT DEFAULT (STRFTIME('%Y-%m-%dT%H:%M:%fZ', 'now')),
+                updated_at TEXT DEFAULT (STRFTIME('%Y-%m-%dT%H:%M:%fZ', 'now'))
+            )
+        """)
+
+    def down(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DROP TABLE IF EXISTS comfy_workflows")
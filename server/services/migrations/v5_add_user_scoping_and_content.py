@@ -0,0 +1,66 @@
+from . import Migration
+import sqlite3
+
+
+class V5AddUserScopingAndContent(Migration):
+    version = 5
+    description = "Add user scoping, canvas versions and generated_content"
+
+    def _add_column(self, conn: sqlite3.Connection, table: str, column: str, ddl: str) -> None:
+        cursor = conn.execute(f"PRAGMA table_info({table})")
+        columns = [c[1] for c in cursor.fetchall()]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def up(self, conn: sqlite3.Connection) -> None:
+        # Mirror the Supabase schema so both repository backends behave alike
+        self._add_column(conn, "canvases", "user_id", "TEXT DEFAULT ''")
+        self._add_column(conn, "canvases", "version", "INTEGER NOT NULL DEFAULT 0")
+        self._add_column(conn, "chat_sessions", "user_id", "TEXT DEFAULT ''")
+        self._add_column(conn, "vibe_motion_projects", "user_id", "TEXT DEFAULT ''")
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_canvases_user_updated
+            ON canvases(user_id, updated_at DESC)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_updated
+            ON chat_sessions(user_id, updated_at DESC)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_vibe_motion_projects_user_updated
+            ON vibe_motion_projects(user_id, updated_at DESC)
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS generated_content (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                type TEXT CHECK (type IN ('image', 'video')),
+                storage_path TEXT,
+                prompt TEXT,
+                model TEXT,
+                metadata TEXT DEFAULT '{}',
+                feature_type TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.feature_type')) VIRTUAL,
+                created_at TEXT DEFAULT (STRFTIME('%Y-%m-%dT%H:%M:%fZ', 'now'))
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_generated_content_user_keyset
+            ON generated_content(user_id, created_at DESC, id DESC)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_generated_content_user_type_keyset
+            ON generated_content(user_id, type, created_at DESC, id DESC)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_generated_content_user_feature_keyset
+            ON generated_content(user_id, feature_type, created_at DESC, id DESC)
+        """)
+        conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_generated_content_user_storage_path
+            ON generated_content(user_id, storage_path)
+        """)
+
+    def down(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DROP TABLE IF EXISTS generated_content")
@@ -0,0 +1,210 @@
+"""
+Bounded per-connection outbound queues for session events.
+
+Session events are not emitted straight to a room: each local participant
+gets the frame in its own Outbox and a per-connection sender task hands
+frames to engine.io only while that socket's transport queue is below
+OUTBOX_HIGH_WATER packets. One slow socket therefore never delays the
+others, and what it has not consumed stays in a queue we control:
+
+- delta / tool_call_arguments frames are merged into the previous frame of
+  the same stream while queued (the merged frame spans seq_first..seq)
+- past OUTBOX_MAX_BYTES queued deltas are dropped and replaced by a single
+  `deltas_dropped` marker; the text still arrives with the next message diff
+- every other event (tool calls, results, diffs, done, error) is lossless
+- a connection that stays above OUTBOX_MAX_BYTES for SLOW_CONSUMER_TIMEOUT
+  seconds is disconnected; it can reconnect and replay from its last seq
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.websocket_state import get_connection_wire
+from services.wire_format import encode
+
+
+OUTBOX_MAX_BYTES = int(os.getenv("OUTBOX_MAX_BYTES", str(1024 * 1024)))
+OUTBOX_HIGH_WATER = int(os.getenv("OUTBOX_HIGH_WATER", "64"))
+SLOW_CONSUMER_TIMEOUT = float(os.getenv("SLOW_CONSUMER_TIMEOUT", "15"))
+# How often a sender re-checks a full transport queue
+DRAIN_POLL_INTERVAL = 0.05
+
+COALESCE_TYPES = frozenset({"delta", "tool_call_arguments"})
+EVENT_NAME = "session_update"
+
+
+def frame_size(payload: Dict[str, Any]) -> int:
+    if payload.get("type") in COALESCE_TYPES and isinstance(payload.get("text"), str):
+        return len(payload["text"]) + 64
+    return len(json.dumps(payload, default=str))
+
+
+def _stream_key(payload: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (payload.get("type"), payload.get("session_id"), payload.get("id"))
+
+
+class Outbox:
+    """Outbound frames of one connection and the task that sends them."""
+
+    def __init__(
+        self,
+        sid: str,
+        sio: Any,
+        max_bytes: int = OUTBOX_MAX_BYTES,
+        high_water: int = OUTBOX_HIGH_WATER,
+        slow_timeout: float = SLOW_CONSUMER_TIMEOUT,
+        wire: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.sid = sid
+        self.sio = sio
+        # Negotiated encoding; frames are encoded when they leave the queue
+        self.wire = wire or {}
+        self.max_bytes = max_bytes
+        self.high_water = high_water
+        self.slow_timeout = slow_timeout
+        self.closed = False
+        self.dropped = 0
+        self._frames: Deque[List[Any]] = deque()  # [payload, size]
+        self._bytes = 0
+        self._over_since: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, payload: Dict[str, Any], size: Optional[int] = None) -> None:
+        if self.closed:
+            return
+        size = frame_size(payload) if size is None else size
+        last = self._frames[-1] if self._frames else None
+        if (
+            last is not None
+            and payload.get("type") in COALESCE_TYPES
+            and _stream_key(last[0]) == _stream_key(payload)
+        ):
+            merged = dict(last[0])
+            merged["text"] = (merged.get("text") or "") + (payload.get("text") or "")
+            merged.setdefault("seq_first", last[0].get("seq"))
+            merged["seq"] = payload.get("seq")
+            last[0] = merged
+            last[1] += size
+        else:
+            self._frames.append([payload, size])
+        self._bytes += size
+
+        if self._bytes > self.max_bytes:
+            self._shed()
+        self._check_slow()
+        if self.closed:
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _shed(self) -> None:
+        """Replace queued deltas with gap markers until back under the limit."""
+        kept: Deque[List[Any]] = deque()
+        for payload, size in self._frames:
+            if payload.get("type") not in COALESCE_TYPES or self._bytes <= self.max_bytes:
+                kept.append([payload, size])
+                continue
+            self._bytes -= size
+            self.dropped += 1
+            seq_first = payload.get("seq_first", payload.get("seq"))
+            if kept and kept[-1][0].get("type") == "deltas_dropped" and kept[-1][0].get("session_id") == payload.get("session_id"):
+                kept[-1][0]["seq"] = payload.get("seq")
+                continue
+            marker = {
+                "type": "deltas_dropped",
+                "session_id": payload.get("session_id"),
+                "canvas_id": payload.get("canvas_id"),
+                "seq_first": seq_first,
+                "seq": payload.get("seq"),
+            }
+            kept.append([marker, 128])
+            self._bytes += 128
+        self._frames = kept
+
+    def _check_slow(self) -> None:
+        if self._bytes <= self.max_bytes:
+            self._over_since = None
+            return
+        now = time.monotonic()
+        if self._over_since is None:
+            self._over_since = now
+        elif now - self._over_since >= self.slow_timeout:
+            print(f"Disconnecting slow websocket consumer {self.sid}: {self._bytes} bytes queued")
+            self.close()
+            asyncio.create_task(self.sio.disconnect(self.sid))
+
+    def _transport_backlog(self) -> int:
+        """Packets engine.io has queued for this socket but not yet written."""
+        try:
+            eio_sid = self.sio.manager.eio_sid_from_sid(self.sid, "/")
+            return int(self.sio.eio.sockets[eio_sid].queue.qsize())
+        except Exception:
+            return 0
+
+    async def _run(self) -> None:
+        while not self.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._frames and not self.closed:
+                while self._transport_backlog() >= self.high_water:
+                    self._check_slow()
+                    if self.closed:
+                        return
+                    await asyncio.sleep(DRAIN_POLL_INTERVAL)
+                payload, size = self._frames.popleft()
+                self._bytes -= size
+                try:
+                    # Local socket: never through the cluster manager's queue,
+                    # other workers get session events over the control bus
+                    await self.sio.emit(EVENT_NAME, encode(payload, self.wire), to=self.sid, ignore_queue=True)
+                except Exception as e:
+                    print(f"Error sending to websocket {self.sid}: {e}")
+
+    def close(self) -> None:
+        self.closed = True
+        self._frames.clear()
+        self._bytes = 0
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
+
+
+# sid -> Outbox, for connections on this worker
+outboxes: Dict[str, Outbox] = {}
+
+
+def get_outbox(sid: str, sio: Any) -> Outbox:
+    outbox = outboxes.get(sid)
+    # A closed outbox (slow consumer) stays until the disconnect is handled
+    if outbox is None:
+        outbox = outboxes[sid] = Outbox(sid, sio, wire=get_connection_wire(sid))
+    return outbox
+
+
+def close_outbox(sid: str) -> None:
+    outbox = outboxes.pop(sid, None)
+    if outbox is not None:
+        outbox.close()
+
+
+def deliver(sio: Any, rooms: List[str], payload: Dict[str, Any]) -> int:
+    """Queue ``payload`` for every local connection in ``rooms``; never blocks."""
+    size = frame_size(payload)
+    count = 0
+    for sid, _ in sio.manager.get_participants("/", rooms):
+        get_outbox(sid, sio).put(payload, size)
+        count += 1
+    return count
@@ -0,0 +1,684 @@
+"""
+Embedded SQLite implementation of DatabaseRepository (aiosqlite).
+
+Selected with DB_BACKEND=sqlite. Meant for single-node deployments, local
+development and CI: no network round trips, and the schema is created by the
+existing services/migrations manager.
+
+Writes share one connection and run under an asyncio lock, multi-statement
+writes inside an IMMEDIATE transaction. Reads go through a second, read-only
+connection: WAL mode lets them proceed while a write is in progress, and they
+never see another coroutine's uncommitted (possibly rolled back) changes.
+Statements are parameterized constants so sqlite3's per-connection statement
+cache keeps them prepared.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import aiosqlite
+
+from services.blob_service import externalize_blobs, rehydrate_blobs
+from services.db_service import (
+    CanvasVersionConflict,
+    DatabaseRepository,
+    decode_content_cursor,
+)
+from services.migrations.manager import CURRENT_VERSION, MigrationManager
+
+
+NOW_SQL = "STRFTIME('%Y-%m-%dT%H:%M:%fZ', 'now')"
+STATEMENT_CACHE_SIZE = 256
+
+CONTENT_COLUMNS = ("id", "user_id", "type", "storage_path", "prompt", "model", "metadata")
+
+
+def default_db_path() -> str:
+    from services.config_service import USER_DATA_DIR
+
+    return os.getenv("SQLITE_DB_PATH", os.path.join(USER_DATA_DIR, "localmanus.db"))
+
+
+def run_migrations(path: str) -> None:
+    """Bring the database at ``path`` up to CURRENT_VERSION."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS db_version (version INTEGER NOT NULL)")
+        row = conn.execute("SELECT version FROM db_version").fetchone()
+        if row is None:
+            conn.execute("INSERT INTO db_version (version) VALUES (0)")
+            current = 0
+        else:
+            current = row[0]
+        MigrationManager().migrate(conn, current, CURRENT_VERSION)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def merge_canvas_delta(
+    doc: Dict[str, Any],
+    upserts: List[Dict[str, Any]],
+    deletes: List[str],
+    files: Dict[str, Any],
+    app_state: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Python twin of the apply_canvas_delta SQL function in schema.sql."""
+    by_id = {u.get("id"): u for u in upserts}
+    deleted = set(deletes)
+    existing = doc.get("elements") or []
+    existing_ids = {e.get("id") for e in existing}
+    elements = [by_id.get(e.get("id"), e) for e in existing if e.get("id") not in deleted]
+    elements += [
+        u for i, u in by_id.items() if i not in existing_ids and i not in deleted
+    ]
+    doc = {**doc, "elements": elements, "files": {**(doc.get("files") or {}), **files}}
+    if app_state is not None:
+        doc["appState"] = app_state
+    return doc
+
+
+class SQLiteDatabaseService(DatabaseRepository):
+    """aiosqlite implementation with WAL and the legacy migration manager."""
+
+    def __init__(self, path: str = ""):
+        self._path = path or default_db_path()
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._read_conn: Optional[aiosqlite.Connection] = None
+        self._init_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+    async def _get_conn(self) -> aiosqlite.Connection:
+        if self._conn is not None:
+            return self._conn
+        async with self._init_lock:
+            if self._conn is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+                await asyncio.to_thread(run_migrations, self._path)
+                conn = await aiosqlite.connect(
+                    self._path,
+                    isolation_level=None,
+                    cached_statements=STATEMENT_CACHE_SIZE,
+                )
+                conn.row_factory = aiosqlite.Row
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await conn.execute("PRAGMA busy_timeout=5000")
+                self._conn = conn
+        return self._conn
+
+    async def _get_read_conn(self) -> aiosqlite.Connection:
+        if self._read_conn is not None:
+            return self._read_conn
+        # Creates the database and runs the migrations first
+        await self._get_conn()
+        async with self._init_lock:
+            if self._read_conn is None:
+                conn = await aiosqlite.connect(
+                    f"file:{quote(os.path.abspath(self._path))}?mode=ro",
+                    uri=True,
+                    isolation_level=None,
+                    cached_statements=STATEMENT_CACHE_SIZE,
+                )
+                conn.row_factory = aiosqlite.Row
+                await conn.execute("PRAGMA busy_timeout=5000")
+                self._read_conn = conn
+        return self._read_conn
+
+    async def close(self):
+        for conn in (self._read_conn, self._conn):
+            if conn is not None:
+                await conn.close()
+        self._conn = self._read_conn = None
+
+    async def _fetchall(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        conn = await self._get_read_conn()
+        async with conn.execute(sql, params) as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
+
+    async def _fetchone(self, sql: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
+        conn = await self._get_read_conn()
+        async with conn.execute(sql, params) as cursor:
+            row = await cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    async def _execute(self, sql: str, params: tuple = ()) -> int:
+        # Writes share the lock so they never land inside another
+        # coroutine's open transaction on the shared connection
+        conn = await self._get_conn()
+        async with self._write_lock:
+            async with conn.execute(sql, params) as cursor:
+                return cursor.rowcount
+
+    @staticmethod
+    def _user_filter(user_id: str, column: str = "user_id") -> tuple:
+        if user_id:
+            return f" AND {column} = ?", (user_id,)
+        return "", ()
+
+    # ── Canvases ──────────────────────────────────────────────────────────
+
+    async def create_canvas(self, id: str, name: str, user_id: str = ""):
+        """Create a new canvas."""
+        await self._execute(
+            "INSERT INTO canvases (id, name, user_id, data) VALUES (?, ?, ?, '{}')",
+            (id, name, user_id),
+        )
+
+    async def list_canvases(self, user_id: str = "") -> List[Dict[str, Any]]:
+        """List canvases for a user."""
+        where, params = self._user_filter(user_id)
+        rows = await self._fetchall(
+            "SELECT id, name, description, thumbnail, created_at, updated_at "
+            f"FROM canvases WHERE 1 = 1{where} ORDER BY updated_at DESC",
+            params,
+        )
+        return rehydrate_blobs(rows)
+
+    async def get_canvas_data(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        """Get canvas data including sessions."""
+        canvas = await self.get_canvas_document(id, user_id)
+        if canvas is None:
+            return None
+        canvas["sessions"] = await self.list_sessions(id)
+        return canvas
+
+    async def get_canvas_document(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        """Get only the canvas document (data, name, version), without sessions."""
+        where, params = self._user_filter(user_id)
+        row = await self._fetchone(
+            f"SELECT data, name, version FROM canvases WHERE id = ?{where}",
+            (id, *params),
+        )
+        if not row:
+            return None
+        try:
+            data = json.loads(row.get("data") or "{}")
+        except (json.JSONDecodeError, TypeError):
+            data = {}
+        return {
+            "data": rehydrate_blobs(data or {}),
+            "name": row.get("name", ""),
+            "version": row.get("version", 0),
+        }
+
+    async def get_canvas(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        """Get one canvas row without its document (uncached, for ownership checks)."""
+        where, params = self._user_filter(user_id)
+        return await self._fetchone(
+            f"SELECT id, user_id FROM canvases WHERE id = ?{where}",
+            (id, *params),
+        )
+
+    async def save_canvas_data(self, id: str, data: str, thumbnail: str = None, user_id: str = ""):
+        """Save canvas data (JSON string); large data URLs go to Storage."""
+        if isinstance(data, str):
+            data = json.loads(data)
+        data = json.dumps(await externalize_blobs(data, user_id))
+        thumbnail = await externalize_blobs(thumbnail, user_id)
+        where, params = self._user_filter(user_id)
+        await self._execute(
+            "UPDATE canvases SET data = ?, thumbnail = COALESCE(?, thumbnail), "
+            f"version = version + 1, updated_at = {NOW_SQL} WHERE id = ?{where}",
+            (data, thumbnail, id, *params),
+        )
+
+    async def apply_canvas_delta(
+        self,
+        id: str,
+        upserts: Optional[List[Dict[str, Any]]] = None,
+        deletes: Optional[List[str]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        app_state: Optional[Dict[str, Any]] = None,
+        base_version: Optional[int] = None,
+        thumbnail: Optional[str] = None,
+        user_id: str = "",
+    ) -> Optional[int]:
+        """Apply element-level changes to a canvas; see DatabaseService."""
+        upserts = await externalize_blobs(upserts or [], user_id)
+        files = await externalize_blobs(files or {}, user_id)
+        thumbnail = await externalize_blobs(thumbnail, user_id)
+        where, params = self._user_filter(user_id)
+        conn = await self._get_conn()
+        async with self._write_lock:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                async with conn.execute(
+                    f"SELECT data, version FROM canvases WHERE id = ?{where}",
+                    (id, *params),
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is None:
+                    await conn.execute("ROLLBACK")
+                    return None
+                version = row["version"]
+                if base_version is not None and base_version != version:
+                    await conn.execute("ROLLBACK")
+                    raise CanvasVersionConflict(id, base_version)
+                try:
+                    doc = json.loads(row["data"] or "{}")
+                except (json.JSONDecodeError, TypeError):
+                    doc = {}
+                doc = merge_canvas_delta(
+                    doc, upserts or [], deletes or [], files or {}, app_state
+                )
+                await conn.execute(
+                    "UPDATE canvases SET data = ?, thumbnail = COALESCE(?, thumbnail), "
+                    f"version = version + 1, updated_at = {NOW_SQL} WHERE id = ?",
+                    (json.dumps(doc), thumbnail, id),
+                )
+                await conn.execute("COMMIT")
+            except CanvasVersionConflict:
+                raise
+            except Exception:
+                await conn.execute("ROLLBACK")
+                raise
+        return version + 1
+
+    async def delete_canvas(self, id: str, user_id: str = ""):
+        """Delete a canvas; its sessions are detached like ON DELETE SET NULL."""
+        where, params = self._user_filter(user_id)
+        conn = await self._get_conn()
+        async with self._write_lock:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                async with conn.execute(
+                    f"DELETE FROM canvases WHERE id = ?{where}", (id, *params)
+                ) as cursor:
+                    deleted = cursor.rowcount
+                if deleted:
+                    await conn.execute(
+                        "UPDATE chat_sessions SET canvas_id = NULL WHERE canvas_id = ?",
+                        (id,),
+                    )
+                await conn.execute("COMMIT")
+            except Exception:
+                await conn.execute("ROLLBACK")
+                raise
+
+    async def rename_canvas(self, id: str, name: str, user_id: str = ""):
+        """Rename a canvas."""
+        where, params = self._user_filter(user_id)
+        await self._execute(
+            f"UPDATE canvases SET name = ? WHERE id = ?{where}", (name, id, *params)
+        )
+
+    # ── Chat Sessions ─────────────────────────────────────────────────────
+
+    async def create_chat_session(
+        self,
+        id: str,
+        model: str,
+        provider: str,
+        canvas_id: str,
+        title: Optional[str] = None,
+        user_id: str = "",
+    ):
+        """Create a new chat session."""
+        await self._execute(
+            "INSERT INTO chat_sessions (id, model, provider, canvas_id, title, user_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (id, model, provider, canvas_id or None, title or None, user_id),
+        )
+
+    async def get_chat_session(
+        self, id: str, user_id: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """Get one chat session (uncached, for ownership checks)."""
+        where, params = self._user_filter(user_id)
+        return await self._fetchone(
+            f"SELECT id, canvas_id, user_id FROM chat_sessions WHERE id = ?{where}",
+            (id, *params),
+        )
+
+    async def list_sessions(
+        self, canvas_id: str = "", user_id: str = ""
+    ) -> List[Dict[str, Any]]:
+        """List chat sessions, optionally filtered by canvas_id."""
+        sql = "SELECT id, title, model, provider, created_at, updated_at FROM chat_sessions WHERE 1 = 1"
+        params: tuple = ()
+        if canvas_id:
+            sql += " AND canvas_id = ?"
+            params += (canvas_id,)
+        where, user_params = self._user_filter(user_id)
+        return await self._fetchall(
+            f"{sql}{where} ORDER BY updated_at DESC", params + user_params
+        )
+
+    # ── Chat Messages ─────────────────────────────────────────────────────
+
+    async def create_message(self, session_id: str, role: str, message: str, user_id: str = ""):
+        """Save a chat message; large inline data URLs are moved to Storage."""
+        try:
+            msg_data = json.loads(message) if isinstance(message, str) else message
+        except (json.JSONDecodeError, TypeError):
+            msg_data = message
+        msg_data = await externalize_blobs(msg_data, user_id)
+        await self._execute(
+            "INSERT INTO chat_messages (session_id, role, message) VALUES (?, ?, ?)",
+            (session_id, role, json.dumps(msg_data)),
+        )
+
+    async def create_messages(
+        self, session_id: str, messages: List[Tuple[str, str]], user_id: str = ""
+    ):
+        """Save several (role, message) pairs in one transaction, in order."""
+        if not messages:
+            return
+        rows = []
+        for role, message in messages:
+            try:
+                msg_data = json.loads(message) if isinstance(message, str) else message
+            except (json.JSONDecodeError, TypeError):
+                msg_data = message
+            msg_data = await externalize_blobs(msg_data, user_id)
+            rows.append((session_id, role, json.dumps(msg_data)))
+        conn = await self._get_conn()
+        async with self._write_lock:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                await conn.executemany(
+                    "INSERT INTO chat_messages (session_id, role, message) VALUES (?, ?, ?)",
+                    rows,
+                )
+                await conn.execute("COMMIT")
+            except Exception:
+                await conn.execute("ROLLBACK")
+                raise
+
+    def _history_sql(self, user_id: str) -> tuple:
+        """Messages of a session, scoped to the owner with a join."""
+        if user_id:
+            return (
+                "SELECT m.id, m.role, m.message FROM chat_messages m "
+                "JOIN chat_sessions s ON s.id = m.session_id "
+                "WHERE m.session_id = ? AND s.user_id = ?",
+                (user_id,),
+            )
+        return (
+            "SELECT m.id, m.role, m.message FROM chat_messages m WHERE m.session_id = ?",
+            (),
+        )
+
+    async def get_chat_history(
+        self, session_id: str, user_id: str = ""
+    ) -> List[Dict[str, Any]]:
+        """Get chat history for a session."""
+        sql, params = self._history_sql(user_id)
+        rows = await self._fetchall(f"{sql} ORDER BY m.id", (session_id, *params))
+        messages = []
+        for row in rows:
+            msg = self._parse_message(row)
+            if msg is not None:
+                messages.append(msg)
+        return messages
+
+    async def get_chat_history_page(
+        self,
+        session_id: str,
+        user_id: str = "",
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """Get one page of chat history using message-id cursors."""
+        sql, params = self._history_sql(user_id)
+        params = (session_id, *params)
+        if after_id is not None:
+            sql += " AND m.id > ? ORDER BY m.id ASC"
+            params += (after_id,)
+        else:
+            if before_id is not None:
+                sql += " AND m.id < ?"
+                params += (before_id,)
+            sql += " ORDER BY m.id DESC"
+        rows = await self._fetchall(f"{sql} LIMIT ?", params + (limit + 1,))
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after_id is None:
+            rows.reverse()
+
+        messages = []
+        for row in rows:
+            msg = self._parse_message(row)
+            if msg is not None:
+                messages.append({"id": row.get("id"), "message": msg})
+        return {
+            "messages": messages,
+            "first_id": rows[0].get("id") if rows else None,
+            "last_id": rows[-1].get("id") if rows else None,
+            "has_more": has_more,
+        }
+
+    # ── Generated Content ─────────────────────────────────────────────────
+
+    @staticmethod
+    def _content_values(data: Dict[str, Any]) -> Dict[str, Any]:
+        values = {k: data.get(k) for k in CONTENT_COLUMNS if k in data}
+        values.setdefault("id", str(uuid.uuid4()))
+        values["metadata"] = json.dumps(values.get("metadata") or {})
+        return values
+
+    async def insert_generated_content(self, data: Dict[str, Any]):
+        """Insert a row into the generated_content table."""
+        values = self._content_values(data)
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        await self._execute(
+            f"INSERT INTO generated_content ({columns}) VALUES ({placeholders})",
+            tuple(values.values()),
+        )
+
+    async def upsert_generated_content_bulk(
+        self, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Upsert many generated_content rows in one transaction."""
+        merged = self._merge_content_rows(rows)
+        if not merged:
+            return []
+        conn = await self._get_conn()
+        ids: List[str] = []
+        inserted = set()
+        async with self._write_lock:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (user_id, storage_path), row in merged.items():
+                    async with conn.execute(
+                        "SELECT id, type, prompt, model, metadata FROM generated_content "
+                        "WHERE user_id = ? AND storage_path = ?",
+                        (user_id, storage_path),
+                    ) as cursor:
+                        existing = await cursor.fetchone()
+                    if existing is None:
+                        values = self._content_values(row)
+                        columns = ", ".join(values)
+                        placeholders = ", ".join("?" for _ in values)
+                        await conn.execute(
+                            f"INSERT INTO generated_content ({columns}) VALUES ({placeholders})",
+                            tuple(values.values()),
+                        )
+                        ids.append(values["id"])
+                        inserted.add(values["id"])
+                        continue
+                    # Same rules as the upsert_generated_content SQL function
+                    metadata = {
+                        **json.loads(existing["metadata"] or "{}"),
+                        **(row.get("metadata") or {}),
+                    }
+                    await conn.execute(
+                        "UPDATE generated_content SET metadata = ?, "
+                        "prompt = COALESCE(NULLIF(prompt, ''), ?), "
+                        "model = COALESCE(NULLIF(model, ''), ?), "
+                        "type = COALESCE(type, ?) WHERE id = ?",
+                        (
+                            json.dumps(metadata),
+                            row.get("prompt"),
+                            row.get("model"),
+                            row.get("type"),
+                            existing["id"],
+                        ),
+                    )
+                    ids.append(existing["id"])
+                await conn.execute("COMMIT")
+            except Exception:
+                await conn.execute("ROLLBACK")
+                raise
+        placeholders = ", ".join("?" for _ in ids)
+        stored = await self._fetchall(
+            f"SELECT * FROM generated_content WHERE id IN ({placeholders})", tuple(ids)
+        )
+        by_id = {row["id"]: row for row in stored}
+        return [
+            {**self._decode_content(by_id[i]), "inserted": i in inserted}
+            for i in ids if i in by_id
+        ]
+
+    @staticmethod
+    def _decode_content(row: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            row["metadata"] = json.loads(row.get("metadata") or "{}")
+        except (json.JSONDecodeError, TypeError):
+            row["metadata"] = {}
+        return row
+
+    async def list_generated_content(
+        self,
+        user_id: str,
+        content_type: Optional[str] = None,
+        feature_type: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """List generated content for a user, newest first (keyset or offset)."""
+        sql = "SELECT * FROM generated_content WHERE user_id = ?"
+        params: tuple = (user_id,)
+        if content_type:
+            sql += " AND type = ?"
+            params += (content_type,)
+        if feature_type:
+            models = self.FEATURE_MODEL_MAP.get(feature_type, [])
+            if models:
+                sql += f" AND (feature_type = ? OR model IN ({', '.join('?' for _ in models)}))"
+                params += (feature_type, *models)
+            else:
+                sql += " AND feature_type = ?"
+                params += (feature_type,)
+        if cursor:
+            created_at, last_id = decode_content_cursor(cursor)
+            sql += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += (created_at, created_at, last_id)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+        params += (limit, 0 if cursor else offset)
+        rows = await self._fetchall(sql, params)
+        return [self._flatten_metadata(self._decode_content(row)) for row in rows]
+
+    async def get_generated_content(
+        self, id: str, user_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Get a single generated content item."""
+        row = await self._fetchone(
+            "SELECT * FROM generated_content WHERE id = ? AND user_id = ?", (id, user_id)
+        )
+        return self._flatten_metadata(self._decode_content(row)) if row else None
+
+    async def delete_generated_content(self, id: str, user_id: str):
+        """Delete a generated content item."""
+        await self._execute(
+            "DELETE FROM generated_content WHERE id = ? AND user_id = ?", (id, user_id)
+        )
+
+    # ── Vibe Motion Projects ─────────────────────────────────────────────────
+
+    async def create_vibe_motion_project(
+        self,
+        id: str,
+        name: str,
+        preset: str,
+        user_id: str = "",
+        prompt: str = "",
+        code: str = "",
+        model: str = "gpt-4o",
+        style: str = None,
+        theme: str = None,
+        duration: int = 10,
+        aspect_ratio: str = "16:9",
+        transition: str = "auto",
+        transition_direction: str = "from-left",
+        media_urls: List[str] = None,
+        thumbnail: str = "",
+    ):
+        """Create a new vibe motion project."""
+        await self._execute(
+            "INSERT INTO vibe_motion_projects (id, name, preset, user_id, prompt, code, "
+            "model, style, theme, duration, aspect_ratio, transition, "
+            "transition_direction, media_urls, thumbnail) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                id,
+                name,
+                preset,
+                user_id,
+                prompt,
+                code,
+                model,
+                style,
+                theme,
+                duration,
+                aspect_ratio,
+                transition,
+                transition_direction,
+                json.dumps(media_urls) if media_urls else None,
+                thumbnail,
+            ),
+        )
+
+    async def list_vibe_motion_projects(
+        self, user_id: str = "", limit: int = 50, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """List vibe motion projects for a user."""
+        where, params = self._user_filter(user_id)
+        return await self._fetchall(
+            f"SELECT * FROM vibe_motion_projects WHERE 1 = 1{where} "
+            "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+            params + (limit, offset),
+        )
+
+    async def get_vibe_motion_project(self, id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        """Get a single vibe motion project."""
+        where, params = self._user_filter(user_id)
+        return await self._fetchone(
+            f"SELECT * FROM vibe_motion_projects WHERE id = ?{where}", (id, *params)
+        )
+
+    async def update_vibe_motion_project(self, id: str, user_id: str = "", **fields):
+        """Update a vibe motion project; None values are left unchanged."""
+        allowed = (
+            "name", "prompt", "code", "model", "style", "theme", "duration",
+            "aspect_ratio", "transition", "transition_direction", "media_urls",
+            "thumbnail",
+        )
+        updates = {k: v for k, v in fields.items() if k in allowed and v is not None}
+        if "media_urls" in updates:
+            updates["media_urls"] = json.dumps(updates["media_urls"])
+        assignments = "".join(f"{k} = ?, " for k in updates)
+        where, params = self._user_filter(user_id)
+        await self._execute(
+            f"UPDATE vibe_motion_projects SET {assignments}updated_at = {NOW_SQL} "
+            f"WHERE id = ?{where}",
+            (*updates.values(), id, *params),
+        )
+
+    async def delete_vibe_motion_project(self, id: str, user_id: str = ""):
+        """Delete a vibe motion project."""
+        where, params = self._user_filter(user_id)
+        await self._execute(
+            f"DELETE FROM vibe_motion_projects WHERE id = ?{where}", (id, *params)
+        )
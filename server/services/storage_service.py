@@ -3,19 +3,90 @@ Supabase Storage service for file uploads/downloads.
 Replaces local FILES_DIR storage with Supabase Storage buckets.
 """
 
+import asyncio
 import os
-from typing import Optional
+import time
+import hashlib
+from urllib.parse import quote
+from typing import Any, Dict, List, Optional, Tuple
+from jose import jwt
 from services.supabase_service import get_supabase
 
 
 GENERATED_CONTENT_BUCKET = "generated-content"
 UPLOADS_BUCKET = "uploads"
 
+# Reference-count table for content-addressed objects (see supabase/schema.sql)
+STORAGE_OBJECTS_TABLE = "storage_objects"
+
+# Content-addressed objects never change, so CDNs may cache them for a year
+IMMUTABLE_CACHE_CONTROL = "31536000"
+
 
 def _get_supabase_url() -> str:
     return os.getenv("SUPABASE_URL", "")
 
 
+class StorageUrlBuilder:
+    """
+    Builds Supabase Storage URLs without a round trip to the storage API.
+
+    Public URLs are a pure function of the project URL, bucket and path.
+    Signed URLs are minted locally when the project JWT secret is available
+    (Storage verifies them with that secret); otherwise they are requested
+    from Supabase in a single batch call.
+    """
+
+    def __init__(self, supabase_url: str = "", jwt_secret: str = "") -> None:
+        self._supabase_url = supabase_url
+        self._jwt_secret = jwt_secret
+
+    @property
+    def base_url(self) -> str:
+        url = self._supabase_url or _get_supabase_url()
+        return f"{url.rstrip('/')}/storage/v1"
+
+    @property
+    def jwt_secret(self) -> str:
+        return self._jwt_secret or os.getenv("SUPABASE_JWT_SECRET", "")
+
+    def public_url(self, bucket: str, path: str) -> str:
+        """Public URL of an object in a public bucket."""
+        return f"{self.base_url}/object/public/{bucket}/{quote(path.lstrip('/'))}"
+
+    def signed_url(self, bucket: str, path: str, expires_in: int = 3600) -> Optional[str]:
+        """Sign a URL locally, or return None if no JWT secret is configured."""
+        if not self.jwt_secret:
+            return None
+        path = path.lstrip("/")
+        now = int(time.time())
+        token = jwt.encode(
+            {"url": f"{bucket}/{path}", "iat": now, "exp": now + expires_in},
+            self.jwt_secret,
+            algorithm="HS256",
+        )
+        return f"{self.base_url}/object/sign/{bucket}/{quote(path)}?token={token}"
+
+    async def signed_urls(
+        self, bucket: str, paths: List[str], expires_in: int = 3600
+    ) -> Dict[str, str]:
+        """Sign many URLs at once; falls back to one batched Supabase request."""
+        if not paths:
+            return {}
+        if self.jwt_secret:
+            return {p: self.signed_url(bucket, p, expires_in) or "" for p in paths}
+        sb = await get_supabase()
+        result = await sb.storage.from_(bucket).create_signed_urls(paths, expires_in)
+        return {
+            item.get("path", ""): item.get("signedURL") or item.get("signedUrl") or ""
+            for item in result
+            if not item.get("error")
+        }
+
+
+url_builder = StorageUrlBuilder()
+
+
 async def upload_file(
     user_id: str,
     file_bytes: bytes,
@@ -48,11 +119,159 @@ async def upload_file(
     return await get_public_url(bucket, storage_path)
 
 
+def content_hash(file_bytes: bytes) -> str:
+    """Return the sha256 hex digest used as the content address of a file."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def content_addressed_filename(file_bytes: bytes, extension: str) -> str:
+    """Build the immutable filename ('<sha256>.<ext>') for a blob."""
+    return f"{content_hash(file_bytes)}.{extension.lstrip('.')}"
+
+
+# (bucket, path) -> upload task, so concurrent callers for the same content
+# wait for one upload instead of returning before the object exists
+_uploads_in_flight: Dict[Tuple[str, str], "asyncio.Task[Any]"] = {}
+
+
+async def _upload_once(
+    key: Tuple[str, str], sb: Any, file_bytes: bytes, content_type: str
+) -> None:
+    bucket, path = key
+    task = asyncio.ensure_future(
+        sb.storage.from_(bucket).upload(
+            path=path,
+            file=file_bytes,
+            file_options={
+                "content-type": content_type,
+                "cache-control": IMMUTABLE_CACHE_CONTROL,
+                "upsert": "true",
+            },
+        )
+    )
+    _uploads_in_flight[key] = task
+
+    def _done(_: "asyncio.Task[Any]") -> None:
+        if _uploads_in_flight.get(key) is task:
+            del _uploads_in_flight[key]
+
+    task.add_done_callback(_done)
+    await asyncio.shield(task)
+
+
+async def _object_exists(bucket: str, path: str) -> bool:
+    sb = await get_supabase()
+    try:
+        return bool(await sb.storage.from_(bucket).exists(path))
+    except Exception as e:
+        print(f"Warning: Failed to check stored object {bucket}/{path}: {e}")
+        return False
+
+
+async def upload_content_addressed(
+    user_id: str,
+    file_bytes: bytes,
+    extension: str,
+    bucket: str = GENERATED_CONTENT_BUCKET,
+    content_type: str = "image/png",
+) -> Tuple[str, str]:
+    """
+    Upload a file under its sha256 content address, skipping the upload when
+    the same bytes are already stored for this user.
+
+    Every call takes a reference on the object in the storage_objects table;
+    callers that drop the file should call release_file() so the object is
+    removed once nothing references it anymore. A call never returns before
+    the object is stored: concurrent calls for the same content wait for the
+    upload in flight and upload it themselves if that one fails.
+
+    Returns:
+        Tuple of (filename, public_url).
+    """
+    sha256 = content_hash(file_bytes)
+    filename = f"{sha256}.{extension.lstrip('.')}"
+    storage_path = f"{user_id}/{filename}"
+
+    sb = await get_supabase()
+    is_new = True
+    try:
+        result = await sb.rpc(
+            "acquire_storage_object",
+            {
+                "p_bucket": bucket,
+                "p_path": storage_path,
+                "p_sha256": sha256,
+                "p_size_bytes": len(file_bytes),
+                "p_content_type": content_type,
+            },
+        ).execute()
+        is_new = bool(result.data)
+    except Exception as e:
+        # Reference table unavailable — fall back to a plain (idempotent) upload
+        print(f"Warning: storage_objects dedup check failed for {storage_path}: {e}")
+
+    key = (bucket, storage_path)
+    pending = _uploads_in_flight.get(key)
+    if pending is not None:
+        # Same bytes are being uploaded by this process: return once they are stored
+        try:
+            await asyncio.shield(pending)
+            is_new = False
+        except Exception:
+            is_new = True
+    elif not is_new:
+        # The first reference was taken by another worker whose upload may
+        # still be running or may have failed: only skip once the object is there
+        is_new = not await _object_exists(bucket, storage_path)
+
+    if is_new:
+        try:
+            await _upload_once(key, sb, file_bytes, content_type)
+        except Exception:
+            try:
+                await _drop_reference(bucket, storage_path)
+            except Exception:
+                pass
+            raise
+    else:
+        print(f"♻️ Reusing stored object {bucket}/{storage_path}")
+
+    return filename, await get_public_url(bucket, storage_path)
+
+
+async def _drop_reference(bucket: str, path: str) -> Optional[int]:
+    """
+    Decrement an object's reference count and return the remaining count,
+    or None if the object was not reference-counted.
+    """
+    sb = await get_supabase()
+    result = await sb.rpc(
+        "release_storage_object", {"p_bucket": bucket, "p_path": path}
+    ).execute()
+    return result.data if isinstance(result.data, int) else None
+
+
+async def release_file(bucket: str, path: str) -> None:
+    """
+    Drop one reference to a stored file and delete the object once no
+    references remain. Files that were never reference-counted (legacy
+    nanoid uploads) are deleted immediately.
+    """
+    try:
+        remaining = await _drop_reference(bucket, path)
+    except Exception as e:
+        # Keep the object: deleting it could break other references
+        print(f"Warning: Failed to release storage reference {bucket}/{path}: {e}")
+        return
+    if remaining is not None and remaining > 0:
+        return
+    sb = await get_supabase()
+    await sb.storage.from_(bucket).remove([path])
+
+
 async def get_public_url(bucket: str, path: str) -> str:
     """Get the public URL for a file in Supabase Storage."""
-    sb = await get_supabase()
-    result = await sb.storage.from_(bucket).get_public_url(path)
-    return result
+    return url_builder.public_url(bucket, path)
 
 
 async def list_files(
@@ -60,10 +279,15 @@ async def list_files(
     bucket: str = UPLOADS_BUCKET,
     limit: int = 50,
     offset: int = 0,
+    signed: bool = False,
+    expires_in: int = 3600,
 ) -> list[dict]:
     """
     List files in a Supabase Storage bucket for a given user.
 
+    URLs are built locally (or signed in one batch when ``signed`` is set),
+    so listing costs a single upstream round trip.
+
     Returns a list of dicts with 'name' and 'url' keys.
     """
     sb = await get_supabase()
@@ -71,18 +295,37 @@ async def list_files(
         path=user_id,
         options={"limit": limit, "offset": offset, "sortBy": {"column": "created_at", "order": "desc"}},
     )
-    files = []
-    for item in result:
-        name = item.get("name", "")
-        if not name or item.get("id") is None:
-            continue
-        storage_path = f"{user_id}/{name}"
-        url = await get_public_url(bucket, storage_path)
-        files.append({"name": name, "url": url, "created_at": item.get("created_at", "")})
-    return files
+    items = [
+        item for item in result
+        if item.get("name") and item.get("id") is not None
+    ]
+    paths = [f"{user_id}/{item['name']}" for item in items]
+    if signed:
+        urls = await url_builder.signed_urls(bucket, paths, expires_in)
+    else:
+        urls = {path: url_builder.public_url(bucket, path) for path in paths}
+
+    return [
+        {"name": item["name"], "url": urls.get(path, ""), "created_at": item.get("created_at", "")}
+        for item, path in zip(items, paths)
+    ]
 
 
 async def delete_file(bucket: str, path: str) -> None:
-    """Delete a file from Supabase Storage."""
+    """
+    Delete a file from Supabase Storage, regardless of its reference count.
+
+    For administrative cleanup; user-facing deletes go through release_file().
+    """
     sb = await get_supabase()
     await sb.storage.from_(bucket).remove([path])
+    try:
+        await (
+            sb.table(STORAGE_OBJECTS_TABLE)
+            .delete()
+            .eq("bucket", bucket)
+            .eq("storage_path", path)
+            .execute()
+        )
+    except Exception as e:
+        print(f"Warning: Failed to clear storage reference {bucket}/{path}: {e}")
@@ -0,0 +1,101 @@
+"""
+Coalescing of streamed socket events.
+
+LLM streams produce one `delta` (or `tool_call_arguments`) event per token.
+StreamCoalescer buffers consecutive text events of the same kind and sends
+them as one frame every STREAM_FLUSH_INTERVAL_MS milliseconds, or as soon as
+STREAM_FLUSH_MAX_BYTES of text is buffered. Any other event (tool_call,
+tool_call_result, done, error, ...) first flushes the buffer, so the client
+sees events in the order they were produced.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "50"))
+STREAM_FLUSH_MAX_BYTES = int(os.getenv("STREAM_FLUSH_MAX_BYTES", "4096"))
+
+
+class StreamCoalescer:
+    """Per-session buffer in front of a `send(session_id, event)` callable."""
+
+    def __init__(
+        self,
+        session_id: str,
+        send: Callable[[str, Dict[str, Any]], Awaitable[None]],
+        flush_interval_ms: int = STREAM_FLUSH_INTERVAL_MS,
+        max_bytes: int = STREAM_FLUSH_MAX_BYTES,
+    ) -> None:
+        self.session_id = session_id
+        self.send = send
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_bytes = max_bytes
+        # (type, id) of the event being buffered and its text parts
+        self._key: Optional[Tuple[str, Optional[str]]] = None
+        self._parts: List[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.Task] = None
+        # Frames are sent one at a time, in the order they were taken
+        self._send_lock = asyncio.Lock()
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._size
+
+    async def add_text(self, event_type: str, text: str, id: Optional[str] = None) -> None:
+        """Buffer a text fragment; fragments with the same type and id are joined."""
+        if not text:
+            return
+        key = (event_type, id)
+        if self._key is not None and self._key != key:
+            await self.flush()
+        self._key = key
+        self._parts.append(text)
+        self._size += len(text.encode("utf-8"))
+        if self._size >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def emit(self, event: Dict[str, Any]) -> None:
+        """Send an event immediately, after whatever is buffered."""
+        await self.flush()
+        await self._send(event)
+
+    async def flush(self) -> None:
+        frame = self._take()
+        if frame is not None:
+            await self._send(frame)
+
+    async def close(self) -> None:
+        """Flush the buffer; safe to await from a cancelled task via asyncio.shield."""
+        await self.flush()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        # Cleared before flushing so _take never cancels a timer mid-send
+        self._timer = None
+        await self.flush()
+
+    def _take(self) -> Optional[Dict[str, Any]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._key is None:
+            return None
+        event_type, id = self._key
+        frame: Dict[str, Any] = {"type": event_type, "text": "".join(self._parts)}
+        if id is not None:
+            frame["id"] = id
+        self._key = None
+        self._parts = []
+        self._size = 0
+        return frame
+
+    async def _send(self, event: Dict[str, Any]) -> None:
+        # asyncio.Lock is FIFO, so frames leave in the order they were taken;
+        # the session seq is stamped when the event is broadcast
+        async with self._send_lock:
+            await self.send(self.session_id, event)
@@ -1,6 +1,7 @@
 # services/stream_service.py
 from typing import Dict, Optional, Any
 import asyncio
+from services.cluster_service import control_bus
 
 # Dictionary to store active stream tasks, keyed by session_id
 stream_tasks: Dict[str, asyncio.Task[Any]] = {}
@@ -36,4 +37,33 @@ def get_stream_task(session_id: str) -> Optional[asyncio.Task[Any]]:
     """
     return stream_tasks.get(session_id)
 
+async def cancel_stream(session_id: str) -> bool:
+    """
+    Cancel the stream for session_id, on whichever worker runs it.
+
+    Args:
+        session_id (str): Unique identifier for the session.
+
+    Returns:
+        True if a running stream was cancelled.
+    """
+    task = get_stream_task(session_id)
+    if task and not task.done():
+        task.cancel()
+        return True
+    # Not ours: ask the worker that owns the stream
+    reply = await control_bus.request('cancel_stream', {'session_id': session_id})
+    return bool(reply and reply.get('cancelled'))
+
+
+async def _handle_cancel_stream(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    task = get_stream_task(message.get('session_id', ''))
+    if task and not task.done():
+        task.cancel()
+        return {'cancelled': True}
+    return None
+
+
+control_bus.on('cancel_stream', _handle_cancel_stream)
+
 # 你也可以加一个 list_stream_tasks() 返回所有 session_id
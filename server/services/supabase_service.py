@@ -6,6 +6,8 @@ Provides a service-role client for backend operations (bypasses RLS).
 import os
 from typing import Optional
 from supabase._async.client import create_client, AsyncClient
+from services.cache_service import cache_service
+from utils.singleflight import singleflight
 
 
 _supabase_client: Optional[AsyncClient] = None
@@ -36,6 +38,9 @@ def is_supabase_configured() -> bool:
 # Character CRUD helpers
 # ---------------------------------------------------------------------------
 
+CHARACTERS_CACHE = "characters"
+
+
 async def create_character(
     user_id: str, name: str, style: str, description: str, reference_images: list
 ) -> dict:
@@ -48,21 +53,26 @@ async def create_character(
         "reference_images": reference_images or [],
     }
     result = await sb.table("characters").insert(row).execute()
+    await cache_service.invalidate(CHARACTERS_CACHE, user_id)
     return result.data[0] if result.data else {}
 
 
 async def list_characters(user_id: str) -> list:
-    sb = await get_supabase()
-    result = (
-        await sb.table("characters")
-        .select("*")
-        .eq("user_id", user_id)
-        .order("created_at", desc=True)
-        .execute()
-    )
-    return result.data or []
+    async def load() -> list:
+        sb = await get_supabase()
+        result = (
+            await sb.table("characters")
+            .select("*")
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .execute()
+        )
+        return result.data or []
+
+    return await cache_service.get_or_load(CHARACTERS_CACHE, user_id, None, load)
 
 
+@singleflight
 async def get_character(character_id: str, user_id: str) -> dict | None:
     sb = await get_supabase()
     result = (
@@ -85,6 +95,7 @@ async def update_character(character_id: str, user_id: str, updates: dict) -> di
         .eq("user_id", user_id)
         .execute()
     )
+    await cache_service.invalidate(CHARACTERS_CACHE, user_id)
     return result.data[0] if result.data else None
 
 
@@ -97,4 +108,5 @@ async def delete_character(character_id: str, user_id: str) -> bool:
         .eq("user_id", user_id)
         .execute()
     )
+    await cache_service.invalidate(CHARACTERS_CACHE, user_id)
     return bool(result.data)
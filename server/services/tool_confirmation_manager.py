@@ -2,6 +2,7 @@ import asyncio
 from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from services.cluster_service import control_bus
 
 
 @dataclass
@@ -67,6 +68,17 @@ class ToolConfirmationManager:
             return True
         return False
 
+    async def resolve(self, tool_call_id: str, confirmed: bool) -> bool:
+        """确认或取消工具调用；请求不在本进程时转发给持有它的 worker"""
+        resolve = self.confirm_tool if confirmed else self.cancel_confirmation
+        if resolve(tool_call_id):
+            return True
+        reply = await control_bus.request('resolve_tool_confirmation', {
+            'tool_call_id': tool_call_id,
+            'confirmed': confirmed,
+        })
+        return bool(reply and reply.get('resolved'))
+
     def get_pending_request(self, tool_call_id: str) -> Optional[ToolConfirmationRequest]:
         """获取待确认的请求"""
         return self.pending_confirmations.get(tool_call_id)
@@ -84,3 +96,15 @@ class ToolConfirmationManager:
 
 # 全局实例
 tool_confirmation_manager = ToolConfirmationManager()
+
+
+async def _handle_resolve(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    tool_call_id = message.get('tool_call_id', '')
+    if message.get('confirmed'):
+        resolved = tool_confirmation_manager.confirm_tool(tool_call_id)
+    else:
+        resolved = tool_confirmation_manager.cancel_confirmation(tool_call_id)
+    return {'resolved': True} if resolved else None
+
+
+control_bus.on('resolve_tool_confirmation', _handle_resolve)
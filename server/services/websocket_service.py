@@ -1,22 +1,84 @@
 # services/websocket_service.py
-from services.websocket_state import sio, get_all_socket_ids
+from services.websocket_state import (
+    sio,
+    session_room,
+    canvas_room,
+    get_user_socket_ids,
+)
+from services.event_replay import replay_buffer
+from services.cluster_service import control_bus
+from services.socket_outbox import deliver
 import traceback
-from typing import Any, Dict
+from typing import Any, Dict, List
+
+
+async def _join_local_connections(user_id: str, session_id: str, canvas_id: str | None) -> None:
+    rooms = [session_room(session_id)] if session_id else []
+    if canvas_id:
+        rooms.append(canvas_room(canvas_id))
+    for socket_id in get_user_socket_ids(user_id):
+        for room in rooms:
+            await sio.enter_room(socket_id, room)
+
+
+async def join_session_rooms(user_id: str, session_id: str, canvas_id: str | None = None):
+    """Put every connection of ``user_id`` into the session (and canvas) room.
+
+    Called when the user starts a chat, so its events reach all of the user's
+    tabs without the client having to join explicitly. Connections held by
+    other workers are joined by those workers.
+    """
+    await _join_local_connections(user_id, session_id, canvas_id)
+    await control_bus.publish('join_session_rooms', {
+        'user_id': user_id,
+        'session_id': session_id,
+        'canvas_id': canvas_id,
+    })
+
+
+async def _handle_join_session_rooms(message: Dict[str, Any]) -> None:
+    await _join_local_connections(
+        message.get('user_id', ''), message.get('session_id', ''), message.get('canvas_id')
+    )
+
+
+control_bus.on('join_session_rooms', _handle_join_session_rooms)
+
+
+def _event_rooms(session_id: str, canvas_id: str | None) -> List[str]:
+    rooms = [session_room(session_id)]
+    if canvas_id:
+        rooms.append(canvas_room(canvas_id))
+    return rooms
 
 
 async def broadcast_session_update(session_id: str, canvas_id: str | None, event: Dict[str, Any]):
-    socket_ids = get_all_socket_ids()
-    if socket_ids:
-        try:
-            for socket_id in socket_ids:
-                await sio.emit('session_update', {
-                    'canvas_id': canvas_id,
-                    'session_id': session_id,
-                    **event
-                }, room=socket_id)
-        except Exception as e:
-            print(f"Error broadcasting session update for {session_id}: {e}")
-            traceback.print_exc()
+    payload = {
+        'canvas_id': canvas_id,
+        'session_id': session_id,
+        **event
+    }
+    try:
+        # Stamp with the session's next seq and keep it for reconnect replay
+        payload = await replay_buffer.append(session_id, payload)
+    except Exception as e:
+        print(f"Warning: Failed to buffer event for session {session_id}: {e}")
+    # Queued per connection (a socket in both rooms gets one frame); other
+    # workers deliver to their own connections
+    rooms = _event_rooms(session_id, canvas_id)
+    try:
+        deliver(sio, rooms, payload)
+        await control_bus.publish('session_event', {'rooms': rooms, 'payload': payload})
+    except Exception as e:
+        print(f"Error broadcasting session update for {session_id}: {e}")
+        traceback.print_exc()
+
+
+async def _handle_session_event(message: Dict[str, Any]) -> None:
+    deliver(sio, message.get('rooms', []), message.get('payload', {}))
+
+
+control_bus.on('session_event', _handle_session_event)
 
 # compatible with legacy codes
 # TODO: All Broadcast should have a canvas_id
@@ -1,23 +1,60 @@
 # services/websocket_state.py
 import socketio
-from typing import Dict
+from typing import Dict, List, Set
+from services.cluster_service import WORKER_ID, create_client_manager
 
+# With CLUSTER_BACKEND=redis/postgres, emits reach sockets on every worker
 sio = socketio.AsyncServer(
     cors_allowed_origins="*",
-    async_mode='asgi'
+    async_mode='asgi',
+    client_manager=create_client_manager(),
 )
 
 active_connections: Dict[str, dict] = {}
+# Connections (and this map) are per worker; each entry records its worker_id
+# user_id -> socket ids of that user's connections on this server
+user_connections: Dict[str, Set[str]] = {}
+
+
+def user_room(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def session_room(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def canvas_room(canvas_id: str) -> str:
+    return f"canvas:{canvas_id}"
+
 
 def add_connection(socket_id: str, user_info: dict = None):
-    active_connections[socket_id] = user_info or {}
+    active_connections[socket_id] = {**(user_info or {}), 'worker_id': WORKER_ID}
+    user_id = active_connections[socket_id].get('user_id')
+    if user_id:
+        user_connections.setdefault(user_id, set()).add(socket_id)
     print(f"New connection added: {socket_id}, total connections: {len(active_connections)}")
 
 def remove_connection(socket_id: str):
     if socket_id in active_connections:
-        del active_connections[socket_id]
+        user_id = active_connections.pop(socket_id).get('user_id')
+        sids = user_connections.get(user_id)
+        if sids is not None:
+            sids.discard(socket_id)
+            if not sids:
+                del user_connections[user_id]
         print(f"Connection removed: {socket_id}, total connections: {len(active_connections)}")
 
+def get_connection_user(socket_id: str) -> str:
+    return active_connections.get(socket_id, {}).get('user_id', '')
+
+def get_connection_wire(socket_id: str) -> dict:
+    """Wire options negotiated at connect (see services.wire_format)."""
+    return active_connections.get(socket_id, {}).get('wire', {})
+
+def get_user_socket_ids(user_id: str) -> List[str]:
+    return list(user_connections.get(user_id, ()))
+
 def get_all_socket_ids():
     return list(active_connections.keys())
 
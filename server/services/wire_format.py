@@ -0,0 +1,102 @@
+"""
+Per-connection wire encoding of session events.
+
+Clients opt in at connect time through the socket.io auth payload:
+
+    {token, encoding: 'json' | 'msgpack' | 'deflate', compact_elements: bool}
+
+- json     — plain socket.io JSON (default)
+- msgpack  — one binary attachment with the msgpack-encoded event
+- deflate  — one binary attachment with zlib-compressed compact JSON
+- compact_elements — canvas elements in `element` / `elements` are sent
+  without the fields that equal MEDIA_ELEMENT_DEFAULTS; the 'connected'
+  event carries the defaults so the client can restore them
+
+An encoded frame is reused for every connection with the same options.
+"""
+
+import json
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from utils.canvas_elements import MEDIA_ELEMENT_DEFAULTS, compact_element
+
+
+ENCODINGS = ("json", "msgpack", "deflate")
+DEFLATE_LEVEL = 6
+# Frames shared by several connections are encoded once
+_ENCODE_CACHE_SIZE = 64
+
+_encode_cache: "OrderedDict[Tuple[int, str, bool], Tuple[Dict[str, Any], Any]]" = OrderedDict()
+
+
+def _packb(payload: Any) -> bytes:
+    try:
+        import ormsgpack  # type: ignore
+    except ImportError:
+        raise ImportError("Please install ormsgpack: pip install ormsgpack")
+    return ormsgpack.packb(payload, default=str, option=ormsgpack.OPT_NON_STR_KEYS)
+
+
+def negotiate(auth: Dict[str, Any]) -> Dict[str, Any]:
+    """Wire options for a connection from its auth payload."""
+    encoding = str(auth.get("encoding") or "json").lower()
+    if encoding not in ENCODINGS:
+        encoding = "json"
+    if encoding == "msgpack":
+        try:
+            _packb({})
+        except ImportError as e:
+            print(f"Warning: msgpack encoding unavailable, using json: {e}")
+            encoding = "json"
+    return {"encoding": encoding, "compact_elements": bool(auth.get("compact_elements"))}
+
+
+def handshake_fields(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Extra fields for the 'connected' event."""
+    fields: Dict[str, Any] = {"encoding": options.get("encoding", "json")}
+    if options.get("compact_elements"):
+        fields["element_defaults"] = MEDIA_ELEMENT_DEFAULTS
+    return fields
+
+
+def compact_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(payload.get("element"), dict):
+        payload = {**payload, "element": compact_element(payload["element"])}
+    if isinstance(payload.get("elements"), list):
+        payload = {
+            **payload,
+            "elements": [compact_element(e) if isinstance(e, dict) else e for e in payload["elements"]],
+        }
+    return payload
+
+
+def _encode(payload: Dict[str, Any], encoding: str, compact: bool) -> Any:
+    if compact:
+        payload = compact_payload(payload)
+    if encoding == "msgpack":
+        return _packb(payload)
+    if encoding == "deflate":
+        raw = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        return zlib.compress(raw, DEFLATE_LEVEL)
+    return payload
+
+
+def encode(payload: Dict[str, Any], options: Dict[str, Any]) -> Any:
+    """Encode ``payload`` for a connection with the given wire options."""
+    encoding = options.get("encoding", "json")
+    compact = bool(options.get("compact_elements"))
+    if encoding == "json" and not compact:
+        return payload
+    key = (id(payload), encoding, compact)
+    cached = _encode_cache.get(key)
+    # The cache holds the payload itself, so its id can't be reused meanwhile
+    if cached is not None and cached[0] is payload:
+        _encode_cache.move_to_end(key)
+        return cached[1]
+    encoded = _encode(payload, encoding, compact)
+    _encode_cache[key] = (payload, encoded)
+    while len(_encode_cache) > _ENCODE_CACHE_SIZE:
+        _encode_cache.popitem(last=False)
+    return encoded
@@ -34,6 +34,106 @@ CREATE TABLE IF NOT EXISTS public.canvases (
 CREATE INDEX IF NOT EXISTS idx_canvases_user_updated
   ON canvases(user_id, updated_at DESC);
 
+-- Monotonic document version, bumped on every write to data (used by deltas)
+ALTER TABLE public.canvases ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION public.bump_canvas_version()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.version := COALESCE(OLD.version, 0) + 1;
+  NEW.updated_at := NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS on_canvas_data_updated ON public.canvases;
+CREATE TRIGGER on_canvas_data_updated
+  BEFORE UPDATE OF data ON public.canvases
+  FOR EACH ROW EXECUTE FUNCTION public.bump_canvas_version();
+
+-- Apply element-level changes to canvases.data in place.
+-- Upserted elements replace same-id elements (keeping z-order) or are appended;
+-- a repeated upsert id keeps its last entry. Deleted ids are dropped, even when
+-- also upserted, and p_files is merged into data.files.
+-- Returns the new version, -1 on a base-version conflict, NULL if not found.
+CREATE OR REPLACE FUNCTION public.apply_canvas_delta(
+  p_canvas_id TEXT,
+  p_user_id UUID,
+  p_base_version BIGINT,
+  p_upserts JSONB,
+  p_deletes JSONB,
+  p_files JSONB,
+  p_app_state JSONB,
+  p_thumbnail TEXT
+)
+RETURNS BIGINT AS $$
+DECLARE
+  doc JSONB;
+  current_version BIGINT;
+  existing JSONB;
+  upserts JSONB;
+  deletes JSONB;
+  merged JSONB;
+BEGIN
+  SELECT COALESCE(data, '{}'::jsonb), version INTO doc, current_version
+    FROM public.canvases
+    WHERE id = p_canvas_id AND (p_user_id IS NULL OR user_id = p_user_id)
+    FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+  IF p_base_version IS NOT NULL AND p_base_version <> current_version THEN
+    RETURN -1;
+  END IF;
+
+  existing := COALESCE(doc->'elements', '[]'::jsonb);
+  deletes := COALESCE(p_deletes, '[]'::jsonb);
+
+  -- One upsert per id: the last one wins, placed where the id first appeared
+  SELECT COALESCE(jsonb_agg(d.elem ORDER BY d.first_ord), '[]'::jsonb)
+    INTO upserts
+    FROM (
+      SELECT DISTINCT ON (u.elem->>'id')
+             u.elem,
+             min(u.ord) OVER (PARTITION BY u.elem->>'id') AS first_ord
+        FROM jsonb_array_elements(COALESCE(p_upserts, '[]'::jsonb)) WITH ORDINALITY AS u(elem, ord)
+        ORDER BY u.elem->>'id', u.ord DESC
+    ) d;
+
+  SELECT COALESCE(jsonb_agg(COALESCE(u.elem, e.elem) ORDER BY e.ord), '[]'::jsonb)
+    INTO merged
+    FROM jsonb_array_elements(existing) WITH ORDINALITY AS e(elem, ord)
+    LEFT JOIN jsonb_array_elements(upserts) AS u(elem)
+      ON u.elem->>'id' = e.elem->>'id'
+    WHERE NOT (deletes ? (e.elem->>'id'));
+
+  merged := merged || COALESCE((
+    SELECT jsonb_agg(u.elem ORDER BY u.ord)
+      FROM jsonb_array_elements(upserts) WITH ORDINALITY AS u(elem, ord)
+      WHERE NOT (deletes ? (u.elem->>'id'))
+        AND NOT EXISTS (
+          SELECT 1 FROM jsonb_array_elements(existing) AS e(elem)
+          WHERE e.elem->>'id' = u.elem->>'id'
+        )
+  ), '[]'::jsonb);
+
+  doc := doc || jsonb_build_object(
+    'elements', merged,
+    'files', COALESCE(doc->'files', '{}'::jsonb) || COALESCE(p_files, '{}'::jsonb)
+  );
+  IF p_app_state IS NOT NULL THEN
+    doc := doc || jsonb_build_object('appState', p_app_state);
+  END IF;
+
+  UPDATE public.canvases
+    SET data = doc,
+        thumbnail = COALESCE(p_thumbnail, thumbnail)
+    WHERE id = p_canvas_id;
+
+  RETURN current_version + 1;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ---------------------------------------------------------------------------
 -- 3. chat_sessions
 -- ---------------------------------------------------------------------------
@@ -80,8 +180,71 @@ CREATE TABLE IF NOT EXISTS public.generated_content (
   created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_generated_content_user
-  ON generated_content(user_id, created_at DESC);
+-- feature_type promoted out of metadata so it can be indexed
+ALTER TABLE public.generated_content
+  ADD COLUMN IF NOT EXISTS feature_type TEXT
+  GENERATED ALWAYS AS (metadata->>'feature_type') STORED;
+
+-- Keyset pagination on (created_at, id) for each listing filter
+CREATE INDEX IF NOT EXISTS idx_generated_content_user_keyset
+  ON generated_content(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_generated_content_user_type_keyset
+  ON generated_content(user_id, type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_generated_content_user_feature_keyset
+  ON generated_content(user_id, feature_type, created_at DESC, id DESC);
+-- Superseded by idx_generated_content_user_keyset
+DROP INDEX IF EXISTS idx_generated_content_user;
+
+-- One record per stored object; keep the oldest row of existing duplicates.
+-- Every save of a content-addressed image took a reference on its object, so
+-- the dropped duplicates give theirs back (storage_objects is section 8).
+DO $$
+BEGIN
+  IF to_regclass('public.storage_objects') IS NOT NULL THEN
+    UPDATE public.storage_objects so
+      SET ref_count = GREATEST(so.ref_count - d.dupes, 1),
+          updated_at = NOW()
+      FROM (
+        SELECT storage_path, COUNT(*) - 1 AS dupes
+          FROM public.generated_content
+          GROUP BY user_id, storage_path
+          HAVING COUNT(*) > 1
+      ) d
+      WHERE so.bucket = 'generated-content' AND so.storage_path = d.storage_path;
+  END IF;
+END $$;
+DELETE FROM public.generated_content a
+  USING public.generated_content b
+  WHERE a.user_id = b.user_id
+    AND a.storage_path = b.storage_path
+    AND (a.created_at, a.id) > (b.created_at, b.id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_generated_content_user_storage_path
+  ON generated_content(user_id, storage_path);
+
+-- Insert-or-merge for one or many records keyed by (user_id, storage_path).
+-- Incoming metadata keys win; prompt/model/type only fill in blanks.
+-- Each returned row carries "inserted": false when it merged into an
+-- existing record (the caller then holds a storage reference too many).
+DROP FUNCTION IF EXISTS public.upsert_generated_content(JSONB);
+CREATE OR REPLACE FUNCTION public.upsert_generated_content(p_rows JSONB)
+RETURNS SETOF JSONB AS $$
+  INSERT INTO public.generated_content AS gc
+    (user_id, type, storage_path, prompt, model, metadata)
+  SELECT
+    (r->>'user_id')::uuid,
+    r->>'type',
+    r->>'storage_path',
+    r->>'prompt',
+    r->>'model',
+    COALESCE(r->'metadata', '{}'::jsonb)
+  FROM jsonb_array_elements(p_rows) AS r
+  ON CONFLICT (user_id, storage_path) DO UPDATE
+    SET metadata = COALESCE(gc.metadata, '{}'::jsonb) || EXCLUDED.metadata,
+        prompt = COALESCE(NULLIF(gc.prompt, ''), EXCLUDED.prompt),
+        model = COALESCE(NULLIF(gc.model, ''), EXCLUDED.model),
+        type = COALESCE(gc.type, EXCLUDED.type)
+  RETURNING to_jsonb(gc.*) || jsonb_build_object('inserted', gc.xmax = 0);
+$$ LANGUAGE sql;
 
 -- ---------------------------------------------------------------------------
 -- 6. comfy_workflows
@@ -114,6 +277,118 @@ CREATE TABLE IF NOT EXISTS public.characters (
 CREATE INDEX IF NOT EXISTS idx_characters_user_created
   ON characters(user_id, created_at DESC);
 
+-- ---------------------------------------------------------------------------
+-- 8. storage_objects — reference counts for content-addressed files
+--    Objects live at '<user_id>/<sha256>.<ext>' and are immutable.
+-- ---------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS public.storage_objects (
+  bucket TEXT NOT NULL,
+  storage_path TEXT NOT NULL,
+  sha256 TEXT NOT NULL,
+  size_bytes BIGINT DEFAULT 0,
+  content_type TEXT,
+  ref_count INTEGER NOT NULL DEFAULT 1,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (bucket, storage_path)
+);
+
+CREATE INDEX IF NOT EXISTS idx_storage_objects_sha256
+  ON storage_objects(sha256);
+
+-- Take a reference on an object. Returns TRUE when the object is new and the
+-- caller must upload the bytes, FALSE when identical content is already stored.
+CREATE OR REPLACE FUNCTION public.acquire_storage_object(
+  p_bucket TEXT,
+  p_path TEXT,
+  p_sha256 TEXT,
+  p_size_bytes BIGINT,
+  p_content_type TEXT
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+  inserted BOOLEAN;
+BEGIN
+  INSERT INTO public.storage_objects (bucket, storage_path, sha256, size_bytes, content_type)
+  VALUES (p_bucket, p_path, p_sha256, p_size_bytes, p_content_type)
+  ON CONFLICT (bucket, storage_path) DO UPDATE
+    SET ref_count = storage_objects.ref_count + 1,
+        updated_at = NOW()
+  RETURNING (xmax = 0) INTO inserted;
+  RETURN inserted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop a reference. Returns the remaining count (the row is removed at zero),
+-- or NULL when the object was never reference-counted.
+CREATE OR REPLACE FUNCTION public.release_storage_object(p_bucket TEXT, p_path TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+  remaining INTEGER;
+BEGIN
+  UPDATE public.storage_objects
+    SET ref_count = ref_count - 1,
+        updated_at = NOW()
+    WHERE bucket = p_bucket AND storage_path = p_path
+    RETURNING ref_count INTO remaining;
+  IF remaining IS NOT NULL AND remaining <= 0 THEN
+    DELETE FROM public.storage_objects
+      WHERE bucket = p_bucket AND storage_path = p_path;
+  END IF;
+  RETURN remaining;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ---------------------------------------------------------------------------
+-- 9. resource_locks — cluster-wide leases for services/lock_service.py
+-- ---------------------------------------------------------------------------
+CREATE SEQUENCE IF NOT EXISTS public.resource_lock_fence_seq;
+
+CREATE TABLE IF NOT EXISTS public.resource_locks (
+  key TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  token BIGINT NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_resource_locks_expires
+  ON resource_locks(expires_at);
+
+-- Returns the lease token when the lease was granted, NULL when it is held.
+CREATE OR REPLACE FUNCTION public.acquire_resource_lock(
+  p_key TEXT,
+  p_owner TEXT,
+  p_lease_seconds DOUBLE PRECISION
+)
+RETURNS BIGINT AS $$
+DECLARE
+  fence BIGINT;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('resource_lock:' || p_key));
+  -- Evict leases abandoned by crashed holders
+  DELETE FROM public.resource_locks WHERE expires_at < NOW() - INTERVAL '1 hour';
+  IF EXISTS (
+    SELECT 1 FROM public.resource_locks WHERE key = p_key AND expires_at > NOW()
+  ) THEN
+    RETURN NULL;
+  END IF;
+  fence := nextval('public.resource_lock_fence_seq');
+  INSERT INTO public.resource_locks (key, owner, token, expires_at)
+  VALUES (p_key, p_owner, fence, NOW() + make_interval(secs => p_lease_seconds))
+  ON CONFLICT (key) DO UPDATE
+    SET owner = EXCLUDED.owner, token = EXCLUDED.token, expires_at = EXCLUDED.expires_at;
+  RETURN fence;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.release_resource_lock(p_key TEXT, p_token BIGINT)
+RETURNS BOOLEAN AS $$
+BEGIN
+  DELETE FROM public.resource_locks WHERE key = p_key AND token = p_token;
+  RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
 -- =============================================================================
 -- Auto-create profile on signup (trigger)
 -- =============================================================================
@@ -148,6 +423,8 @@ ALTER TABLE public.chat_sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.chat_messages ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.generated_content ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.characters ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.storage_objects ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.resource_locks ENABLE ROW LEVEL SECURITY;
 
 -- Profiles: users can read/update their own profile
 DO $$ BEGIN
@@ -0,0 +1,107 @@
+"""Tests for the compiled swarm cache and the LLM client pool."""
+
+from services.langgraph_service.agent_cache import (
+    LLMClientPool,
+    SwarmCache,
+    swarm_cache_key,
+)
+
+
+TOOLS = [{"id": "generate_image", "type": "image", "provider": "openai"}]
+
+
+def _key(**overrides):
+    args = dict(
+        provider="openai",
+        model="gpt-4o",
+        base_url="https://api.openai.com/v1",
+        api_key="sk-1",
+        tool_list=TOOLS,
+        system_prompt="be brief",
+        default_agent="planner",
+        tools_version=0,
+    )
+    args.update(overrides)
+    return swarm_cache_key(**args)
+
+
+class TestSwarmCacheKey:
+    def test_same_config_same_key(self):
+        assert _key() == _key(tool_list=[dict(TOOLS[0])])
+
+    def test_every_input_changes_key(self):
+        base = _key()
+        for change in [
+            {"model": "gpt-4o-mini"},
+            {"base_url": "http://localhost:11434/v1"},
+            {"api_key": "sk-2"},
+            {"tool_list": []},
+            {"tool_list": [{**TOOLS[0], "provider": "replicate"}]},
+            {"system_prompt": "be verbose"},
+            {"default_agent": "image_video_creator"},
+            {"tools_version": 1},
+        ]:
+            assert _key(**change) != base, change
+
+    def test_api_key_is_not_stored_in_plain_text(self):
+        assert "sk-1" not in repr(_key())
+
+
+class TestSwarmCache:
+    def test_builds_once_per_key(self):
+        cache = SwarmCache(max_entries=4)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return object()
+
+        first = cache.get_or_build(("a",), build)
+        assert cache.get_or_build(("a",), build) is first
+        assert len(builds) == 1
+
+    def test_least_recently_used_is_evicted(self):
+        cache = SwarmCache(max_entries=2)
+        a = cache.get_or_build("a", object)
+        cache.get_or_build("b", object)
+        cache.get_or_build("a", object)  # a is now the most recent
+        cache.get_or_build("c", object)
+        assert len(cache) == 2
+        assert cache.get_or_build("a", object) is a
+        assert cache.get_or_build("b", object) is not None
+        cache.clear()
+        assert len(cache) == 0
+
+
+class TestLLMClientPool:
+    def test_reuses_model_and_http_clients(self):
+        pool = LLMClientPool()
+        m1 = pool.get_model("openai", "gpt-4o", None, "sk-1")
+        assert pool.get_model("openai", "gpt-4o", "", "sk-1") is m1
+        m2 = pool.get_model("openai", "gpt-4o-mini", None, "sk-1")
+        assert m2 is not m1
+        assert m2.http_async_client is m1.http_async_client
+
+    def test_different_key_gets_its_own_clients(self):
+        pool = LLMClientPool()
+        m1 = pool.get_model("openai", "gpt-4o", None, "sk-1")
+        m2 = pool.get_model("openai", "gpt-4o", None, "sk-2")
+        assert m2 is not m1
+        assert m2.http_async_client is not m1.http_async_client
+
+    def test_evicting_clients_drops_dependent_models_and_graphs(self):
+        graphs = SwarmCache()
+        pool = LLMClientPool(max_entries=1, on_evict=graphs.discard_endpoint)
+        m1 = pool.get_model("openai", "gpt-4o", "https://api.openai.com/v1", "sk-1")
+        old = graphs.get_or_build(_key(), object)
+        other = graphs.get_or_build(_key(api_key="sk-2"), object)
+
+        pool.get_model("openai", "gpt-4o", "https://api.openai.com/v1", "sk-2")
+        assert len(pool) == 1
+        # The graph on the evicted clients is rebuilt; the other one is kept
+        assert graphs.get_or_build(_key(), object) is not old
+        assert graphs.get_or_build(_key(api_key="sk-2"), object) is other
+        # Without a running loop the evicted clients are closed right away
+        assert m1.http_client.is_closed
+        assert m1.http_async_client.is_closed
+        assert pool.get_model("openai", "gpt-4o", "https://api.openai.com/v1", "sk-1") is not m1
@@ -0,0 +1,120 @@
+"""Tests for local JWT verification and the verified-token cache."""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from jose import jwk, jwt
+
+from middleware import auth
+
+
+SECRET = "test-secret"
+
+
+def _hs_token(sub="user-1", exp_in=3600, secret=SECRET):
+    now = int(time.time())
+    return jwt.encode(
+        {"sub": sub, "aud": "authenticated", "iat": now, "exp": now + exp_in},
+        secret,
+        algorithm="HS256",
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    with patch.object(auth, "token_cache", auth.VerifiedTokenCache()), patch.object(
+        auth, "jwks_cache", auth.JwksCache("https://proj/jwks")
+    ):
+        yield
+
+
+class TestLocalVerification:
+    def test_hs_token_is_verified_without_network(self):
+        remote = AsyncMock()
+        with patch.object(auth, "SUPABASE_JWT_SECRET", SECRET), patch.object(
+            auth, "_verify_token_with_supabase", remote
+        ):
+            claims = asyncio.run(auth.verify_token(_hs_token()))
+        assert claims["sub"] == "user-1"
+        remote.assert_not_awaited()
+
+    def test_verified_token_is_cached(self):
+        token = _hs_token()
+        with patch.object(auth, "SUPABASE_JWT_SECRET", SECRET):
+            asyncio.run(auth.verify_token(token))
+            with patch.object(auth, "_decode_token", side_effect=AssertionError):
+                assert asyncio.run(auth.verify_token(token))["sub"] == "user-1"
+
+    def test_expired_and_forged_tokens_are_rejected(self):
+        with patch.object(auth, "SUPABASE_JWT_SECRET", SECRET):
+            for token in (_hs_token(exp_in=-10), _hs_token(secret="other")):
+                with pytest.raises(HTTPException) as exc:
+                    asyncio.run(auth.verify_token(token))
+                assert exc.value.status_code == 401
+
+    def test_cache_entry_never_outlives_exp(self):
+        cache = auth.VerifiedTokenCache(ttl=600)
+        cache.put("t", {"sub": "u", "exp": time.time() - 1})
+        assert cache.get("t") is None
+
+    def test_remote_introspection_only_without_local_secret(self):
+        remote = AsyncMock(return_value={"id": "user-1"})
+        with patch.object(auth, "SUPABASE_JWT_SECRET", ""), patch.object(
+            auth, "_verify_token_with_supabase", remote
+        ):
+            claims = asyncio.run(auth.verify_token(_hs_token()))
+        assert claims["sub"] == "user-1"
+        remote.assert_awaited_once()
+
+    def test_optional_remote_check_rejects_revoked_sessions(self):
+        with patch.object(auth, "SUPABASE_JWT_SECRET", SECRET), patch.object(
+            auth, "AUTH_REMOTE_CHECK", True
+        ), patch.object(auth, "_verify_token_with_supabase", AsyncMock(return_value=None)):
+            with pytest.raises(HTTPException):
+                asyncio.run(auth.verify_token(_hs_token()))
+
+
+class TestJwks:
+    def _rsa(self, kid):
+        private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pem = private.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        public = jwk.construct(pem, "RS256").public_key().to_dict()
+        public["kid"] = kid
+        return pem, public
+
+    def _token(self, pem, kid):
+        now = int(time.time())
+        return jwt.encode(
+            {"sub": "user-2", "aud": "authenticated", "exp": now + 3600},
+            pem,
+            algorithm="RS256",
+            headers={"kid": kid},
+        )
+
+    def test_asymmetric_token_uses_cached_jwks_and_follows_rotation(self):
+        pem1, pub1 = self._rsa("k1")
+        pem2, pub2 = self._rsa("k2")
+        responses = [{"keys": [pub1]}, {"keys": [pub1, pub2]}]
+        client = MagicMock()
+        client.get = AsyncMock(
+            side_effect=lambda url: MagicMock(
+                json=MagicMock(return_value=responses.pop(0)), raise_for_status=MagicMock()
+            )
+        )
+        with patch.object(auth, "SUPABASE_URL", "https://proj"), patch.object(
+            auth, "_get_http_client", return_value=client
+        ), patch.object(auth, "JWKS_MIN_REFRESH_INTERVAL", 0):
+            first = asyncio.run(auth.verify_token(self._token(pem1, "k1")))
+            again = asyncio.run(auth._verify_locally(self._token(pem1, "k1")))
+            rotated = asyncio.run(auth.verify_token(self._token(pem2, "k2")))
+        assert first["sub"] == again["sub"] == rotated["sub"] == "user-2"
+        assert client.get.await_count == 2
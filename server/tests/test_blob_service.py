@@ -0,0 +1,69 @@
+"""Tests for externalizing large data URLs out of stored JSON documents."""
+
+import asyncio
+import base64
+from unittest.mock import AsyncMock, patch
+
+from services import blob_service
+
+
+def _data_url(size, fill=b"x"):
+    return "data:image/png;base64," + base64.b64encode(fill * size).decode()
+
+
+def _externalize(value, upload, owner="u1", clear=True):
+    if clear:
+        blob_service._known_blobs.clear()
+    with patch.object(blob_service.storage_service, "upload_content_addressed", upload):
+        return asyncio.run(blob_service.externalize_blobs(value, owner))
+
+
+class TestExternalizeBlobs:
+    def test_large_data_url_becomes_reference(self):
+        upload = AsyncMock(return_value=("abc.png", "https://x/abc.png"))
+        doc = {"files": {"f1": {"dataURL": _data_url(64 * 1024), "id": "f1"}}}
+        result = _externalize(doc, upload)
+        assert result["files"]["f1"]["dataURL"] == "storage://uploads/_blobs/u1/abc.png"
+        assert result["files"]["f1"]["id"] == "f1"
+        assert upload.call_args.kwargs["content_type"] == "image/png"
+        # Kept out of the user's own uploads folder (listed by /api/uploads)
+        assert upload.call_args.kwargs["user_id"] == "_blobs/u1"
+
+    def test_small_values_stay_inline(self):
+        upload = AsyncMock()
+        small = _data_url(16)
+        assert _externalize({"content": [{"image_url": {"url": small}}]}, upload) == {
+            "content": [{"image_url": {"url": small}}]
+        }
+        upload.assert_not_awaited()
+
+    def test_repeated_blob_is_uploaded_once(self):
+        upload = AsyncMock(return_value=("abc.png", "https://x/abc.png"))
+        big = _data_url(64 * 1024)
+        result = _externalize([big, big], upload)
+        assert result[0] == result[1]
+        upload.assert_awaited_once()
+
+    def test_known_blob_is_not_shared_across_owners(self):
+        upload = AsyncMock(return_value=("abc.png", "https://x/abc.png"))
+        big = _data_url(64 * 1024)
+        first = _externalize(big, upload, owner="u1")
+        second = _externalize(big, upload, owner="u2", clear=False)
+        assert first == "storage://uploads/_blobs/u1/abc.png"
+        assert second == "storage://uploads/_blobs/u2/abc.png"
+        assert upload.await_count == 2
+
+    def test_upload_failure_keeps_value_inline(self):
+        big = _data_url(64 * 1024)
+        assert _externalize(big, AsyncMock(side_effect=RuntimeError("down"))) == big
+
+
+def test_rehydrate_builds_public_urls():
+    with patch.dict("os.environ", {"SUPABASE_URL": "https://proj.supabase.co"}):
+        doc = blob_service.rehydrate_blobs(
+            {"url": "storage://uploads/u1/abc.png", "other": "https://keep"}
+        )
+    assert doc == {
+        "url": "https://proj.supabase.co/storage/v1/object/public/uploads/u1/abc.png",
+        "other": "https://keep",
+    }
@@ -0,0 +1,139 @@
+"""Tests for the read-through listing cache."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from services import cache_service as cache_module
+from services.cache_service import (
+    MemoryCacheBackend,
+    NullCacheBackend,
+    ReadThroughCache,
+    create_cache_backend,
+)
+
+
+def _loader(values):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return values[len(calls) - 1]
+
+    return load, calls
+
+
+class TestMemoryCacheBackend:
+    def test_evicts_least_recently_used(self):
+        backend = MemoryCacheBackend(max_entries=2)
+
+        async def scenario():
+            await backend.set("a", 1, 60)
+            await backend.set("b", 2, 60)
+            await backend.get("a")
+            await backend.set("c", 3, 60)
+            return await backend.get("a"), await backend.get("b")
+
+        a, b = asyncio.run(scenario())
+        assert a == (True, 1)
+        assert b == (False, None)
+        assert len(backend) == 2
+
+    def test_entries_expire(self):
+        backend = MemoryCacheBackend()
+        with patch.object(cache_module.time, "monotonic", return_value=100.0):
+            asyncio.run(backend.set("a", 1, 5))
+        with patch.object(cache_module.time, "monotonic", return_value=106.0):
+            assert asyncio.run(backend.get("a")) == (False, None)
+
+    def test_returned_values_are_copies(self):
+        backend = MemoryCacheBackend()
+
+        async def scenario():
+            await backend.set("a", [{"id": 1}], 60)
+            _, value = await backend.get("a")
+            value[0]["id"] = 2
+            return await backend.get("a")
+
+        assert asyncio.run(scenario()) == (True, [{"id": 1}])
+
+
+class TestReadThroughCache:
+    def test_loads_once_until_invalidated(self):
+        cache = ReadThroughCache(MemoryCacheBackend())
+        load, calls = _loader(["v1", "v2"])
+
+        async def scenario():
+            first = await cache.get_or_load("canvases", "u1", None, load)
+            second = await cache.get_or_load("canvases", "u1", None, load)
+            await cache.invalidate("canvases", "u1")
+            third = await cache.get_or_load("canvases", "u1", None, load)
+            return first, second, third
+
+        assert asyncio.run(scenario()) == ("v1", "v1", "v2")
+        assert len(calls) == 2
+
+    def test_invalidation_is_scoped(self):
+        cache = ReadThroughCache(MemoryCacheBackend())
+        load, calls = _loader(["u1", "u2"])
+
+        async def scenario():
+            await cache.get_or_load("canvases", "u1", None, load)
+            await cache.get_or_load("canvases", "u2", None, load)
+            await cache.invalidate("canvases", "u2")
+            return await cache.get_or_load("canvases", "u1", None, load)
+
+        assert asyncio.run(scenario()) == "u1"
+        assert len(calls) == 2
+
+    def test_null_backend_always_loads(self):
+        cache = ReadThroughCache(NullCacheBackend())
+        load, calls = _loader(["a", "b"])
+
+        async def scenario():
+            await cache.get_or_load("x", "u1", None, load)
+            return await cache.get_or_load("x", "u1", None, load)
+
+        assert asyncio.run(scenario()) == "b"
+        assert len(calls) == 2
+
+
+class TestClusterInvalidation:
+    def test_memory_invalidation_is_published_to_other_workers(self):
+        cache = ReadThroughCache(MemoryCacheBackend())
+        publish = AsyncMock()
+        with patch.object(cache_module.control_bus, "publish", publish):
+            asyncio.run(cache.invalidate("canvases", "u1"))
+        publish.assert_awaited_once_with(
+            cache_module.INVALIDATE_MESSAGE, {"namespace": "canvases", "scope": "u1"}
+        )
+
+    def test_received_invalidation_drops_local_entries(self):
+        cache = ReadThroughCache(MemoryCacheBackend())
+        load, calls = _loader(["v1", "v2"])
+        publish = AsyncMock()
+
+        async def scenario():
+            await cache.get_or_load("canvases", "u1", None, load)
+            await cache_module._handle_invalidate({"namespace": "canvases", "scope": "u1"})
+            return await cache.get_or_load("canvases", "u1", None, load)
+
+        with patch.object(cache_module, "cache_service", cache), patch.object(
+            cache_module.control_bus, "publish", publish
+        ):
+            assert asyncio.run(scenario()) == "v2"
+        # Not echoed back onto the bus
+        publish.assert_not_awaited()
+
+    def test_shared_backend_is_not_published(self):
+        class SharedBackend(MemoryCacheBackend):
+            shared = True
+
+        publish = AsyncMock()
+        with patch.object(cache_module.control_bus, "publish", publish):
+            asyncio.run(ReadThroughCache(SharedBackend()).invalidate("canvases", "u1"))
+        publish.assert_not_awaited()
+
+
+def test_backend_defaults_to_memory():
+    with patch.dict("os.environ", {"CACHE_BACKEND": ""}):
+        assert isinstance(create_cache_backend(), MemoryCacheBackend)
@@ -0,0 +1,80 @@
+"""Tests for canvas element placement and atomic appends."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from services.db_service import CanvasVersionConflict
+from utils import canvas as canvas_utils
+
+
+def _build():
+    async def build(data):
+        x, y = await canvas_utils.find_next_best_element_position(data)
+        return {"id": "el", "type": "image", "x": x, "y": y, "width": 10, "height": 10}
+
+    return build
+
+
+class TestAppendCanvasElement:
+    def test_appends_with_current_version(self):
+        db = AsyncMock()
+        db.get_canvas_document.return_value = {"data": {"elements": []}, "version": 7}
+        db.apply_canvas_delta.return_value = 8
+        with patch.object(canvas_utils, "db_service", db):
+            element = asyncio.run(
+                canvas_utils.append_canvas_element("c1", _build(), "f1", {"id": "f1"})
+            )
+        assert element["x"] == 0 and element["y"] == 0
+        kwargs = db.apply_canvas_delta.call_args.kwargs
+        assert kwargs["base_version"] == 7
+        assert kwargs["upserts"] == [element]
+        assert kwargs["files"] == {"f1": {"id": "f1"}}
+
+    def test_write_is_scoped_to_the_tool_users_canvas(self):
+        db = AsyncMock()
+        db.get_canvas_document.return_value = {"data": {}, "version": 1}
+        db.apply_canvas_delta.return_value = 2
+        with patch.object(canvas_utils, "db_service", db):
+            asyncio.run(
+                canvas_utils.append_canvas_element("c1", _build(), "f1", {}, user_id="u1")
+            )
+        db.get_canvas_document.assert_awaited_once_with("c1", "u1")
+        assert db.apply_canvas_delta.call_args.kwargs["user_id"] == "u1"
+
+    def test_replaces_element_after_version_conflict(self):
+        existing = {"id": "other", "type": "image", "x": 0, "y": 0, "width": 10, "height": 10}
+        db = AsyncMock()
+        db.get_canvas_document.side_effect = [
+            {"data": {"elements": []}, "version": 1},
+            {"data": {"elements": [existing]}, "version": 2},
+        ]
+        db.apply_canvas_delta.side_effect = [CanvasVersionConflict("c1", 1), 3]
+        with patch.object(canvas_utils, "db_service", db):
+            element = asyncio.run(
+                canvas_utils.append_canvas_element("c1", _build(), "f1", {})
+            )
+        assert db.apply_canvas_delta.await_count == 2
+        # Re-placed next to the element written by the competing writer
+        assert element["x"] == 30
+
+    def test_last_attempt_is_unconditional(self):
+        db = AsyncMock()
+        db.get_canvas_document.return_value = {"data": {}, "version": 1}
+        db.apply_canvas_delta.side_effect = [CanvasVersionConflict("c1", 1), 2]
+        with patch.object(canvas_utils, "db_service", db):
+            asyncio.run(
+                canvas_utils.append_canvas_element(
+                    "c1", _build(), "f1", {}, max_attempts=2
+                )
+            )
+        assert db.apply_canvas_delta.call_args.kwargs["base_version"] is None
+
+    def test_missing_canvas_returns_none(self):
+        db = AsyncMock()
+        db.get_canvas_document.return_value = None
+        with patch.object(canvas_utils, "db_service", db):
+            result = asyncio.run(
+                canvas_utils.append_canvas_element("c1", _build(), "f1", {})
+            )
+        assert result is None
+        db.apply_canvas_delta.assert_not_awaited()
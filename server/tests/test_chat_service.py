@@ -0,0 +1,27 @@
+"""Tests for chat request handling."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services import chat_service
+from services.chat_service import ChatSessionNotFound, handle_chat
+
+
+class TestHandleChat:
+    def test_foreign_session_is_rejected(self):
+        db = AsyncMock()
+        db.get_chat_session.return_value = None
+        agent = AsyncMock()
+        with patch.object(chat_service, "db_service", db), patch.object(
+            chat_service, "langgraph_multi_agent", agent
+        ):
+            with pytest.raises(ChatSessionNotFound):
+                asyncio.run(handle_chat(
+                    {"message": {"role": "user", "content": "hi"}, "session_id": "s-other"},
+                    user_id="u2",
+                ))
+        db.get_chat_session.assert_awaited_once_with("s-other", user_id="u2")
+        db.create_message.assert_not_awaited()
+        agent.assert_not_called()
@@ -0,0 +1,193 @@
+"""Tests for checkpointer-backed conversation state."""
+
+import asyncio
+import base64
+from collections import OrderedDict
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from services import blob_service
+from services.langgraph_service import checkpointer as checkpointer_module
+from services.langgraph_service.agent_service import _prepare_input
+from services.langgraph_service.checkpointer import (
+    BoundedMemorySaver,
+    has_dangling_tool_calls,
+    load_checkpoint_messages,
+    thread_config,
+    thread_id,
+)
+
+
+def _echo_graph(saver):
+    def reply(state):
+        return {"messages": [AIMessage(content=f"seen {len(state['messages'])}")]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("reply", reply)
+    graph.add_edge(START, "reply")
+    graph.add_edge("reply", END)
+    return graph.compile(checkpointer=saver)
+
+
+def _user(text):
+    return {"role": "user", "content": text}
+
+
+class TestCheckpointState:
+    def test_turns_only_send_the_new_message(self):
+        async def scenario():
+            saver = BoundedMemorySaver()
+            graph = _echo_graph(saver)
+            await graph.ainvoke({"messages": [_user("one")]}, thread_config("s1"))
+            state = await graph.ainvoke({"messages": [_user("two")]}, thread_config("s1"))
+            return state, await load_checkpoint_messages(saver, "s1")
+
+        state, saved = asyncio.run(scenario())
+        assert [m.content for m in state["messages"]] == ["one", "seen 1", "two", "seen 3"]
+        assert len(saved) == 4
+
+    def test_no_checkpoint_returns_none(self):
+        assert asyncio.run(load_checkpoint_messages(BoundedMemorySaver(), "missing")) is None
+
+    def test_memory_saver_forgets_oldest_sessions(self):
+        async def scenario():
+            saver = BoundedMemorySaver(max_threads=2)
+            graph = _echo_graph(saver)
+            for session_id in ["a", "b", "c"]:
+                await graph.ainvoke({"messages": [_user("hi")]}, thread_config(session_id))
+            return [await load_checkpoint_messages(saver, s) is not None for s in "abc"]
+
+        assert asyncio.run(scenario()) == [False, True, True]
+
+    def test_dangling_tool_calls(self):
+        call = AIMessage(content="", tool_calls=[{"id": "t1", "name": "gen", "args": {}}])
+        assert has_dangling_tool_calls([HumanMessage(content="hi"), call])
+        assert not has_dangling_tool_calls([call, ToolMessage(content="ok", tool_call_id="t1")])
+
+
+class TestPrepareInput:
+    def test_without_checkpoint_seeds_client_history(self):
+        history = [_user("one"), {"role": "assistant", "content": "hi"}, _user("two")]
+        graph_input, saved_count, seeded = asyncio.run(
+            _prepare_input(BoundedMemorySaver(), history, "s1", "u1")
+        )
+        assert graph_input == history and seeded == history
+        assert saved_count == 3
+
+    def test_without_checkpoint_loads_stored_history(self):
+        stored = [_user("one"), {"role": "assistant", "content": "hi"}, _user("two")]
+        with patch(
+            "services.langgraph_service.agent_service.db_service.get_chat_history",
+            new=AsyncMock(return_value=stored),
+        ) as get_history:
+            graph_input, saved_count, _ = asyncio.run(
+                _prepare_input(BoundedMemorySaver(), [_user("two")], "s1", "u1")
+            )
+        get_history.assert_awaited_once_with("s1", user_id="u1")
+        assert graph_input == stored and saved_count == 3
+
+    def test_with_checkpoint_sends_only_new_message(self):
+        async def scenario():
+            saver = BoundedMemorySaver()
+            await _echo_graph(saver).ainvoke({"messages": [_user("one")]}, thread_config(thread_id("s1", "u1")))
+            # Older clients still send the full history
+            return await _prepare_input(
+                saver, [_user("one"), {"role": "assistant", "content": "seen 1"}, _user("two")], "s1", "u1"
+            )
+
+        graph_input, saved_count, seeded = asyncio.run(scenario())
+        assert graph_input == [_user("two")]
+        assert saved_count == 3
+        assert seeded == []
+
+    def test_data_urls_are_stored_before_entering_the_graph(self):
+        big = "data:image/png;base64," + base64.b64encode(b"x" * 64 * 1024).decode()
+        message = {"role": "user", "content": [{"type": "image_url", "image_url": {"url": big}}]}
+        upload = AsyncMock(return_value=("abc.png", "https://x/abc.png"))
+
+        async def scenario():
+            saver = BoundedMemorySaver()
+            await _echo_graph(saver).ainvoke({"messages": [_user("one")]}, thread_config(thread_id("s1", "u1")))
+            return await _prepare_input(saver, [message], "s1", "u1")
+
+        with patch.object(blob_service, "_known_blobs", OrderedDict()), patch.object(
+            blob_service.storage_service, "upload_content_addressed", upload
+        ), patch.dict("os.environ", {"SUPABASE_URL": "https://proj.supabase.co"}):
+            graph_input, _, _ = asyncio.run(scenario())
+        url = graph_input[0]["content"][0]["image_url"]["url"]
+        assert url == "https://proj.supabase.co/storage/v1/object/public/uploads/_blobs/u1/abc.png"
+
+    def test_cancelled_tool_call_is_repaired(self):
+        async def scenario():
+            saver = BoundedMemorySaver()
+            graph = _echo_graph(saver)
+            call = AIMessage(content="", tool_calls=[{"id": "t1", "name": "gen", "args": {}}])
+            thread = thread_config(thread_id("s1", "u1"))
+            await graph.aupdate_state(thread, {"messages": [HumanMessage(content="one"), call]})
+            prepared = await _prepare_input(saver, [_user("two")], "s1", "u1")
+            state = await graph.ainvoke({"messages": prepared[0]}, thread)
+            return prepared, state
+
+        (graph_input, saved_count, _), state = asyncio.run(scenario())
+        assert isinstance(graph_input[0], RemoveMessage)
+        assert [m["content"] for m in graph_input[1:]] == ["one", "two"]
+        assert saved_count == 2
+        assert [m.content for m in state["messages"]] == ["one", "two", "seen 2"]
+
+
+    def test_other_users_checkpoint_is_not_loaded(self):
+        async def scenario():
+            saver = BoundedMemorySaver()
+            await _echo_graph(saver).ainvoke({"messages": [_user("secret")]}, thread_config(thread_id("s1", "u1")))
+            with patch(
+                "services.langgraph_service.agent_service.db_service.get_chat_history",
+                new=AsyncMock(return_value=[]),
+            ):
+                return await _prepare_input(saver, [_user("two")], "s1", "u2")
+
+        graph_input, _, _ = asyncio.run(scenario())
+        assert graph_input == [_user("two")]
+
+class TestGetCheckpointer:
+    def test_falls_back_to_memory(self):
+        async def scenario():
+            with patch.object(checkpointer_module, "_checkpointer", None), patch.object(
+                checkpointer_module,
+                "_create_sqlite_saver",
+                new=AsyncMock(side_effect=ImportError("missing")),
+            ), patch.dict("os.environ", {"CHECKPOINT_BACKEND": "sqlite", "CLUSTER_BACKEND": "local"}):
+                first = await checkpointer_module.get_checkpointer()
+                second = await checkpointer_module.get_checkpointer()
+                return first, second
+
+        first, second = asyncio.run(scenario())
+        assert isinstance(first, BoundedMemorySaver)
+        assert first is second
+
+    def test_refuses_memory_with_several_workers(self):
+        async def scenario():
+            with patch.object(checkpointer_module, "_checkpointer", None), patch.dict(
+                "os.environ", {"CHECKPOINT_BACKEND": "memory", "CLUSTER_BACKEND": "redis"}
+            ):
+                await checkpointer_module.get_checkpointer()
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(scenario())
+
+    def test_sqlite_backend(self, tmp_path):
+        async def scenario():
+            env = {"CHECKPOINT_BACKEND": "sqlite", "CHECKPOINT_SQLITE_PATH": str(tmp_path / "cp.db")}
+            with patch.object(checkpointer_module, "_checkpointer", None), patch.dict("os.environ", env):
+                saver = await checkpointer_module.get_checkpointer()
+                await _echo_graph(saver).ainvoke({"messages": [_user("one")]}, thread_config("t1"))
+                saved = await load_checkpoint_messages(saver, "t1")
+                await checkpointer_module.close_checkpointer()
+                return saver, saved
+
+        saver, saved = asyncio.run(scenario())
+        assert not isinstance(saver, BoundedMemorySaver)
+        assert [m.content for m in saved] == ["one", "seen 1"]
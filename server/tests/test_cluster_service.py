@@ -0,0 +1,146 @@
+"""Tests for cross-worker control messages."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from services import cluster_service, stream_service, tool_confirmation_manager as tcm_module
+from services.cluster_service import ControlBus, LocalControlBus
+from services.tool_confirmation_manager import ToolConfirmationManager
+
+
+class _Hub:
+    def __init__(self):
+        self.buses = []
+
+
+class _HubBus(ControlBus):
+    """Buses attached to the same hub behave like separate workers."""
+
+    def __init__(self, hub, worker_id):
+        super().__init__()
+        self.worker_id = worker_id
+        self._queue = asyncio.Queue()
+        hub.buses.append(self)
+        self._hub = hub
+
+    async def _send(self, message):
+        for bus in self._hub.buses:
+            bus._queue.put_nowait(message)
+
+    async def _listen(self):
+        while True:
+            yield await self._queue.get()
+
+
+def _workers(*ids):
+    hub = _Hub()
+    return [_HubBus(hub, worker_id) for worker_id in ids]
+
+
+class TestControlBus:
+    def test_request_is_answered_by_owning_worker(self):
+        async def scenario():
+            a, b, c = _workers("a", "b", "c")
+            b.on("ping", AsyncMock(return_value=None))
+            c.on("ping", AsyncMock(return_value={"pong": True}))
+            for bus in (a, b, c):
+                await bus.start()
+            reply = await a.request("ping", {"x": 1}, timeout=1)
+            for bus in (a, b, c):
+                await bus.stop()
+            return reply
+
+        assert asyncio.run(scenario()) == {"pong": True, "worker_id": "c"}
+
+    def test_sender_does_not_handle_its_own_message(self):
+        async def scenario():
+            a, b = _workers("a", "b")
+            handler_a, handler_b = AsyncMock(return_value=None), AsyncMock(return_value=None)
+            a.on("join", handler_a)
+            b.on("join", handler_b)
+            await a.start()
+            await b.start()
+            await a.publish("join", {"user_id": "u1"})
+            await asyncio.sleep(0.01)
+            await a.stop()
+            await b.stop()
+            return handler_a, handler_b
+
+        handler_a, handler_b = asyncio.run(scenario())
+        handler_a.assert_not_awaited()
+        assert handler_b.await_args.args[0]["user_id"] == "u1"
+
+    def test_request_times_out_without_owner(self):
+        async def scenario():
+            a, b = _workers("a", "b")
+            b.on("ping", AsyncMock(return_value=None))
+            await a.start()
+            await b.start()
+            reply = await a.request("ping", {}, timeout=0.05)
+            await a.stop()
+            await b.stop()
+            return reply
+
+        assert asyncio.run(scenario()) is None
+
+    def test_local_bus_never_waits(self):
+        async def scenario():
+            bus = LocalControlBus()
+            await bus.publish("join", {})
+            return await bus.request("ping", {}, timeout=10)
+
+        assert asyncio.run(scenario()) is None
+
+    def test_local_backend_uses_in_process_manager(self):
+        assert cluster_service.create_client_manager("local") is None
+
+
+class TestCrossWorkerRouting:
+    def test_cancel_local_stream(self):
+        async def scenario():
+            task = asyncio.create_task(asyncio.sleep(10))
+            request = AsyncMock()
+            with patch.dict(stream_service.stream_tasks, {"s1": task}, clear=True), patch.object(
+                stream_service.control_bus, "request", request
+            ):
+                cancelled = await stream_service.cancel_stream("s1")
+            await asyncio.gather(task, return_exceptions=True)
+            return cancelled, task, request
+
+        cancelled, task, request = asyncio.run(scenario())
+        assert cancelled and task.cancelled()
+        request.assert_not_awaited()
+
+    def test_cancel_forwards_to_other_worker(self):
+        request = AsyncMock(return_value={"cancelled": True, "worker_id": "b"})
+        with patch.dict(stream_service.stream_tasks, clear=True), patch.object(
+            stream_service.control_bus, "request", request
+        ):
+            assert asyncio.run(stream_service.cancel_stream("s1")) is True
+        request.assert_awaited_once_with("cancel_stream", {"session_id": "s1"})
+
+    def test_cancel_unknown_stream(self):
+        with patch.dict(stream_service.stream_tasks, clear=True), patch.object(
+            stream_service.control_bus, "request", AsyncMock(return_value=None)
+        ):
+            assert asyncio.run(stream_service.cancel_stream("s1")) is False
+
+    def test_confirmation_resolved_locally(self):
+        manager = ToolConfirmationManager()
+
+        async def scenario():
+            waiter = asyncio.create_task(manager.request_confirmation("t1", "s1", "tool", {}))
+            await asyncio.sleep(0)
+            resolved = await manager.resolve("t1", True)
+            return resolved, await waiter
+
+        assert asyncio.run(scenario()) == (True, True)
+
+    def test_confirmation_forwarded_to_other_worker(self):
+        manager = ToolConfirmationManager()
+        request = AsyncMock(return_value={"resolved": True, "worker_id": "b"})
+        with patch.object(tcm_module.control_bus, "request", request):
+            assert asyncio.run(manager.resolve("t1", False)) is True
+        request.assert_awaited_once_with(
+            "resolve_tool_confirmation", {"tool_call_id": "t1", "confirmed": False}
+        )
@@ -0,0 +1,158 @@
+"""Tests for the token-budgeted context window."""
+
+import asyncio
+from unittest.mock import patch
+
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from services.langgraph_service import context_window as cw
+from services.langgraph_service.context_window import ContextWindowManager, context_window, count_text_tokens
+
+MODEL = "test-model"
+IMAGE = "![image_id: im_1.png](http://localhost:8000/api/file/im_1.png)"
+
+
+def _turn(n, payload_words=400):
+    call_id = f"call_{n}"
+    return [
+        HumanMessage(content=f"make picture {n}", id=f"h{n}"),
+        AIMessage(content="", id=f"a{n}", tool_calls=[{"id": call_id, "name": "generate_image", "args": {"prompt": f"p{n}"}}]),
+        ToolMessage(
+            content=f"image generated {IMAGE.replace('im_1', f'im_{n}')} " + "detail " * payload_words,
+            tool_call_id=call_id,
+            name="generate_image",
+            id=f"t{n}",
+        ),
+        AIMessage(content=f"Here is picture {n}", id=f"r{n}"),
+    ]
+
+
+def _manager(budget, keep_turns=2):
+    return ContextWindowManager(keep_turns=keep_turns, budget=lambda model: budget)
+
+
+def _fit(manager, messages, session_id="s1"):
+    # Estimate tokens instead of loading tiktoken encodings
+    with patch.dict(cw._encoders, {MODEL: None}):
+        return manager.fit(messages, session_id, MODEL)
+
+
+class TestBudget:
+    def test_context_window_by_prefix(self):
+        assert context_window("gpt-4o-mini") == 128_000
+        assert context_window("gpt-4") == 8_192
+        assert context_window("openai/gpt-4.1-mini") == 1_000_000
+        assert context_window("unknown") == cw.DEFAULT_CONTEXT_WINDOW
+
+    def test_tool_definitions_are_counted(self):
+        @tool
+        def generate_image(prompt: str, aspect_ratio: str = "1:1") -> str:
+            """Generate an image from a text prompt."""
+            return ""
+
+        with patch.dict(cw._encoders, {MODEL: None}):
+            assert cw.count_tool_tokens([], MODEL) == 0
+            assert cw.count_tool_tokens([generate_image], MODEL) > 20
+
+    def test_estimate_without_encoder(self):
+        with patch.dict(cw._encoders, {MODEL: None}):
+            assert count_text_tokens("a" * 400, MODEL) == 101
+            assert count_text_tokens("你好", MODEL) == 3
+
+
+class TestFit:
+    def test_small_conversation_is_unchanged(self):
+        messages = _turn(1, payload_words=10)
+        assert _fit(_manager(10_000), messages) == messages
+
+    def test_old_tool_payloads_become_references(self):
+        messages = _turn(1) + _turn(2) + _turn(3)
+        fitted = _fit(_manager(10_000), messages)
+        assert len(fitted) == len(messages)
+        old, recent = fitted[2], fitted[6]
+        assert old.content == "[generate_image result elided; files: http://localhost:8000/api/file/im_1.png]"
+        assert old.tool_call_id == "call_1"
+        assert recent.content == messages[6].content
+
+    def test_data_uris_are_always_elided(self):
+        messages = [HumanMessage(content="see ![x](data:image/png;base64," + "A" * 5000 + ")", id="h1")]
+        fitted = _fit(_manager(10_000), messages)
+        assert "AAAA" not in fitted[0].content
+        assert "inline data elided" in fitted[0].content
+
+    def test_oldest_turns_are_dropped_and_summarized(self):
+        messages = [m for n in range(1, 7) for m in _turn(n, payload_words=10)]
+        fitted = _fit(_manager(400), messages)
+        # The summary leads the first kept user message, not a second system message
+        assert not any(isinstance(m, SystemMessage) for m in fitted)
+        assert isinstance(fitted[0], HumanMessage)
+        summary, _, asked = fitted[0].content.rpartition("\n\n")
+        assert "make picture 1" in summary
+        assert "im_1.png" in summary
+        assert asked == messages[len(messages) - len(fitted)].content
+        assert fitted[-1] is messages[-1]
+        # Tool calls and their results stay paired
+        kept_calls = {c["id"] for m in fitted if isinstance(m, AIMessage) for c in m.tool_calls}
+        kept_results = {m.tool_call_id for m in fitted if isinstance(m, ToolMessage)}
+        assert kept_calls == kept_results
+
+    def test_summary_is_prepended_to_multipart_content(self):
+        messages = [m for n in range(1, 7) for m in _turn(n, payload_words=10)]
+        messages[-4] = HumanMessage(content=[{"type": "text", "text": "make picture 6"}], id="h6")
+        fitted = _fit(_manager(150), messages)
+        assert fitted[0].content[0]["text"].startswith("Summary of the")
+        assert fitted[0].content[1:] == messages[-4].content
+
+    def test_tool_definitions_count_against_the_budget(self):
+        messages = [m for n in range(1, 4) for m in _turn(n, payload_words=10)]
+        manager = _manager(1_000)
+        with patch.dict(cw._encoders, {MODEL: None}):
+            assert manager.fit(messages, "s1", MODEL) == messages
+            fitted = manager.fit(messages, "s1", MODEL, tool_tokens=800)
+        assert len(fitted) < len(messages)
+
+    def test_pending_tool_result_is_kept_when_over_budget(self):
+        messages = _turn(1)[:3]
+        fitted = _fit(_manager(300), messages)
+        assert fitted[-1].content == messages[-1].content
+
+    def test_results_are_cached_per_session(self):
+        manager = _manager(400)
+        messages = [m for n in range(1, 7) for m in _turn(n, payload_words=10)]
+        with patch.object(cw, "count_message_tokens", wraps=cw.count_message_tokens) as count:
+            _fit(manager, messages)
+            first = count.call_count
+            _fit(manager, messages + _turn(7, payload_words=10))
+            # Only the new turn is counted again
+            assert count.call_count - first <= 4 * 2
+        assert manager._session("s1").summary_lines
+
+
+class TestPreModelHook:
+    def test_agent_sees_trimmed_messages_and_state_is_kept(self):
+        seen = []
+
+        class Model(FakeMessagesListChatModel):
+            def _generate(self, messages, *args, **kwargs):
+                seen.append(messages)
+                return super()._generate(messages, *args, **kwargs)
+
+        manager = _manager(10_000)
+        agent = create_react_agent(
+            Model(responses=[AIMessage(content="ok")]),
+            tools=[],
+            prompt="SYSTEM",
+            pre_model_hook=manager.pre_model_hook(MODEL, "SYSTEM"),
+        )
+        messages = _turn(1) + _turn(2) + _turn(3) + [HumanMessage(content="again", id="h4")]
+        with patch.dict(cw._encoders, {MODEL: None}):
+            state = asyncio.run(agent.ainvoke({"messages": messages}, {"configurable": {"session_id": "s1"}}))
+
+        sent = seen[0]
+        assert sent[0].content == "SYSTEM"
+        assert sum(isinstance(m, SystemMessage) for m in sent) == 1
+        assert "result elided" in sent[3].content
+        assert state["messages"][2].content == messages[2].content
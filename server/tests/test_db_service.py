@@ -0,0 +1,229 @@
+"""Tests for DatabaseService query construction (Supabase client mocked)."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import db_service as db_module
+from services.cache_service import MemoryCacheBackend, ReadThroughCache
+from services.db_service import DatabaseService
+
+
+class FakeQuery:
+    """Chainable stand-in for a PostgREST query builder that records calls."""
+
+    def __init__(self, data=None):
+        self.calls = []
+        self.data = data
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return method
+
+    async def execute(self):
+        return MagicMock(data=self.data)
+
+    def called(self, name):
+        return [c for c in self.calls if c[0] == name]
+
+
+def _service():
+    # Fresh cache per test so listings never leak between tests
+    return DatabaseService(cache=ReadThroughCache(MemoryCacheBackend()))
+
+
+def _run(coro, query):
+    sb = MagicMock()
+    sb.table.return_value = query
+    sb.rpc.return_value = query
+    with patch.object(db_module, "get_supabase", AsyncMock(return_value=sb)):
+        return asyncio.run(coro), sb
+
+
+class TestChatHistory:
+    def test_ownership_is_checked_in_the_same_query(self):
+        query = FakeQuery([{"id": 1, "message": {"role": "user", "content": "hi"}}])
+        messages, sb = _run(_service().get_chat_history("s1", "u1"), query)
+        assert messages == [{"role": "user", "content": "hi"}]
+        assert sb.table.call_count == 1
+        assert "chat_sessions!inner(user_id)" in query.called("select")[0][1][0]
+        assert ("eq", ("chat_sessions.user_id", "u1"), {}) in query.calls
+
+    def test_latest_page_is_returned_oldest_first(self):
+        rows = [{"id": i, "message": {"n": i}} for i in (5, 4, 3)]
+        query = FakeQuery(rows)
+        page, _ = _run(
+            _service().get_chat_history_page("s1", "u1", limit=2), query
+        )
+        assert [m["id"] for m in page["messages"]] == [4, 5]
+        assert page["has_more"] is True
+        assert page["first_id"] == 4 and page["last_id"] == 5
+        assert ("order", ("id",), {"desc": True}) in query.calls
+
+    def test_after_cursor_fetches_only_new_messages(self):
+        query = FakeQuery([{"id": 8, "message": {"n": 8}}])
+        page, _ = _run(
+            _service().get_chat_history_page("s1", "u1", after_id=7), query
+        )
+        assert ("gt", ("id", 7), {}) in query.calls
+        assert page["has_more"] is False
+        assert page["last_id"] == 8
+
+
+ROW_ID = "0b6f3c1e-8d2a-4f5b-9c7e-1a2b3c4d5e6f"
+
+
+class TestGeneratedContentListing:
+    def test_cursor_round_trip(self):
+        item = {"created_at": "2025-01-02T03:04:05.123+00:00", "id": ROW_ID}
+        cursor = db_module.encode_content_cursor(item)
+        assert db_module.decode_content_cursor(cursor) == (item["created_at"], ROW_ID)
+
+    def test_invalid_cursor_raises_value_error(self):
+        with pytest.raises(ValueError):
+            db_module.decode_content_cursor("not-a-cursor")
+
+    @pytest.mark.parametrize(
+        "item",
+        [
+            {"created_at": '2025-01-01",user_id.neq.x', "id": ROW_ID},
+            {"created_at": "2025-01-01", "id": f"{ROW_ID}),or(id.gt.0"},
+            {"created_at": 1, "id": ROW_ID},
+        ],
+    )
+    def test_cursor_rejects_values_that_are_not_timestamp_and_uuid(self, item):
+        with pytest.raises(ValueError):
+            db_module.decode_content_cursor(db_module.encode_content_cursor(item))
+
+    def test_cursor_uses_keyset_filter_instead_of_offset(self):
+        cursor = db_module.encode_content_cursor({"created_at": "2025-01-01", "id": ROW_ID})
+        query = FakeQuery([])
+        _run(_service().list_generated_content("u1", cursor=cursor, limit=10), query)
+        assert not query.called("range")
+        assert ("limit", (10,), {}) in query.calls
+        (or_filter,) = query.called("or_")[0][1]
+        assert 'created_at.lt."2025-01-01"' in or_filter
+        assert f"id.lt.{ROW_ID}" in or_filter
+
+    def test_feature_filter_and_cursor_are_combined(self):
+        cursor = db_module.encode_content_cursor({"created_at": "2025-01-01", "id": ROW_ID})
+        query = FakeQuery([])
+        _run(
+            _service().list_generated_content(
+                "u1", feature_type="face_swap", cursor=cursor
+            ),
+            query,
+        )
+        (or_filter,) = query.called("or_")[0][1]
+        assert or_filter.startswith("and(or(feature_type.eq.face_swap,")
+        assert len(query.called("or_")) == 1
+
+
+class TestGeneratedContentUpsert:
+    def test_single_upsert_is_one_rpc(self):
+        query = FakeQuery([{"id": "r1"}])
+        row, sb = _run(
+            _service().upsert_generated_content(
+                {"user_id": "u1", "storage_path": "u1/a.png", "metadata": {"x": 1}}
+            ),
+            query,
+        )
+        assert row == {"id": "r1"}
+        sb.rpc.assert_called_once()
+        assert sb.rpc.call_args.args[0] == "upsert_generated_content"
+        sb.table.assert_not_called()
+
+    def test_bulk_merges_duplicate_keys_before_sending(self):
+        query = FakeQuery([])
+        _, sb = _run(
+            _service().upsert_generated_content_bulk(
+                [
+                    {"user_id": "u1", "storage_path": "u1/a.png", "prompt": "", "metadata": {"a": 1}},
+                    {"user_id": "u1", "storage_path": "u1/b.png", "metadata": {}},
+                    {"user_id": "u1", "storage_path": "u1/a.png", "prompt": "cat", "metadata": {"b": 2}},
+                ]
+            ),
+            query,
+        )
+        rows = sb.rpc.call_args.args[1]["p_rows"]
+        assert len(rows) == 2
+        assert rows[0]["metadata"] == {"a": 1, "b": 2}
+        assert rows[0]["prompt"] == "cat"
+
+    def test_empty_bulk_skips_request(self):
+        query = FakeQuery([])
+        result, sb = _run(_service().upsert_generated_content_bulk([]), query)
+        assert result == []
+        sb.rpc.assert_not_called()
+
+
+class TestListingCache:
+    def test_repeat_listing_is_served_from_cache(self):
+        service = _service()
+        query = FakeQuery([{"id": "c1"}])
+        first, sb = _run(service.list_canvases("u1"), query)
+        second, sb = _run(service.list_canvases("u1"), query)
+        assert first == second == [{"id": "c1"}]
+        sb.table.assert_not_called()
+
+    def test_write_invalidates_the_users_listing(self):
+        service = _service()
+        _run(service.list_canvases("u1"), FakeQuery([{"id": "c1"}]))
+        _run(service.rename_canvas("c1", "New", "u1"), FakeQuery([]))
+        listing, sb = _run(service.list_canvases("u1"), FakeQuery([{"id": "c1", "name": "New"}]))
+        assert listing == [{"id": "c1", "name": "New"}]
+        sb.table.assert_called_once_with("canvases")
+
+    def test_canvas_delta_invalidates_without_looking_up_the_owner(self):
+        service = _service()
+        _run(service.list_canvases("u1"), FakeQuery([{"id": "c1"}]))
+        _, sb = _run(service.apply_canvas_delta("c1", upserts=[{"id": "e1"}], user_id="u1"), FakeQuery(5))
+        sb.table.assert_not_called()
+        _, sb = _run(service.list_canvases("u1"), FakeQuery([{"id": "c1"}]))
+        sb.table.assert_called_once_with("canvases")
+
+    def test_cache_is_keyed_per_user(self):
+        service = _service()
+        _run(service.list_canvases("u1"), FakeQuery([{"id": "c1"}]))
+        listing, _ = _run(service.list_canvases("u2"), FakeQuery([{"id": "c2"}]))
+        assert listing == [{"id": "c2"}]
+
+    def test_upsert_invalidates_content_listing(self):
+        service = _service()
+        _run(service.list_generated_content("u1"), FakeQuery([]))
+        _run(
+            service.upsert_generated_content({"user_id": "u1", "storage_path": "u1/a.png"}),
+            FakeQuery([{"id": "g1"}]),
+        )
+        _, sb = _run(service.list_generated_content("u1"), FakeQuery([]))
+        sb.table.assert_called_once_with("generated_content")
+
+    def test_unscoped_reads_bypass_cache(self):
+        service = _service()
+        _run(service.list_sessions("c1"), FakeQuery([]))
+        _, sb = _run(service.list_sessions("c1"), FakeQuery([]))
+        sb.table.assert_called_once_with("chat_sessions")
+
+
+class TestCanvasFetch:
+    def test_sessions_are_embedded_in_one_request(self):
+        query = FakeQuery(
+            {"data": {"elements": []}, "name": "C", "version": 3,
+             "chat_sessions": [{"id": "s1"}]}
+        )
+        canvas, sb = _run(_service().get_canvas_data("c1", "u1"), query)
+        sb.table.assert_called_once_with("canvases")
+        assert "chat_sessions(" in query.called("select")[0][1][0]
+        assert query.called("order")[0][2]["foreign_table"] == "chat_sessions"
+        assert canvas == {"data": {"elements": []}, "name": "C", "version": 3,
+                          "sessions": [{"id": "s1"}]}
+
+    def test_document_variant_skips_sessions(self):
+        query = FakeQuery({"data": {}, "name": "C", "version": 1})
+        canvas, _ = _run(_service().get_canvas_document("c1"), query)
+        assert query.called("select")[0][1][0] == "data, name, version"
+        assert "sessions" not in canvas
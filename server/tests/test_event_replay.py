@@ -0,0 +1,101 @@
+"""Tests for the per-session event replay buffer."""
+
+import asyncio
+
+from services.event_replay import MemoryReplayBuffer
+
+
+class TestMemoryReplayBuffer:
+    def test_append_stamps_increasing_seq(self):
+        async def scenario():
+            buf = MemoryReplayBuffer()
+            a = await buf.append("s1", {"type": "delta"})
+            b = await buf.append("s1", {"type": "done"})
+            c = await buf.append("s2", {"type": "delta"})
+            return a, b, c
+
+        a, b, c = asyncio.run(scenario())
+        assert (a["seq"], b["seq"], c["seq"]) == (1, 2, 1)
+
+    def test_events_since(self):
+        async def scenario():
+            buf = MemoryReplayBuffer()
+            for i in range(3):
+                await buf.append("s1", {"i": i})
+            return (
+                await buf.events_since("s1", 1),
+                await buf.events_since("s1", 3),
+                await buf.events_since("s1", 0),
+            )
+
+        after_one, up_to_date, everything = asyncio.run(scenario())
+        assert [e["seq"] for e in after_one] == [2, 3]
+        assert up_to_date == []
+        assert [e["seq"] for e in everything] == [1, 2, 3]
+
+    def test_gap_older_than_ring_returns_none(self):
+        async def scenario():
+            buf = MemoryReplayBuffer(size=2)
+            for i in range(5):
+                await buf.append("s1", {"i": i})
+            return await buf.events_since("s1", 2), await buf.events_since("s1", 3)
+
+        too_old, just_fits = asyncio.run(scenario())
+        assert too_old is None
+        assert [e["seq"] for e in just_fits] == [4, 5]
+
+    def test_unknown_session(self):
+        async def scenario():
+            buf = MemoryReplayBuffer()
+            return await buf.events_since("nope", 0), await buf.events_since("nope", 4)
+
+        assert asyncio.run(scenario()) == ([], None)
+
+    def test_least_recent_sessions_are_dropped(self):
+        async def scenario():
+            buf = MemoryReplayBuffer(max_sessions=2)
+            for session_id in ["a", "b", "c"]:
+                await buf.append(session_id, {})
+            return len(buf), await buf.events_since("a", 1)
+
+        assert asyncio.run(scenario()) == (2, None)
+
+    def test_session_byte_budget_drops_oldest_events(self):
+        async def scenario():
+            buf = MemoryReplayBuffer(session_max_bytes=200)
+            for i in range(5):
+                await buf.append("s1", {"text": "x" * 40})
+            return await buf.events_since("s1", 0), await buf.events_since("s1", 3), buf.bytes
+
+        too_old, recent, size = asyncio.run(scenario())
+        assert too_old is None
+        assert [e["seq"] for e in recent] == [4, 5]
+        assert size <= 200
+
+    def test_oversized_snapshot_is_not_kept(self):
+        async def scenario():
+            buf = MemoryReplayBuffer(session_max_bytes=200)
+            await buf.append("s1", {"type": "delta"})
+            snapshot = await buf.append("s1", {"type": "all_messages", "messages": ["x" * 500]})
+            after = await buf.append("s1", {"type": "delta"})
+            return snapshot, after, await buf.events_since("s1", 1), await buf.events_since("s1", 2), buf.bytes
+
+        snapshot, after, missed_snapshot, after_snapshot, size = asyncio.run(scenario())
+        assert (snapshot["seq"], after["seq"]) == (2, 3)
+        # Missing the snapshot means a fresh one is sent instead
+        assert missed_snapshot is None
+        assert [e["seq"] for e in after_snapshot] == [3]
+        assert size < 200
+
+    def test_global_byte_budget_drops_least_recent_sessions(self):
+        async def scenario():
+            buf = MemoryReplayBuffer(max_bytes=300)
+            for session_id in ["a", "b", "c"]:
+                await buf.append(session_id, {"text": "x" * 100})
+            return len(buf), await buf.events_since("a", 1), await buf.events_since("c", 0), buf.bytes
+
+        sessions, dropped, kept, size = asyncio.run(scenario())
+        assert sessions == 2
+        assert dropped is None
+        assert [e["seq"] for e in kept] == [1]
+        assert size <= 300
@@ -0,0 +1,32 @@
+"""Tests for saving generated images."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from tools.utils import image_canvas_utils
+
+
+def _save(record):
+    db = AsyncMock()
+    db.upsert_generated_content.return_value = record
+    storage = AsyncMock()
+    storage.GENERATED_CONTENT_BUCKET = "generated-content"
+    storage.upload_content_addressed.return_value = ("abc.png", "https://x/u1/abc.png")
+    with patch.object(image_canvas_utils, "db_service", db), patch.object(
+        image_canvas_utils, "storage_service", storage
+    ):
+        url = asyncio.run(image_canvas_utils.save_image_to_canvas(
+            "s1", "", "im_1.png", "image/png", 10, 10, user_id="u1", image_bytes=b"png",
+        ))
+    return url, storage
+
+
+class TestStorageReferences:
+    def test_new_record_keeps_its_reference(self):
+        url, storage = _save({"id": "r1", "inserted": True})
+        assert url == "https://x/u1/abc.png"
+        storage.release_file.assert_not_awaited()
+
+    def test_merged_record_gives_back_the_extra_reference(self):
+        _, storage = _save({"id": "r1", "inserted": False})
+        storage.release_file.assert_awaited_once_with("generated-content", "u1/abc.png")
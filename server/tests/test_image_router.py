@@ -0,0 +1,18 @@
+"""Tests for the user upload endpoints."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from routers import image_router
+
+
+class TestDeleteUpload:
+    def test_delete_releases_one_reference(self):
+        release, delete = AsyncMock(), AsyncMock()
+        with patch.object(image_router.storage_service, "release_file", release), patch.object(
+            image_router.storage_service, "delete_file", delete
+        ):
+            result = asyncio.run(image_router.delete_upload("abc.png", user_id="u1"))
+        release.assert_awaited_once_with("uploads", "u1/abc.png")
+        delete.assert_not_awaited()
+        assert result == {"status": "deleted", "filename": "abc.png"}
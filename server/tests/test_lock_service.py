@@ -0,0 +1,165 @@
+"""Tests for the lease-based lock service backends."""
+
+import asyncio
+import time
+
+import pytest
+
+from services.lock_service import (
+    InProcessLockBackend,
+    LockService,
+    LockTimeoutError,
+    RedisLockBackend,
+)
+
+
+class FakeRedis:
+    """Minimal stand-in for the redis.asyncio commands used by the backend."""
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+
+    def _purge(self, key):
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+
+    async def set(self, key, value, nx=False, px=None):
+        self._purge(key)
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        if px:
+            self.expiry[key] = time.monotonic() + px / 1000
+        return True
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    async def eval(self, script, numkeys, key, owner):
+        self._purge(key)
+        if self.values.get(key) == owner:
+            del self.values[key]
+            return 1
+        return 0
+
+
+class TestInProcessLockBackend:
+    def test_lock_is_mutually_exclusive(self):
+        service = LockService(InProcessLockBackend())
+        active = []
+        peak = []
+
+        async def worker():
+            async with service.lock("canvas:1"):
+                active.append(1)
+                peak.append(len(active))
+                await asyncio.sleep(0.01)
+                active.pop()
+
+        async def main():
+            await asyncio.gather(*(worker() for _ in range(5)))
+
+        asyncio.run(main())
+        assert max(peak) == 1
+
+    def test_fencing_tokens_increase(self):
+        service = LockService(InProcessLockBackend())
+
+        async def main():
+            tokens = []
+            for _ in range(3):
+                async with service.lock("k") as lease:
+                    tokens.append(lease.token)
+            return tokens
+
+        tokens = asyncio.run(main())
+        assert tokens == sorted(tokens) and len(set(tokens)) == 3
+
+    def test_expired_lease_is_taken_over_and_stale_release_ignored(self):
+        backend = InProcessLockBackend()
+
+        async def main():
+            first = await backend.acquire("k", "a", lease_seconds=0.05, timeout=1)
+            second = await backend.acquire("k", "b", lease_seconds=5, timeout=1)
+            await backend.release(first)
+            third = await backend.acquire("k", "c", lease_seconds=5, timeout=0.05)
+            return first, second, third
+
+        first, second, third = asyncio.run(main())
+        assert second is not None and second.token > first.token
+        assert third is None
+
+    def test_timeout_raises(self):
+        service = LockService(InProcessLockBackend())
+
+        async def main():
+            async with service.lock("k"):
+                async with service.lock("k", timeout=0.05):
+                    pass
+
+        with pytest.raises(LockTimeoutError):
+            asyncio.run(main())
+
+    def test_idle_locks_are_evicted(self):
+        backend = InProcessLockBackend(idle_ttl=0.02)
+
+        async def main():
+            for i in range(10):
+                lease = await backend.acquire(f"k{i}", "a", 5, 1)
+                await backend.release(lease)
+            await asyncio.sleep(0.03)
+            await backend.acquire("fresh", "a", 5, 1)
+
+        asyncio.run(main())
+        assert len(backend) == 1
+
+
+class TestRedisLockBackend:
+    def test_lock_is_mutually_exclusive(self):
+        service = LockService(RedisLockBackend(client=FakeRedis()))
+        active = []
+        peak = []
+
+        async def worker():
+            async with service.lock("canvas:1"):
+                active.append(1)
+                peak.append(len(active))
+                await asyncio.sleep(0.01)
+                active.pop()
+
+        async def main():
+            await asyncio.gather(*(worker() for _ in range(5)))
+
+        asyncio.run(main())
+        assert max(peak) == 1
+
+    def test_acquire_release_cycle(self):
+        backend = RedisLockBackend(client=FakeRedis())
+
+        async def main():
+            lease = await backend.acquire("k", "a", 5, 1)
+            blocked = await backend.acquire("k", "b", 5, 0.05)
+            await backend.release(lease)
+            again = await backend.acquire("k", "b", 5, 1)
+            return lease, blocked, again
+
+        lease, blocked, again = asyncio.run(main())
+        assert blocked is None
+        assert again.token > lease.token
+
+    def test_release_by_stale_owner_keeps_new_lease(self):
+        redis = FakeRedis()
+        backend = RedisLockBackend(client=redis)
+
+        async def main():
+            stale = await backend.acquire("k", "a", 0.02, 1)
+            await asyncio.sleep(0.03)
+            fresh = await backend.acquire("k", "b", 5, 1)
+            await backend.release(stale)
+            return fresh
+
+        asyncio.run(main())
+        assert redis.values["lock:k"] == "b"
@@ -0,0 +1,34 @@
+"""Tests for magic generation events."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from services import magic_service, message_history
+
+
+class TestMagicGenerationEvents:
+    def test_snapshot_comes_before_the_diff(self):
+        messages = [{"role": "user", "content": "make it magic"}]
+        reply = {"role": "assistant", "content": "done"}
+        live = []
+
+        async def respond(*args):
+            live.append(message_history.get_live_history("s1").snapshot())
+            return reply
+
+        send = AsyncMock()
+        with patch.object(magic_service, "create_jaaz_response", respond), patch.object(
+            magic_service, "db_service", AsyncMock()
+        ), patch.object(magic_service, "send_to_websocket", send), patch.dict(
+            message_history.live_histories, clear=True
+        ):
+            asyncio.run(magic_service._process_magic_generation(messages, "s1", "c1"))
+            assert message_history.get_live_history("s1") is None
+
+        first, second = [c.args[1] for c in send.await_args_list]
+        assert first == {"type": "all_messages", "messages": messages, "version": 1}
+        assert second["type"] == "messages_diff"
+        assert second["base_version"] == 1
+        assert second["ops"] == [{"op": "append", "index": 1, "messages": [reply]}]
+        # A resync during generation is answered from the registered history
+        assert live == [first]
@@ -0,0 +1,86 @@
+"""Tests for incremental message history diffs."""
+
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from services import message_history
+from services.message_history import MessageHistory
+
+
+class TestMessageHistory:
+    def test_first_update_is_a_snapshot(self):
+        history = MessageHistory("s1")
+        event = history.update([HumanMessage("hi", id="1")])
+        assert event == {
+            "type": "all_messages",
+            "messages": [{"role": "user", "content": "hi"}],
+            "version": 1,
+        }
+
+    def test_unchanged_history_sends_nothing(self):
+        history = MessageHistory("s1")
+        msgs = [HumanMessage("hi", id="1")]
+        history.update(msgs)
+        assert history.update(list(msgs)) is None
+        assert history.version == 1
+
+    def test_only_new_messages_are_converted_and_appended(self):
+        history = MessageHistory("s1")
+        human = HumanMessage("hi", id="1")
+        history.update([human])
+
+        calls = []
+        convert = history.convert
+        history.convert = lambda ms: calls.append(len(ms)) or convert(ms)
+        event = history.update([
+            human,
+            AIMessage("", tool_calls=[{"name": "gen", "args": {}, "id": "t"}], id="2"),
+            ToolMessage("ok", tool_call_id="t", id="3"),
+        ])
+
+        assert calls == [2]
+        assert event["type"] == "messages_diff"
+        assert (event["version"], event["base_version"]) == (2, 1)
+        assert [op["op"] for op in event["ops"]] == ["append"]
+        assert event["ops"][0]["index"] == 1
+        assert [m["role"] for m in event["ops"][0]["messages"]] == ["assistant", "tool"]
+        assert len(history.messages) == 3
+
+    def test_changed_message_is_replaced_at_index(self):
+        history = MessageHistory("s1")
+        history.update([HumanMessage("hi", id="1"), AIMessage("draft", id="2")])
+        event = history.update([HumanMessage("hi", id="1"), AIMessage("final", id="2")])
+
+        assert event["ops"] == [
+            {"op": "replace", "index": 1, "message": {"role": "assistant", "content": "final"}}
+        ]
+        assert history.messages[1]["content"] == "final"
+
+    def test_removed_messages_fall_back_to_snapshot(self):
+        history = MessageHistory("s1")
+        history.update([HumanMessage("a", id="1"), AIMessage("b", id="2")])
+        event = history.update([HumanMessage("a", id="1")])
+        assert event["type"] == "all_messages"
+        assert event["version"] == 2
+        assert len(event["messages"]) == 1
+
+    def test_seeded_history_diffs_against_client_messages(self):
+        history = MessageHistory("s1", convert=list)
+        sent = [{"role": "user", "content": "hi"}]
+        history.seed(sent)
+        event = history.update(sent + [{"role": "assistant", "content": "yo"}])
+        assert event == {
+            "type": "messages_diff",
+            "version": 2,
+            "base_version": 1,
+            "ops": [{"op": "append", "index": 1, "messages": [{"role": "assistant", "content": "yo"}]}],
+        }
+
+    def test_registry(self):
+        with patch.dict(message_history.live_histories, clear=True):
+            history = MessageHistory("s1")
+            message_history.register_history(history)
+            assert message_history.get_live_history("s1") is history
+            message_history.unregister_history(history)
+            assert message_history.get_live_history("s1") is None
@@ -0,0 +1,90 @@
+"""Tests for the write-behind chat message buffer."""
+
+import asyncio
+from unittest.mock import AsyncMock
+
+from services.message_writer import MessageWriter
+
+
+def _db():
+    db = AsyncMock()
+    db.written = []
+
+    async def create_messages(session_id, batch, user_id=""):
+        db.written.append(list(batch))
+
+    db.create_messages.side_effect = create_messages
+    return db
+
+
+class TestMessageWriter:
+    def test_add_does_not_wait_for_the_database(self):
+        db = _db()
+
+        async def scenario():
+            writer = MessageWriter("s1", db, flush_interval=60)
+            writer.add("user", "1")
+            writer.add("assistant", "2")
+            assert db.create_messages.await_count == 0
+            await writer.close()
+
+        asyncio.run(scenario())
+        assert db.written == [[("user", "1"), ("assistant", "2")]]
+
+    def test_full_batches_flush_before_the_interval(self):
+        db = _db()
+
+        async def scenario():
+            writer = MessageWriter("s1", db, batch_size=2, flush_interval=60)
+            for i in range(5):
+                writer.add("user", str(i))
+            await asyncio.sleep(0.01)
+            flushed_early = [len(b) for b in db.written]
+            await writer.close()
+            return flushed_early
+
+        flushed_early = asyncio.run(scenario())
+        assert flushed_early[:2] == [2, 2]
+        assert [m for batch in db.written for _, m in batch] == ["0", "1", "2", "3", "4"]
+
+    def test_failed_batch_is_retried_in_order(self):
+        db = _db()
+        calls = {"n": 0}
+
+        async def flaky(session_id, batch, user_id=""):
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise RuntimeError("timeout")
+            db.written.append(list(batch))
+
+        db.create_messages.side_effect = flaky
+
+        async def scenario():
+            writer = MessageWriter("s1", db, flush_interval=0.01)
+            writer.add("user", "a")
+            await asyncio.sleep(0.05)
+            writer.add("user", "b")
+            await writer.close()
+
+        asyncio.run(scenario())
+        assert [m for batch in db.written for _, m in batch] == ["a", "b"]
+
+    def test_close_flushes_when_stream_task_is_cancelled(self):
+        db = _db()
+
+        async def stream(writer):
+            try:
+                writer.add("assistant", "partial")
+                await asyncio.sleep(60)
+            finally:
+                await asyncio.shield(writer.close())
+
+        async def scenario():
+            writer = MessageWriter("s1", db, flush_interval=60)
+            task = asyncio.create_task(stream(writer))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(scenario())
+        assert db.written == [[("assistant", "partial")]]
@@ -0,0 +1,78 @@
+"""Tests for the singleflight request-coalescing primitive."""
+
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight, singleflight
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+
+        @singleflight
+        async def fetch(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return {"key": key}
+
+        async def scenario():
+            return await asyncio.gather(*(fetch("a") for _ in range(5)), fetch("b"))
+
+        results = asyncio.run(scenario())
+        assert calls == ["a", "b"]
+        assert results[:5] == [{"key": "a"}] * 5
+        # Followers get their own copy of mutable results
+        assert len({id(r) for r in results[:5]}) == 5
+
+    def test_nothing_is_cached_after_completion(self):
+        calls = []
+
+        @singleflight
+        async def fetch():
+            calls.append(1)
+            return len(calls)
+
+        async def scenario():
+            return await fetch(), await fetch()
+
+        assert asyncio.run(scenario()) == (1, 2)
+        assert len(fetch.singleflight_group) == 0
+
+    def test_errors_reach_every_waiter(self):
+        group = SingleFlight()
+
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream")
+
+        async def scenario():
+            return await asyncio.gather(
+                group.do("k", boom), group.do("k", boom), return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(r, ValueError) for r in results)
+
+    def test_cancelled_caller_does_not_cancel_shared_call(self):
+        group = SingleFlight()
+        finished = []
+
+        async def slow():
+            await asyncio.sleep(0.02)
+            finished.append(True)
+            return "done"
+
+        async def scenario():
+            first = asyncio.create_task(group.do("k", slow))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(group.do("k", slow))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(scenario()) == "done"
+        assert finished == [True]
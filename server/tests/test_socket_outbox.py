@@ -0,0 +1,112 @@
+"""Tests for bounded per-connection outbound queues."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from services import socket_outbox
+from services.socket_outbox import Outbox, deliver
+
+
+def _sio():
+    sio = MagicMock()
+    sio.emit = AsyncMock()
+    sio.disconnect = AsyncMock()
+    return sio
+
+
+def _delta(text, seq, session_id="s1"):
+    return {"type": "delta", "session_id": session_id, "text": text, "seq": seq}
+
+
+def _sent(sio):
+    return [c.args[1] for c in sio.emit.await_args_list]
+
+
+class TestOutbox:
+    def test_frames_are_sent_in_order_to_the_connection(self):
+        async def scenario():
+            sio = _sio()
+            box = Outbox("sid-1", sio)
+            box.put(_delta("a", 1))
+            box.put({"type": "done", "session_id": "s1", "seq": 2})
+            await asyncio.sleep(0.01)
+            box.close()
+            return sio
+
+        sio = asyncio.run(scenario())
+        assert [(e["type"], e["seq"]) for e in _sent(sio)] == [("delta", 1), ("done", 2)]
+        assert all(c.kwargs["to"] == "sid-1" for c in sio.emit.await_args_list)
+        # Per-connection frames never go through the cluster message queue
+        assert all(c.kwargs["ignore_queue"] for c in sio.emit.await_args_list)
+
+    def test_queued_deltas_are_merged_while_transport_is_busy(self):
+        async def scenario():
+            sio = _sio()
+            box = Outbox("sid-1", sio, high_water=1)
+            backlog = [5]
+            box._transport_backlog = lambda: backlog[0]
+            for i, text in enumerate(["Hel", "lo", "!"], start=1):
+                box.put(_delta(text, i))
+            await asyncio.sleep(0.01)
+            assert sio.emit.await_count == 0
+            assert len(box) == 1
+            backlog[0] = 0
+            await asyncio.sleep(0.1)
+            box.close()
+            return sio
+
+        sio = asyncio.run(scenario())
+        [frame] = _sent(sio)
+        assert (frame["text"], frame["seq_first"], frame["seq"]) == ("Hello!", 1, 3)
+
+    def test_deltas_are_dropped_past_the_byte_limit_but_terminal_events_kept(self):
+        async def scenario():
+            box = Outbox("sid-1", _sio(), max_bytes=550, high_water=1)
+            box._transport_backlog = lambda: 5
+            box.put(_delta("x" * 200, 1))
+            box.put({"type": "tool_call", "session_id": "s1", "id": "t1", "seq": 2})
+            box.put(_delta("y" * 200, 3))
+            box.put({"type": "done", "session_id": "s1", "seq": 4})
+            frames = [payload for payload, _ in box._frames]
+            box.close()
+            return box, frames
+
+        box, frames = asyncio.run(scenario())
+        assert [f["type"] for f in frames] == ["deltas_dropped", "tool_call", "delta", "done"]
+        assert (frames[0]["seq_first"], frames[0]["seq"]) == (1, 1)
+        assert box.dropped == 1
+
+    def test_slow_consumer_is_disconnected(self):
+        async def scenario():
+            sio = _sio()
+            box = Outbox("sid-1", sio, max_bytes=10, high_water=1, slow_timeout=0.05)
+            box._transport_backlog = lambda: 5
+            box.put({"type": "done", "session_id": "s1", "seq": 1, "pad": "x" * 50})
+            assert not box.closed
+            await asyncio.sleep(0.1)
+            box.put({"type": "done", "session_id": "s1", "seq": 2})
+            await asyncio.sleep(0)
+            return sio, box
+
+        sio, box = asyncio.run(scenario())
+        assert box.closed
+        assert box.queued_bytes == 0
+        sio.disconnect.assert_awaited_once_with("sid-1")
+
+    def test_slow_connection_does_not_delay_others(self):
+        async def scenario():
+            sio = _sio()
+            sio.manager.get_participants.return_value = [("slow", "e1"), ("fast", "e2")]
+            with patch.dict(socket_outbox.outboxes, clear=True):
+                slow = socket_outbox.get_outbox("slow", sio)
+                slow._transport_backlog = lambda: 100
+                assert deliver(sio, ["session:s1"], {"type": "done", "session_id": "s1", "seq": 1}) == 2
+                await asyncio.sleep(0.01)
+                sent_to = [c.kwargs["to"] for c in sio.emit.await_args_list]
+                for sid in list(socket_outbox.outboxes):
+                    socket_outbox.close_outbox(sid)
+            return sent_to, len(slow)
+
+        sent_to, slow_pending = asyncio.run(scenario())
+        assert sent_to == ["fast"]
+        assert slow_pending == 0  # cleared on close
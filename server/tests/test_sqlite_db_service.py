@@ -0,0 +1,170 @@
+"""Tests for the embedded SQLite repository (runs against a real temp database)."""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from services.db_service import (
+    CanvasVersionConflict,
+    DatabaseRepository,
+    encode_content_cursor,
+)
+from services.migrations.manager import CURRENT_VERSION
+from services.sqlite_db_service import SQLiteDatabaseService, merge_canvas_delta
+
+
+def _run(db_path, scenario):
+    async def main():
+        db = SQLiteDatabaseService(str(db_path))
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(main())
+
+
+class TestMigrations:
+    def test_schema_is_migrated_in_wal_mode(self, tmp_path):
+        path = tmp_path / "app.db"
+
+        async def scenario(db):
+            assert isinstance(db, DatabaseRepository)
+            await db.list_canvases("u1")
+
+        _run(path, scenario)
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT version FROM db_version").fetchone()[0] == CURRENT_VERSION
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+
+class TestCanvases:
+    def test_crud_is_scoped_to_user(self, tmp_path):
+        async def scenario(db):
+            await db.create_canvas("c1", "One", "u1")
+            await db.create_canvas("c2", "Two", "u2")
+            await db.rename_canvas("c1", "Renamed", "u2")  # not the owner
+            await db.save_canvas_data("c1", '{"elements": []}', "thumb", "u1")
+            return await db.list_canvases("u1"), await db.get_canvas_data("c1", "u2")
+
+        canvases, foreign = _run(tmp_path / "app.db", scenario)
+        assert [(c["id"], c["name"], c["thumbnail"]) for c in canvases] == [("c1", "One", "thumb")]
+        assert foreign is None
+
+    def test_delta_bumps_version_and_detects_conflicts(self, tmp_path):
+        async def scenario(db):
+            await db.create_canvas("c1", "One", "u1")
+            v1 = await db.apply_canvas_delta("c1", upserts=[{"id": "a"}], base_version=0)
+            with pytest.raises(CanvasVersionConflict):
+                await db.apply_canvas_delta("c1", upserts=[{"id": "b"}], base_version=0)
+            v2 = await db.apply_canvas_delta(
+                "c1", upserts=[{"id": "a", "x": 5}, {"id": "b"}], files={"f": {}}
+            )
+            return v1, v2, await db.get_canvas_data("c1")
+
+        v1, v2, canvas = _run(tmp_path / "app.db", scenario)
+        assert (v1, v2) == (1, 2)
+        assert canvas["version"] == 2
+        assert canvas["data"]["elements"] == [{"id": "a", "x": 5}, {"id": "b"}]
+        assert canvas["data"]["files"] == {"f": {}}
+
+    def test_merge_keeps_order_and_drops_deletes(self):
+        doc = {"elements": [{"id": "a"}, {"id": "b"}, {"id": "c"}]}
+        merged = merge_canvas_delta(doc, [{"id": "b", "v": 1}, {"id": "d"}], ["a"], {}, None)
+        assert merged["elements"] == [{"id": "b", "v": 1}, {"id": "c"}, {"id": "d"}]
+
+    def test_merge_dedupes_upserts_and_honours_deletes(self):
+        doc = {"elements": [{"id": "a"}, {"id": "b"}]}
+        upserts = [
+            {"id": "a", "v": 1},
+            {"id": "n", "v": 1},
+            {"id": "a", "v": 2},
+            {"id": "b", "v": 1},
+            {"id": "n", "v": 2},
+            {"id": "x"},
+        ]
+        merged = merge_canvas_delta(doc, upserts, ["b", "x"], {}, None)
+        assert merged["elements"] == [{"id": "a", "v": 2}, {"id": "n", "v": 2}]
+
+
+class TestChat:
+    def test_history_pages_and_ownership(self, tmp_path):
+        async def scenario(db):
+            await db.create_chat_session("s1", "gpt", "openai", "", user_id="u1")
+            await db.create_message("s1", "user", '{"role": "user", "content": "0"}')
+            await db.create_messages(
+                "s1",
+                [("user", f'{{"role": "user", "content": "{i}"}}') for i in range(1, 5)],
+            )
+            page = await db.get_chat_history_page("s1", "u1", limit=2)
+            older = await db.get_chat_history_page("s1", "u1", before_id=page["first_id"], limit=10)
+            return page, older, await db.get_chat_history("s1", "u2")
+
+        page, older, foreign = _run(tmp_path / "app.db", scenario)
+        assert [m["message"]["content"] for m in page["messages"]] == ["3", "4"]
+        assert page["has_more"] is True
+        assert [m["message"]["content"] for m in older["messages"]] == ["0", "1", "2"]
+        assert foreign == []
+
+    def test_get_chat_session_checks_owner(self, tmp_path):
+        async def scenario(db):
+            await db.create_chat_session("s1", "gpt", "openai", "c1", user_id="u1")
+            return await db.get_chat_session("s1", "u1"), await db.get_chat_session("s1", "u2")
+
+        own, foreign = _run(tmp_path / "app.db", scenario)
+        assert own == {"id": "s1", "canvas_id": "c1", "user_id": "u1"}
+        assert foreign is None
+
+    def test_reads_do_not_see_an_open_write_transaction(self, tmp_path):
+        async def scenario(db):
+            await db.create_canvas("c1", "Canvas", user_id="u1")
+            conn = await db._get_conn()
+            async with db._write_lock:
+                await conn.execute("BEGIN IMMEDIATE")
+                await conn.execute("UPDATE canvases SET name = 'draft' WHERE id = 'c1'")
+                during = await db.get_canvas_document("c1")
+                await conn.execute("ROLLBACK")
+            return during, await db.get_canvas_document("c1")
+
+        during, after = _run(tmp_path / "app.db", scenario)
+        assert during["name"] == after["name"] == "Canvas"
+
+    def test_get_canvas_checks_owner(self, tmp_path):
+        async def scenario(db):
+            await db.create_canvas("c1", "Canvas", user_id="u1")
+            return await db.get_canvas("c1", "u1"), await db.get_canvas("c1", "u2")
+
+        own, foreign = _run(tmp_path / "app.db", scenario)
+        assert own == {"id": "c1", "user_id": "u1"}
+        assert foreign is None
+
+
+class TestGeneratedContent:
+    def test_upsert_merges_metadata_and_lists_with_cursor(self, tmp_path):
+        async def scenario(db):
+            for i in range(3):
+                await db.upsert_generated_content(
+                    {"user_id": "u1", "type": "image", "storage_path": f"u1/{i}.png",
+                     "prompt": "", "metadata": {"public_url": f"https://x/{i}.png"}}
+                )
+            row = await db.upsert_generated_content(
+                {"user_id": "u1", "storage_path": "u1/0.png", "prompt": "cat",
+                 "metadata": {"feature_type": "face_swap"}}
+            )
+            first = await db.list_generated_content("u1", limit=2)
+            rest = await db.list_generated_content(
+                "u1", limit=2, cursor=encode_content_cursor(first[-1])
+            )
+            swaps = await db.list_generated_content("u1", feature_type="face_swap")
+            return row, first, rest, swaps
+
+        row, first, rest, swaps = _run(tmp_path / "app.db", scenario)
+        assert row["prompt"] == "cat"
+        assert row["inserted"] is False
+        assert row["metadata"] == {"public_url": "https://x/0.png", "feature_type": "face_swap"}
+        assert len(first) == 2 and len(rest) == 1
+        assert len({i["id"] for i in first + rest}) == 3
+        assert [s["storage_path"] for s in swaps] == ["u1/0.png"]
+        assert swaps[0]["public_url"] == "https://x/0.png"
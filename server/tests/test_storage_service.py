@@ -0,0 +1,183 @@
+"""Tests for content-addressed uploads and URL building in the storage service."""
+
+import asyncio
+import hashlib
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from jose import jwt
+
+from services import storage_service
+
+
+def _mock_supabase(acquire_result):
+    sb = MagicMock()
+    rpc_call = MagicMock()
+    rpc_call.execute = AsyncMock(return_value=MagicMock(data=acquire_result))
+    sb.rpc.return_value = rpc_call
+    bucket = MagicMock()
+    bucket.upload = AsyncMock()
+    bucket.remove = AsyncMock()
+    bucket.exists = AsyncMock(return_value=True)
+    sb.storage.from_.return_value = bucket
+    return sb, bucket
+
+
+class TestContentAddressedFilename:
+    def test_uses_sha256_of_bytes(self):
+        data = b"same product photo"
+        expected = hashlib.sha256(data).hexdigest()
+        assert storage_service.content_addressed_filename(data, "png") == f"{expected}.png"
+
+    def test_strips_leading_dot_from_extension(self):
+        name = storage_service.content_addressed_filename(b"x", ".jpg")
+        assert name.endswith(".jpg")
+        assert ".." not in name
+
+    def test_identical_bytes_share_a_name(self):
+        a = storage_service.content_addressed_filename(b"abc", "png")
+        b = storage_service.content_addressed_filename(b"abc", "png")
+        assert a == b
+
+
+class TestUploadContentAddressed:
+    def test_new_object_is_uploaded_with_immutable_cache(self):
+        sb, bucket = _mock_supabase(True)
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            filename, url = asyncio.run(
+                storage_service.upload_content_addressed("user-1", b"img", "png")
+            )
+        bucket.upload.assert_awaited_once()
+        options = bucket.upload.call_args.kwargs["file_options"]
+        assert options["cache-control"] == storage_service.IMMUTABLE_CACHE_CONTROL
+        assert bucket.upload.call_args.kwargs["path"] == f"user-1/{filename}"
+        assert url.endswith(f"/object/public/generated-content/user-1/{filename}")
+
+    def test_duplicate_object_skips_upload(self):
+        sb, bucket = _mock_supabase(False)
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            asyncio.run(storage_service.upload_content_addressed("user-1", b"img", "png"))
+        bucket.upload.assert_not_awaited()
+
+    def test_duplicate_of_missing_object_is_uploaded(self):
+        # The first caller's upload failed after the reference was taken
+        sb, bucket = _mock_supabase(False)
+        bucket.exists = AsyncMock(return_value=False)
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            asyncio.run(storage_service.upload_content_addressed("user-1", b"img", "png"))
+        bucket.upload.assert_awaited_once()
+
+    def test_concurrent_callers_wait_for_one_upload(self):
+        sb, bucket = _mock_supabase(True)
+        uploaded = []
+
+        async def upload(**kwargs):
+            await asyncio.sleep(0.01)
+            uploaded.append(kwargs["path"])
+
+        bucket.upload = AsyncMock(side_effect=upload)
+
+        async def run():
+            first = asyncio.ensure_future(
+                storage_service.upload_content_addressed("user-1", b"img", "png")
+            )
+            await asyncio.sleep(0)
+            sb.rpc.return_value.execute.return_value = MagicMock(data=False)
+            await storage_service.upload_content_addressed("user-1", b"img", "png")
+            # The follower returned only after the object was stored
+            assert len(uploaded) == 1
+            await first
+
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            asyncio.run(run())
+        bucket.upload.assert_awaited_once()
+        bucket.exists.assert_not_awaited()
+
+    def test_follower_uploads_when_first_upload_fails(self):
+        sb, bucket = _mock_supabase(True)
+        calls = []
+
+        async def upload(**kwargs):
+            calls.append(kwargs["path"])
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError("storage down")
+
+        bucket.upload = AsyncMock(side_effect=upload)
+
+        async def run():
+            first = asyncio.ensure_future(
+                storage_service.upload_content_addressed("user-1", b"img", "png")
+            )
+            await asyncio.sleep(0)
+            sb.rpc.return_value.execute.return_value = MagicMock(data=False)
+            await storage_service.upload_content_addressed("user-1", b"img", "png")
+            try:
+                await first
+            except RuntimeError:
+                pass
+
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            asyncio.run(run())
+        assert len(calls) == 2
+        assert storage_service._uploads_in_flight == {}
+
+    def test_release_keeps_object_while_referenced(self):
+        sb, bucket = _mock_supabase(2)
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            asyncio.run(storage_service.release_file("uploads", "user-1/a.png"))
+        bucket.remove.assert_not_awaited()
+
+    def test_release_removes_last_reference(self):
+        sb, bucket = _mock_supabase(0)
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            asyncio.run(storage_service.release_file("uploads", "user-1/a.png"))
+        bucket.remove.assert_awaited_once_with(["user-1/a.png"])
+
+
+class TestStorageUrlBuilder:
+    def test_public_url_is_built_locally(self):
+        builder = storage_service.StorageUrlBuilder("https://proj.supabase.co/")
+        assert (
+            builder.public_url("uploads", "user-1/a b.png")
+            == "https://proj.supabase.co/storage/v1/object/public/uploads/user-1/a%20b.png"
+        )
+
+    def test_signed_url_is_minted_with_jwt_secret(self):
+        builder = storage_service.StorageUrlBuilder("https://proj.supabase.co", "secret")
+        url = builder.signed_url("uploads", "user-1/a.png", expires_in=60)
+        assert url.startswith("https://proj.supabase.co/storage/v1/object/sign/uploads/user-1/a.png?token=")
+        claims = jwt.decode(url.split("token=")[1], "secret", algorithms=["HS256"])
+        assert claims["url"] == "uploads/user-1/a.png"
+        assert claims["exp"] - claims["iat"] == 60
+
+    def test_signed_urls_without_secret_use_one_batch_request(self):
+        builder = storage_service.StorageUrlBuilder("https://proj.supabase.co")
+        sb, bucket = _mock_supabase(None)
+        bucket.create_signed_urls = AsyncMock(
+            return_value=[
+                {"path": "u/a.png", "signedURL": "https://signed/a", "error": None},
+                {"path": "u/b.png", "signedURL": "https://signed/b", "error": None},
+            ]
+        )
+        with patch.dict("os.environ", {"SUPABASE_JWT_SECRET": ""}), patch.object(
+            storage_service, "get_supabase", AsyncMock(return_value=sb)
+        ):
+            urls = asyncio.run(builder.signed_urls("uploads", ["u/a.png", "u/b.png"]))
+        bucket.create_signed_urls.assert_awaited_once()
+        assert urls == {"u/a.png": "https://signed/a", "u/b.png": "https://signed/b"}
+
+
+class TestListFiles:
+    def test_listing_makes_a_single_upstream_call(self):
+        sb, bucket = _mock_supabase(None)
+        bucket.list = AsyncMock(
+            return_value=[
+                {"name": f"{i}.png", "id": str(i), "created_at": "t"} for i in range(200)
+            ]
+            + [{"name": ".emptyFolderPlaceholder", "id": None}]
+        )
+        with patch.object(storage_service, "get_supabase", AsyncMock(return_value=sb)):
+            files = asyncio.run(storage_service.list_files("user-1", limit=200))
+        bucket.list.assert_awaited_once()
+        assert len(files) == 200
+        assert files[0]["url"].endswith("/object/public/uploads/user-1/0.png")
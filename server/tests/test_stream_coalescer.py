@@ -0,0 +1,91 @@
+"""Tests for streamed event coalescing."""
+
+import asyncio
+
+from services.stream_coalescer import StreamCoalescer
+
+
+class _Recorder:
+    def __init__(self):
+        self.events = []
+
+    async def __call__(self, session_id, event):
+        self.events.append((session_id, event))
+
+
+def _types(recorder):
+    return [(e["type"], e.get("text")) for _, e in recorder.events]
+
+
+class TestStreamCoalescer:
+    def test_deltas_are_joined_into_one_frame(self):
+        async def scenario():
+            send = _Recorder()
+            c = StreamCoalescer("s1", send, flush_interval_ms=10_000)
+            for token in ["Hel", "lo", " world"]:
+                await c.add_text("delta", token)
+            assert send.events == []
+            await c.close()
+            return send
+
+        send = asyncio.run(scenario())
+        assert send.events == [("s1", {"type": "delta", "text": "Hello world"})]
+
+    def test_flushes_after_interval(self):
+        async def scenario():
+            send = _Recorder()
+            c = StreamCoalescer("s1", send, flush_interval_ms=5)
+            await c.add_text("delta", "a")
+            await c.add_text("delta", "b")
+            await asyncio.sleep(0.05)
+            return send
+
+        send = asyncio.run(scenario())
+        assert _types(send) == [("delta", "ab")]
+
+    def test_flushes_when_byte_limit_reached(self):
+        async def scenario():
+            send = _Recorder()
+            c = StreamCoalescer("s1", send, flush_interval_ms=10_000, max_bytes=4)
+            await c.add_text("delta", "ab")
+            await c.add_text("delta", "cd")
+            await c.add_text("delta", "e")
+            assert _types(send) == [("delta", "abcd")]
+            assert c.buffered_bytes == 1
+            await c.close()
+            return send
+
+        send = asyncio.run(scenario())
+        assert _types(send) == [("delta", "abcd"), ("delta", "e")]
+
+    def test_other_events_flush_first_and_keep_order(self):
+        async def scenario():
+            send = _Recorder()
+            c = StreamCoalescer("s1", send, flush_interval_ms=10_000)
+            await c.add_text("delta", "thinking")
+            await c.emit({"type": "tool_call", "id": "t1", "name": "gen"})
+            await c.add_text("tool_call_arguments", '{"a"', id="t1")
+            await c.add_text("tool_call_arguments", ": 1}", id="t1")
+            await c.add_text("tool_call_arguments", "{}", id="t2")
+            await c.emit({"type": "done"})
+            return send
+
+        send = asyncio.run(scenario())
+        events = [e for _, e in send.events]
+        assert [(e["type"], e.get("id"), e.get("text")) for e in events] == [
+            ("delta", None, "thinking"),
+            ("tool_call", "t1", None),
+            ("tool_call_arguments", "t1", '{"a": 1}'),
+            ("tool_call_arguments", "t2", "{}"),
+            ("done", None, None),
+        ]
+
+    def test_empty_text_is_ignored(self):
+        async def scenario():
+            send = _Recorder()
+            c = StreamCoalescer("s1", send)
+            await c.add_text("delta", "")
+            await c.close()
+            return send
+
+        assert asyncio.run(scenario()).events == []
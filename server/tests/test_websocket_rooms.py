@@ -0,0 +1,230 @@
+"""Tests for socket.io room registration and room-targeted emits."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from langchain_core.messages import HumanMessage
+from socketio.exceptions import ConnectionRefusedError
+
+from routers import websocket_router
+from services import message_history, websocket_service, websocket_state
+from services.event_replay import MemoryReplayBuffer
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    buffer = MemoryReplayBuffer(size=4)
+    with patch.dict(websocket_state.active_connections, clear=True), patch.dict(
+        websocket_state.user_connections, clear=True
+    ), patch.object(websocket_service, "replay_buffer", buffer), patch.object(
+        websocket_router, "replay_buffer", buffer
+    ):
+        yield buffer
+
+
+def _sio():
+    sio = MagicMock()
+    sio.emit = AsyncMock()
+    sio.enter_room = AsyncMock()
+    sio.leave_room = AsyncMock()
+    return sio
+
+
+def _db(sessions=(), canvases=()):
+    async def get_chat_session(id, user_id=""):
+        return {"id": id, "user_id": user_id} if id in sessions else None
+
+    async def get_canvas(id, user_id=""):
+        return {"id": id, "user_id": user_id} if id in canvases else None
+
+    db = MagicMock()
+    db.get_chat_session = AsyncMock(side_effect=get_chat_session)
+    db.get_canvas = AsyncMock(side_effect=get_canvas)
+    return db
+
+
+def _connect(sio, db, auth, environ=None, claims=None, verify_error=None):
+    verify = AsyncMock(return_value=claims or {"sub": "user-1"}, side_effect=verify_error)
+    with patch.object(websocket_router, "sio", sio), patch.object(
+        websocket_router, "db_service", db
+    ), patch.object(websocket_router, "verify_token", verify):
+        asyncio.run(websocket_router.connect("sid-1", environ or {}, auth))
+    return verify
+
+
+class TestConnect:
+    def test_rejects_missing_token(self):
+        sio = _sio()
+        with pytest.raises(ConnectionRefusedError):
+            _connect(sio, _db(), {})
+        assert websocket_state.get_connection_count() == 0
+
+    def test_rejects_invalid_token(self):
+        sio = _sio()
+        with pytest.raises(ConnectionRefusedError):
+            _connect(sio, _db(), {"token": "bad"}, verify_error=HTTPException(401))
+        assert websocket_state.get_connection_count() == 0
+
+    def test_joins_user_room_and_owned_rooms(self):
+        sio = _sio()
+        db = _db(sessions=["s1"], canvases=["c1"])
+        verify = _connect(sio, db, {"token": "t", "session_id": "s1", "canvas_id": "c1"})
+
+        verify.assert_awaited_once_with("t")
+        rooms = [call.args[1] for call in sio.enter_room.await_args_list]
+        assert rooms == ["user:user-1", "session:s1", "canvas:c1"]
+        assert websocket_state.get_user_socket_ids("user-1") == ["sid-1"]
+
+    def test_does_not_join_rooms_of_other_users(self):
+        sio = _sio()
+        _connect(sio, _db(), {"token": "t", "session_id": "s-other", "canvas_id": "c-other"})
+
+        rooms = [call.args[1] for call in sio.enter_room.await_args_list]
+        assert rooms == ["user:user-1"]
+
+    def test_token_from_authorization_header(self):
+        sio = _sio()
+        verify = _connect(sio, _db(), None, environ={"HTTP_AUTHORIZATION": "Bearer hdr"})
+        verify.assert_awaited_once_with("hdr")
+
+    def test_wire_options_are_negotiated(self):
+        sio = _sio()
+        _connect(sio, _db(), {"token": "t", "encoding": "deflate", "compact_elements": True})
+
+        connected = sio.emit.await_args.args[1]
+        assert connected["encoding"] == "deflate"
+        assert "element_defaults" in connected
+        assert websocket_state.get_connection_wire("sid-1") == {
+            "encoding": "deflate", "compact_elements": True,
+        }
+
+    def test_disconnect_forgets_user_connection(self):
+        _connect(_sio(), _db(), {"token": "t"})
+        asyncio.run(websocket_router.disconnect("sid-1"))
+        assert websocket_state.get_user_socket_ids("user-1") == []
+        assert "user-1" not in websocket_state.user_connections
+
+
+class TestEmit:
+    def test_session_update_targets_session_and_canvas_rooms(self):
+        deliver = MagicMock()
+        with patch.object(websocket_service, "deliver", deliver):
+            asyncio.run(websocket_service.broadcast_session_update("s1", "c1", {"type": "delta"}))
+
+        deliver.assert_called_once()
+        _, rooms, payload = deliver.call_args.args
+        assert rooms == ["session:s1", "canvas:c1"]
+        assert payload == {"canvas_id": "c1", "session_id": "s1", "type": "delta", "seq": 1}
+
+    def test_send_to_websocket_targets_session_room(self):
+        deliver = MagicMock()
+        with patch.object(websocket_service, "deliver", deliver):
+            asyncio.run(websocket_service.send_to_websocket("s1", {"type": "done"}))
+        assert deliver.call_args.args[1] == ["session:s1"]
+
+    def test_join_session_rooms_adds_all_user_connections(self):
+        sio = _sio()
+        websocket_state.add_connection("a", {"user_id": "u1"})
+        websocket_state.add_connection("b", {"user_id": "u1"})
+        websocket_state.add_connection("c", {"user_id": "u2"})
+        with patch.object(websocket_service, "sio", sio):
+            asyncio.run(websocket_service.join_session_rooms("u1", "s1", "c1"))
+
+        joined = {call.args for call in sio.enter_room.await_args_list}
+        assert joined == {
+            ("a", "session:s1"), ("a", "canvas:c1"),
+            ("b", "session:s1"), ("b", "canvas:c1"),
+        }
+
+
+class TestResync:
+    def _resync(self, sio, db, data):
+        with patch.object(websocket_router, "sio", sio), patch.object(
+            websocket_router, "db_service", db
+        ):
+            asyncio.run(websocket_router.resync("sid-1", data))
+
+    def test_snapshot_from_live_history(self):
+        websocket_state.add_connection("sid-1", {"user_id": "user-1"})
+        history = message_history.MessageHistory("s1")
+        history.update([HumanMessage("hi", id="1")])
+        sio, db = _sio(), _db(sessions=["s1"])
+        with patch.dict(message_history.live_histories, {"s1": history}, clear=True):
+            self._resync(sio, db, {"session_id": "s1"})
+
+        args, kwargs = sio.emit.await_args
+        assert kwargs["room"] == "sid-1"
+        assert args[1]["type"] == "all_messages"
+        assert args[1]["version"] == 1
+        assert args[1]["messages"] == [{"role": "user", "content": "hi"}]
+
+    def test_snapshot_from_database_after_stream(self):
+        websocket_state.add_connection("sid-1", {"user_id": "user-1"})
+        sio, db = _sio(), _db(sessions=["s1"])
+        db.get_chat_history = AsyncMock(return_value=[{"role": "user", "content": "x"}])
+        self._resync(sio, db, {"session_id": "s1"})
+
+        db.get_chat_history.assert_awaited_once_with("s1", user_id="user-1")
+        assert sio.emit.await_args.args[1]["messages"] == [{"role": "user", "content": "x"}]
+
+    def test_ignores_sessions_of_other_users(self):
+        websocket_state.add_connection("sid-1", {"user_id": "user-1"})
+        sio = _sio()
+        self._resync(sio, _db(), {"session_id": "s-other"})
+        sio.emit.assert_not_awaited()
+
+
+class TestReplay:
+    def _emit_events(self, count):
+        with patch.object(websocket_service, "deliver", MagicMock()):
+            for i in range(count):
+                asyncio.run(websocket_service.send_to_websocket("s1", {"type": "delta", "text": str(i)}))
+
+    def test_events_are_sequenced_per_session(self):
+        deliver = MagicMock()
+        with patch.object(websocket_service, "deliver", deliver):
+            for session_id in ["s1", "s1", "s2"]:
+                asyncio.run(websocket_service.send_to_websocket(session_id, {"type": "delta"}))
+        assert [c.args[2]["seq"] for c in deliver.call_args_list] == [1, 2, 1]
+
+    def test_reconnect_replays_missed_events(self):
+        self._emit_events(3)
+        sio = _sio()
+        _connect(sio, _db(sessions=["s1"]), {"token": "t", "session_id": "s1", "last_seq": 1})
+
+        replayed = [c.args[1] for c in sio.emit.await_args_list if c.args[0] == "session_update"]
+        assert [(e["seq"], e["text"]) for e in replayed] == [(2, "1"), (3, "2")]
+        assert all(c.kwargs["room"] == "sid-1" for c in sio.emit.await_args_list)
+        assert all(c.kwargs["ignore_queue"] for c in sio.emit.await_args_list)
+
+    def test_gap_older_than_buffer_sends_snapshot(self):
+        self._emit_events(6)
+        sio, db = _sio(), _db(sessions=["s1"])
+        db.get_chat_history = AsyncMock(return_value=[{"role": "user", "content": "x"}])
+        _connect(sio, db, {"token": "t", "session_id": "s1", "last_seq": 1})
+
+        replayed = [c.args[1] for c in sio.emit.await_args_list if c.args[0] == "session_update"]
+        assert [e["type"] for e in replayed] == ["all_messages"]
+
+    def test_replay_event_requires_ownership(self):
+        self._emit_events(2)
+        websocket_state.add_connection("sid-1", {"user_id": "user-1"})
+        sio = _sio()
+        with patch.object(websocket_router, "sio", sio), patch.object(
+            websocket_router, "db_service", _db()
+        ):
+            asyncio.run(websocket_router.replay("sid-1", {"session_id": "s1", "last_seq": 0}))
+        sio.emit.assert_not_awaited()
+
+    def test_replay_event_for_owned_session(self):
+        self._emit_events(2)
+        websocket_state.add_connection("sid-1", {"user_id": "user-1"})
+        sio = _sio()
+        with patch.object(websocket_router, "sio", sio), patch.object(
+            websocket_router, "db_service", _db(sessions=["s1"])
+        ):
+            asyncio.run(websocket_router.replay("sid-1", {"session_id": "s1", "last_seq": 0}))
+        assert [c.args[1]["seq"] for c in sio.emit.await_args_list] == [1, 2]
+        sio.enter_room.assert_awaited_once_with("sid-1", "session:s1")
@@ -0,0 +1,107 @@
+"""Tests for negotiated wire encodings of session events."""
+
+import asyncio
+import json
+import zlib
+
+import ormsgpack
+import socketio
+
+from services import wire_format
+from services.cluster_service import AsyncPostgresManager
+from services.socket_outbox import Outbox
+from utils.canvas_elements import MEDIA_ELEMENT_DEFAULTS, compact_element, new_media_element
+
+
+def _event():
+    element = new_media_element("image", "im_1", 10, 20, 512, 512)
+    return {"type": "image_generated", "session_id": "s1", "seq": 3, "element": element}
+
+
+class TestNegotiate:
+    def test_defaults_to_json(self):
+        assert wire_format.negotiate({}) == {"encoding": "json", "compact_elements": False}
+
+    def test_unknown_encoding_falls_back(self):
+        assert wire_format.negotiate({"encoding": "zstd"})["encoding"] == "json"
+
+    def test_handshake_carries_defaults_for_compact_clients(self):
+        options = wire_format.negotiate({"encoding": "msgpack", "compact_elements": True})
+        fields = wire_format.handshake_fields(options)
+        assert fields["encoding"] == "msgpack"
+        assert fields["element_defaults"] == MEDIA_ELEMENT_DEFAULTS
+
+
+class TestElements:
+    def test_new_media_element_has_all_default_fields(self):
+        element = new_media_element("video", "vi_1", 0, 0, 1, 2)
+        assert set(MEDIA_ELEMENT_DEFAULTS) <= set(element)
+        assert (element["type"], element["fileId"], element["height"]) == ("video", "vi_1", 2)
+        element["groupIds"].append("g")
+        assert MEDIA_ELEMENT_DEFAULTS["groupIds"] == []
+
+    def test_compact_element_restores_with_defaults(self):
+        element = new_media_element("image", "im_1", 0, 0, 10, 10)
+        element["opacity"] = 50
+        compact = compact_element(element)
+        assert "strokeColor" not in compact and compact["opacity"] == 50
+        assert {**MEDIA_ELEMENT_DEFAULTS, **compact} == element
+
+
+class TestEncode:
+    def test_json_is_passed_through(self):
+        event = _event()
+        assert wire_format.encode(event, {"encoding": "json"}) is event
+
+    def test_msgpack_round_trip_with_compact_elements(self):
+        event = _event()
+        encoded = wire_format.encode(event, {"encoding": "msgpack", "compact_elements": True})
+        decoded = ormsgpack.unpackb(encoded)
+        assert {**MEDIA_ELEMENT_DEFAULTS, **decoded["element"]} == event["element"]
+        assert len(encoded) < len(json.dumps(event))
+
+    def test_deflate_round_trip(self):
+        event = {"type": "all_messages", "messages": [{"role": "user", "content": "hi " * 500}]}
+        encoded = wire_format.encode(event, {"encoding": "deflate"})
+        assert json.loads(zlib.decompress(encoded)) == event
+        assert len(encoded) < 200
+
+    def test_frame_is_encoded_once_per_options(self):
+        event = _event()
+        options = {"encoding": "deflate", "compact_elements": True}
+        assert wire_format.encode(event, options) is wire_format.encode(event, dict(options))
+
+
+class TestClusterDelivery:
+    def test_msgpack_frame_reaches_local_socket_unchanged(self):
+        # Binary frames must not pass through the pub/sub manager's JSON queue
+        async def scenario():
+            manager = AsyncPostgresManager.__new__(AsyncPostgresManager)
+            socketio.AsyncManager.__init__(manager)
+            manager.channel, manager.write_only, manager.host_id = "test", False, "w1"
+            published = []
+
+            async def publish(data):
+                published.append(data)
+
+            manager._publish = publish
+            sio = socketio.AsyncServer(async_mode="asgi", client_manager=manager)
+            sent = []
+
+            async def send_eio_packet(eio_sid, pkt):
+                sent.append(pkt)
+
+            sio._send_eio_packet = send_eio_packet
+            sid = await manager.connect("eio-1", "/")
+            box = Outbox(sid, sio, wire={"encoding": "msgpack"})
+            box._transport_backlog = lambda: 0
+            event = _event()
+            box.put(event)
+            await asyncio.sleep(0.01)
+            box.close()
+            return event, published, sent
+
+        event, published, sent = asyncio.run(scenario())
+        assert published == []
+        attachments = [p.data for p in sent if isinstance(p.data, bytes)]
+        assert [ormsgpack.unpackb(a) for a in attachments] == [event]
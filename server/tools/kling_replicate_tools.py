@@ -16,12 +16,14 @@ from tools.video_generation.video_canvas_utils import (
 )
 from services.config_service import FILES_DIR
 from tools.utils.image_canvas_utils import generate_file_id
+from utils.singleflight import singleflight
 
 
 # ---------------------------------------------------------------------------
 # Shared helper
 # ---------------------------------------------------------------------------
 
+@singleflight
 async def _resolve_file_url(filename: str) -> str:
     """Turn a local filename into a public URL for Replicate.
     If file is local, upload it to Replicate file hosting."""
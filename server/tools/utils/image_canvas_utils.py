@@ -1,19 +1,17 @@
 """
 Canvas-related utilities for image generation
-Handles canvas operations, locking, and notifications
+Handles canvas operations and notifications
 """
 
-import asyncio
-import random
+import os
 import time
-import json
-from contextlib import asynccontextmanager
-from typing import Dict, List, Any, Optional, Union, cast
+from typing import Dict, Any, Optional
 from nanoid import generate
 from services.db_service import db_service
 from services.websocket_service import broadcast_session_update
 from services.websocket_service import send_to_websocket
-from utils.canvas import find_next_best_element_position
+from utils.canvas import find_next_best_element_position, append_canvas_element
+from utils.canvas_elements import new_media_element
 from services import storage_service
 
 def generate_file_id() -> str:
@@ -21,26 +19,6 @@ def generate_file_id() -> str:
     return 'im_' + generate(size=8)
 
 
-class CanvasLockManager:
-    """Canvas lock manager to prevent concurrent operations causing position overlap"""
-
-    def __init__(self) -> None:
-        self._locks: Dict[str, asyncio.Lock] = {}
-
-    @asynccontextmanager
-    async def lock_canvas(self, canvas_id: str):
-        if canvas_id not in self._locks:
-            self._locks[canvas_id] = asyncio.Lock()
-
-        async with self._locks[canvas_id]:
-            yield
-
-
-# Global lock manager instance
-canvas_lock_manager = CanvasLockManager()
-
-
-
 async def generate_new_image_element(
     canvas_id: str,
     fileid: str,
@@ -49,47 +27,21 @@ async def generate_new_image_element(
 ) -> Dict[str, Any]:
     """Generate new image element for canvas"""
     if canvas_data is None:
-        canvas = await db_service.get_canvas_data(canvas_id)
+        canvas = await db_service.get_canvas_document(canvas_id)
         if canvas is None:
             canvas = {"data": {}}
         canvas_data = canvas.get("data", {})
 
-
-
     new_x, new_y = await find_next_best_element_position(canvas_data)
 
-    return {
-        "type": "image",
-        "id": fileid,
-        "x": new_x,
-        "y": new_y,
-        "width": image_data.get("width", 0),
-        "height": image_data.get("height", 0),
-        "angle": 0,
-        "fileId": fileid,
-        "strokeColor": "#000000",
-        "fillStyle": "solid",
-        "strokeStyle": "solid",
-        "boundElements": None,
-        "roundness": None,
-        "frameId": None,
-        "backgroundColor": "transparent",
-        "strokeWidth": 1,
-        "roughness": 0,
-        "opacity": 100,
-        "groupIds": [],
-        "seed": int(random.random() * 1000000),
-        "version": 1,
-        "versionNonce": int(random.random() * 1000000),
-        "isDeleted": False,
-        "index": None,
-        "updated": 0,
-        "link": None,
-        "locked": False,
-        "status": "saved",
-        "scale": [1, 1],
-        "crop": None,
-    }
+    return new_media_element(
+        "image",
+        fileid,
+        new_x,
+        new_y,
+        image_data.get("width", 0),
+        image_data.get("height", 0),
+    )
 
 
 async def save_image_to_canvas(
@@ -107,20 +59,24 @@ async def save_image_to_canvas(
     aspect_ratio: str = "",
     feature_type: str = "",
 ) -> str:
-    """Save image to canvas with proper locking and positioning.
+    """Save image to canvas with atomic, version-checked positioning.
 
     If user_id and image_bytes are provided, uploads to Supabase Storage
     and records in generated_content. Otherwise falls back to local file URL.
     """
-    # Upload to Supabase Storage if we have user_id + bytes
+    # Upload to Supabase Storage if we have user_id + bytes. The object is
+    # stored under its content hash, so identical images are only kept once.
+    storage_path = f"{user_id}/{filename}"
     if user_id and image_bytes is not None:
-        image_url = await storage_service.upload_file(
+        extension = os.path.splitext(filename)[1] or mime_type.split("/")[-1]
+        stored_name, image_url = await storage_service.upload_content_addressed(
             user_id=user_id,
             file_bytes=image_bytes,
-            filename=filename,
+            extension=extension,
             bucket=storage_service.GENERATED_CONTENT_BUCKET,
             content_type=mime_type,
         )
+        storage_path = f"{user_id}/{stored_name}"
     else:
         image_url = f"/api/file/{filename}"
 
@@ -128,11 +84,11 @@ async def save_image_to_canvas(
     # Store extra fields in metadata JSONB to match schema
     if user_id:
         try:
-            await db_service.insert_generated_content(
+            record = await db_service.upsert_generated_content(
                 {
                     "user_id": user_id,
                     "type": "image",
-                    "storage_path": f"{user_id}/{filename}",
+                    "storage_path": storage_path,
                     "prompt": prompt,
                     "model": model,
                     "metadata": {
@@ -150,39 +106,32 @@ async def save_image_to_canvas(
                     },
                 }
             )
+            # One storage reference per record: a save merged into an
+            # existing record gives back the one it took while uploading
+            if image_bytes is not None and record is not None and record.get("inserted") is False:
+                await storage_service.release_file(storage_service.GENERATED_CONTENT_BUCKET, storage_path)
         except Exception as e:
             # Log details so we can debug why My Content may be empty
             import traceback
             print(f"Warning: Failed to record generated content: {e}")
-            print(f"  user_id={user_id}, storage_path={user_id}/{filename}, image_url={image_url}")
+            print(f"  user_id={user_id}, storage_path={storage_path}, image_url={image_url}")
             traceback.print_exc()
 
     # Skip canvas operations if no canvas_id (direct generation mode)
     if not canvas_id:
         return image_url
 
-    # Use lock to ensure atomicity of the save process
-    async with canvas_lock_manager.lock_canvas(canvas_id):
-        canvas: Optional[Dict[str, Any]] = await db_service.get_canvas_data(canvas_id)
-        if canvas is None:
-            canvas = {'data': {}}
-        canvas_data: Dict[str, Any] = canvas.get('data', {})
-
-        if 'elements' not in canvas_data:
-            canvas_data['elements'] = []
-        if 'files' not in canvas_data:
-            canvas_data['files'] = {}
+    file_id = generate_file_id()
 
-        file_id = generate_file_id()
-
-        file_data: Dict[str, Any] = {
-            'mimeType': mime_type,
-            'id': file_id,
-            'dataURL': image_url,
-            'created': int(time.time() * 1000),
-        }
+    file_data: Dict[str, Any] = {
+        'mimeType': mime_type,
+        'id': file_id,
+        'dataURL': image_url,
+        'created': int(time.time() * 1000),
+    }
 
-        new_image_element: Dict[str, Any] = await generate_new_image_element(
+    async def build_element(canvas_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await generate_new_image_element(
             canvas_id,
             file_id,
             {
@@ -192,20 +141,22 @@ async def save_image_to_canvas(
             canvas_data,
         )
 
-        elements_list = cast(List[Dict[str, Any]], canvas_data['elements'])
-        elements_list.append(new_image_element)
-        canvas_data['files'][file_id] = file_data
-
-        await db_service.save_canvas_data(canvas_id, json.dumps(canvas_data))
+    # Placement and write happen as one version-checked append in the database
+    new_image_element = await append_canvas_element(
+        canvas_id, build_element, file_id, file_data, user_id=user_id
+    )
+    if new_image_element is None:
+        print(f"Warning: Canvas {canvas_id} not found, image not placed")
+        return image_url
 
-        await broadcast_session_update(session_id, canvas_id, {
-            'type': 'image_generated',
-            'element': new_image_element,
-            'file': file_data,
-            'image_url': image_url,
-        })
+    await broadcast_session_update(session_id, canvas_id, {
+        'type': 'image_generated',
+        'element': new_image_element,
+        'file': file_data,
+        'image_url': image_url,
+    })
 
-        return image_url
+    return image_url
 
 
 async def send_image_start_notification(session_id: str, message: str) -> None:
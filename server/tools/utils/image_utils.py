@@ -7,6 +7,7 @@ import json
 from typing import Any, Optional, Tuple
 from nanoid import generate
 from utils.http_client import HttpClient
+from utils.singleflight import singleflight
 from services.config_service import FILES_DIR
 from services.storage_service import upload_file as storage_upload_file
 
@@ -204,6 +205,7 @@ async def get_image_info_and_process(
 # Notification functions moved to tools/image_generation/image_canvas_utils.py
 
 
+@singleflight
 async def process_input_image(input_image: str | None) -> str | None:
     """
     Process input image and convert to base64 format.
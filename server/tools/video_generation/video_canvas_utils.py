@@ -6,9 +6,7 @@ Contains functions for video processing, canvas operations, and notifications
 import json
 import time
 import os
-import asyncio
 import traceback
-from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Tuple, Optional, Union
 from services.config_service import FILES_DIR
 from services.db_service import db_service
@@ -19,30 +17,11 @@ import aiofiles
 import mimetypes
 from pymediainfo import MediaInfo
 from nanoid import generate
-import random
-from utils.canvas import find_next_best_element_position
+from utils.canvas import find_next_best_element_position, append_canvas_element
+from utils.canvas_elements import new_media_element
 from services import storage_service
 
 
-class CanvasLockManager:
-    """Canvas lock manager to prevent concurrent operations causing position overlap"""
-
-    def __init__(self) -> None:
-        self._locks: Dict[str, asyncio.Lock] = {}
-
-    @asynccontextmanager
-    async def lock_canvas(self, canvas_id: str):
-        if canvas_id not in self._locks:
-            self._locks[canvas_id] = asyncio.Lock()
-
-        async with self._locks[canvas_id]:
-            yield
-
-
-# Global lock manager instance
-canvas_lock_manager = CanvasLockManager()
-
-
 async def save_video_to_canvas(
     session_id: str,
     canvas_id: str,
@@ -67,120 +46,105 @@ async def save_video_to_canvas(
     Returns:
         Tuple of (filename, file_data, new_video_element)
     """
-    # Use lock to ensure atomicity of the save process
-    async with canvas_lock_manager.lock_canvas(canvas_id):
-        # Generate unique video ID
-        video_id = generate_video_file_id()
-
-        # Download and save video locally first (for mediainfo processing)
-        print(f"🎥 Downloading video from: {video_url}")
-        mime_type, width, height, extension = await get_video_info_and_save(
-            video_url, os.path.join(FILES_DIR, f"{video_id}")
-        )
-        filename = f"{video_id}.{extension}"
-
-        print(f"🎥 Video saved as: {filename}, dimensions: {width}x{height}")
+    # Generate unique video ID
+    video_id = generate_video_file_id()
 
-        # Upload to Supabase Storage if user_id is available
-        if user_id:
-            local_path = os.path.join(FILES_DIR, filename)
+    # Download and save video locally first (for mediainfo processing)
+    print(f"🎥 Downloading video from: {video_url}")
+    mime_type, width, height, extension = await get_video_info_and_save(
+        video_url, os.path.join(FILES_DIR, f"{video_id}")
+    )
+    filename = f"{video_id}.{extension}"
+
+    print(f"🎥 Video saved as: {filename}, dimensions: {width}x{height}")
+
+    # Upload to Supabase Storage if user_id is available
+    if user_id:
+        local_path = os.path.join(FILES_DIR, filename)
+        try:
+            async with aiofiles.open(local_path, "rb") as f:
+                video_bytes = await f.read()
+            file_url = await storage_service.upload_file(
+                user_id=user_id,
+                file_bytes=video_bytes,
+                filename=filename,
+                bucket=storage_service.GENERATED_CONTENT_BUCKET,
+                content_type=mime_type,
+            )
+            print(f"✓ Video uploaded to Supabase: {file_url}")
+            # Clean up local temp file after successful upload
             try:
-                async with aiofiles.open(local_path, "rb") as f:
-                    video_bytes = await f.read()
-                file_url = await storage_service.upload_file(
-                    user_id=user_id,
-                    file_bytes=video_bytes,
-                    filename=filename,
-                    bucket=storage_service.GENERATED_CONTENT_BUCKET,
-                    content_type=mime_type,
-                )
-                print(f"✓ Video uploaded to Supabase: {file_url}")
-                # Clean up local temp file after successful upload
-                try:
-                    os.remove(local_path)
-                    print(f"✓ Cleaned up local temp file: {local_path}")
-                except Exception:
-                    pass
-            except Exception as e:
-                print(f"Warning: Supabase upload failed, using local file: {e}")
-                file_url = f"/api/file/{filename}"
-        else:
+                os.remove(local_path)
+                print(f"✓ Cleaned up local temp file: {local_path}")
+            except Exception:
+                pass
+        except Exception as e:
+            print(f"Warning: Supabase upload failed, using local file: {e}")
             file_url = f"/api/file/{filename}"
+    else:
+        file_url = f"/api/file/{filename}"
+
+    # Record in generated_content table for authenticated users only
+    if user_id:
+        try:
+            await db_service.upsert_generated_content(
+                {
+                    "user_id": user_id,
+                    "type": "video",
+                    "storage_path": f"{user_id}/{filename}",
+                    "prompt": prompt,
+                    "model": model,
+                    "metadata": {
+                        "filename": filename,
+                        "public_url": file_url,
+                        "mime_type": mime_type,
+                        "width": width,
+                        "height": height,
+                        "provider": provider,
+                    },
+                }
+            )
+        except Exception as db_err:
+            print(f"Warning: Generated content insert failed (will retry): {db_err}")
+
+    # Create file data
+    file_id = generate_video_file_id()
+
+    file_data: Dict[str, Any] = {
+        "mimeType": mime_type,
+        "id": file_id,
+        "dataURL": file_url,
+        "created": int(time.time() * 1000),
+    }
 
-        # Record in generated_content table for authenticated users only
-        if user_id:
-            try:
-                await db_service.insert_generated_content(
-                    {
-                        "user_id": user_id,
-                        "type": "video",
-                        "storage_path": f"{user_id}/{filename}",
-                        "prompt": prompt,
-                        "model": model,
-                        "metadata": {
-                            "filename": filename,
-                            "public_url": file_url,
-                            "mime_type": mime_type,
-                            "width": width,
-                            "height": height,
-                            "provider": provider,
-                        },
-                    }
-                )
-            except Exception as db_err:
-                print(f"Warning: Generated content insert failed (will retry): {db_err}")
-
-        # Create file data
-        file_id = generate_video_file_id()
-
-        file_data: Dict[str, Any] = {
-            "mimeType": mime_type,
-            "id": file_id,
-            "dataURL": file_url,
-            "created": int(time.time() * 1000),
-        }
-
-        # Only create canvas element if we have a valid canvas_id
-        new_video_element = None
-        if canvas_id:
-            try:
-                # Create new video element for canvas
-                new_video_element = await generate_new_video_element(
+    # Only create canvas element if we have a valid canvas_id
+    new_video_element = None
+    if canvas_id:
+        try:
+            async def build_element(canvas_data: Dict[str, Any]) -> Dict[str, Any]:
+                return await generate_new_video_element(
                     canvas_id,
                     file_id,
                     {
                         "width": width,
                         "height": height,
                     },
+                    canvas_data,
                 )
 
-                # Update canvas data
-                canvas_data: Optional[
-                    Dict[str, Any]
-                ] = await db_service.get_canvas_data(canvas_id)
-                if canvas_data is None:
-                    canvas_data = {}
-                if "data" not in canvas_data:
-                    canvas_data["data"] = {}
-                if "elements" not in canvas_data["data"]:
-                    canvas_data["data"]["elements"] = []
-                if "files" not in canvas_data["data"]:
-                    canvas_data["data"]["files"] = {}
-
-                canvas_data["data"]["elements"].append(new_video_element)  # type: ignore
-                canvas_data["data"]["files"][file_id] = file_data
-
-                # Save updated canvas data
-                await db_service.save_canvas_data(
-                    canvas_id, json.dumps(canvas_data["data"])
-                )
-            except Exception as canvas_err:
-                print(
-                    f"Warning: Canvas update failed (video still saved): {canvas_err}"
-                )
-                new_video_element = None
+            # Placement and write happen as one version-checked append
+            new_video_element = await append_canvas_element(
+                canvas_id, build_element, file_id, file_data, user_id=user_id
+            )
+            if new_video_element is None:
+                print(f"Warning: Canvas {canvas_id} not found, video not placed")
+        except Exception as canvas_err:
+            print(
+                f"Warning: Canvas update failed (video still saved): {canvas_err}"
+            )
+            new_video_element = None
 
-        return filename, file_data, new_video_element if new_video_element else {}
+    return filename, file_data, new_video_element if new_video_element else {}
 
 
 async def send_video_start_notification(session_id: str, message: str) -> None:
@@ -329,42 +293,18 @@ async def generate_new_video_element(
 ) -> Dict[str, Any]:
     """Generate new video element for canvas"""
     if canvas_data is None:
-        canvas = await db_service.get_canvas_data(canvas_id)
+        canvas = await db_service.get_canvas_document(canvas_id)
         if canvas is None:
             canvas = {"data": {}}
         canvas_data = canvas.get("data", {})
 
     new_x, new_y = await find_next_best_element_position(canvas_data)
 
-    return {
-        "type": "video",
-        "id": fileid,
-        "x": new_x,
-        "y": new_y,
-        "width": video_data.get("width", 0),
-        "height": video_data.get("height", 0),
-        "angle": 0,
-        "fileId": fileid,
-        "strokeColor": "#000000",
-        "fillStyle": "solid",
-        "strokeStyle": "solid",
-        "boundElements": None,
-        "roundness": None,
-        "frameId": None,
-        "backgroundColor": "transparent",
-        "strokeWidth": 1,
-        "roughness": 0,
-        "opacity": 100,
-        "groupIds": [],
-        "seed": int(random.random() * 1000000),
-        "version": 1,
-        "versionNonce": int(random.random() * 1000000),
-        "isDeleted": False,
-        "index": None,
-        "updated": 0,
-        "link": None,
-        "locked": False,
-        "status": "saved",
-        "scale": [1, 1],
-        "crop": None,
-    }
+    return new_media_element(
+        "video",
+        fileid,
+        new_x,
+        new_y,
+        video_data.get("width", 0),
+        video_data.get("height", 0),
+    )
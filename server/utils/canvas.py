@@ -1,5 +1,9 @@
-from typing import Optional, Dict, Any, Union
-from services.db_service import db_service
+from typing import Optional, Dict, Any, Union, Callable, Awaitable
+from services.db_service import db_service, CanvasVersionConflict
+from services.lock_service import lock_service
+
+# How many times an element append is re-placed after losing a version race
+MAX_APPEND_ATTEMPTS = 5
 
 async def find_next_best_element_position(canvas_data, max_num_per_row=4, spacing=20):
     """
@@ -55,4 +59,67 @@ async def find_next_best_element_position(canvas_data, max_num_per_row=4, spacin
         bottom_of_last_row = max(e.get("y", 0) + e.get("height", 0) for e in last_row)
         new_y = bottom_of_last_row + spacing
 
-    return new_x, new_y
\ No newline at end of file
+    return new_x, new_y
+
+
+async def append_canvas_element(
+    canvas_id: str,
+    build_element: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+    file_id: str,
+    file_data: Dict[str, Any],
+    max_attempts: int = MAX_APPEND_ATTEMPTS,
+    user_id: str = "",
+) -> Optional[Dict[str, Any]]:
+    """
+    Place a new element on a canvas and write it atomically.
+
+    The element is positioned against the current document and written as a
+    delta guarded by the canvas version (compare-and-swap). If another writer
+    got in first — in this process or any other worker — the element is
+    re-placed against the fresh document and retried. Appenders share the
+    cluster-wide lock service so they normally queue instead of retrying.
+
+    Args:
+        canvas_id: Canvas to append to
+        build_element: Coroutine building the element from the canvas data
+        file_id: Key of the element's entry in the canvas files map
+        file_data: Files map entry for the element
+        user_id: Owner of the canvas, from the tool context; scopes the write
+            and invalidates the owner's cached canvas listing
+
+    Returns:
+        The element that was written, or None if the canvas does not exist.
+    """
+    # The lease keeps concurrent appenders (image and video, any worker) from
+    # burning CAS retries; the version check remains the actual fence.
+    try:
+        lease = await lock_service.acquire(f"canvas:{canvas_id}")
+    except Exception as e:
+        print(f"Warning: Canvas lock backend failed: {e}")
+        lease = None
+    if lease is None:
+        print(f"Warning: Canvas {canvas_id} lock unavailable, appending without it")
+    try:
+        for attempt in range(max_attempts):
+            canvas = await db_service.get_canvas_document(canvas_id, user_id)
+            if canvas is None:
+                return None
+            element = await build_element(canvas.get("data") or {})
+            # The final attempt skips the version check so the element is never lost
+            base_version = canvas.get("version", 0) if attempt < max_attempts - 1 else None
+            try:
+                version = await db_service.apply_canvas_delta(
+                    canvas_id,
+                    upserts=[element],
+                    files={file_id: file_data},
+                    base_version=base_version,
+                    user_id=user_id,
+                )
+            except CanvasVersionConflict:
+                print(f"🔁 Canvas {canvas_id} changed during append, retrying ({attempt + 1})")
+                continue
+            return element if version is not None else None
+        return None
+    finally:
+        if lease is not None:
+            await lock_service.release(lease)
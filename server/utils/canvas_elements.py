@@ -0,0 +1,56 @@
+import random
+from typing import Any, Dict
+
+# Fields every generated media element starts with. The compact wire format
+# leaves out fields that still have these values; clients restore them from
+# the copy sent in the 'connected' handshake.
+MEDIA_ELEMENT_DEFAULTS: Dict[str, Any] = {
+    "angle": 0,
+    "strokeColor": "#000000",
+    "fillStyle": "solid",
+    "strokeStyle": "solid",
+    "boundElements": None,
+    "roundness": None,
+    "frameId": None,
+    "backgroundColor": "transparent",
+    "strokeWidth": 1,
+    "roughness": 0,
+    "opacity": 100,
+    "groupIds": [],
+    "version": 1,
+    "isDeleted": False,
+    "index": None,
+    "updated": 0,
+    "link": None,
+    "locked": False,
+    "status": "saved",
+    "scale": [1, 1],
+    "crop": None,
+}
+
+
+def new_media_element(element_type: str, fileid: str, x: float, y: float, width: float, height: float) -> Dict[str, Any]:
+    """Build an image/video canvas element at (x, y)."""
+    return {
+        **MEDIA_ELEMENT_DEFAULTS,
+        "type": element_type,
+        "id": fileid,
+        "x": x,
+        "y": y,
+        "width": width,
+        "height": height,
+        "fileId": fileid,
+        # Fresh lists so callers can't mutate the shared defaults
+        "groupIds": [],
+        "scale": [1, 1],
+        "seed": int(random.random() * 1000000),
+        "versionNonce": int(random.random() * 1000000),
+    }
+
+
+def compact_element(element: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop fields that equal MEDIA_ELEMENT_DEFAULTS."""
+    return {
+        k: v for k, v in element.items()
+        if k not in MEDIA_ELEMENT_DEFAULTS or MEDIA_ELEMENT_DEFAULTS[k] != v
+    }
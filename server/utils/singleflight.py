@@ -0,0 +1,76 @@
+"""
+Singleflight: collapse identical concurrent async calls into one.
+
+While a call for a key is in flight, further callers with the same key wait
+for that call instead of starting their own, and all of them receive its
+result (or exception). Nothing is cached once the call finishes.
+
+    @singleflight
+    async def get_thing(thing_id: str) -> dict: ...
+
+Followers receive a deep copy of mutable results so one caller mutating its
+dict can't affect another. The shared call is shielded: a caller being
+cancelled does not cancel the work the others are waiting on.
+"""
+
+import asyncio
+import copy
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_IMMUTABLE = (str, bytes, int, float, bool, type(None), tuple, frozenset)
+
+
+class SingleFlight:
+    """A group of in-flight calls, keyed by caller-chosen keys."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            result = await asyncio.shield(task)
+            return result if isinstance(result, _IMMUTABLE) else copy.deepcopy(result)
+
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+
+        def _forget(done: asyncio.Task) -> None:
+            if self._calls.get(key) is done:
+                del self._calls[key]
+
+        task.add_done_callback(_forget)
+        return await asyncio.shield(task)
+
+
+def _default_key(args: tuple, kwargs: dict) -> Hashable:
+    return (args, tuple(sorted(kwargs.items())))
+
+
+def singleflight(
+    fn: Optional[Callable[..., Awaitable[T]]] = None,
+    *,
+    key: Optional[Callable[..., Hashable]] = None,
+) -> Any:
+    """Decorator form of SingleFlight; ``key`` maps call arguments to a key."""
+
+    def decorate(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        group = SingleFlight()
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            k = key(*args, **kwargs) if key else _default_key(args, kwargs)
+            return await group.do(k, lambda: func(*args, **kwargs))
+
+        wrapper.singleflight_group = group  # type: ignore[attr-defined]
+        return wrapper
+
+    if fn is not None:
+        return decorate(fn)
+    return decorate